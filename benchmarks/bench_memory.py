@@ -0,0 +1,127 @@
+"""
+Memory benchmark for holding the controller's record listing.
+
+Compares the memory held for an existing-records listing at several sizes:
+
+  dicts   the parsed JSON list of dicts plus the hostname -> ip -> id map the
+          planner used to build over it
+  store   the same listing parsed whole, then loaded into a RecordStore
+  stream  the listing parsed chunk by chunk straight into a RecordStore, as
+          get_existing_dns_records does
+
+Memory is measured with tracemalloc: "retained" is what stays allocated once
+loading is done, "peak" the high-water mark while loading. The buffered
+variants decode the whole body to text first, as Response.json() does; the
+body itself is not counted, although only the stream variant avoids holding it.
+
+Usage:
+    python benchmarks/bench_memory.py [--sizes 1000,10000,100000] [--output bench_memory.json]
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from mock_controller import generate_records  # noqa: E402
+from unifi_dns_sync.json_stream import CHUNK_SIZE, JSONStreamReader, chunk_reader  # noqa: E402
+from unifi_dns_sync.plan import build_plan  # noqa: E402
+from unifi_dns_sync.records import RecordStore  # noqa: E402
+
+
+def load_dicts(body: bytes):
+    """Parse the listing and index it the way the planner did before RecordStore."""
+    records = json.loads(body.decode('utf-8'))
+    existing_map = {}
+    for record in records:
+        if record.get('record_type') == 'A' and record.get('key'):
+            existing_map.setdefault(record['key'], {})[record.get('value')] = record.get('_id')
+    return records, existing_map
+
+
+def load_store(body: bytes):
+    """Parse the listing whole, then load it into a RecordStore."""
+    return RecordStore(json.loads(body.decode('utf-8')))
+
+
+def load_stream(body: bytes):
+    """Parse the listing in download-sized chunks straight into a RecordStore."""
+    chunks = (body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE))
+    return RecordStore(JSONStreamReader(chunk_reader(chunks)).iter_array())
+
+
+def measure(load, body: bytes) -> dict:
+    """Load body with load and report the memory retained and peak, in bytes."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load(body)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {'retained_bytes': retained, 'peak_bytes': peak, 'load_seconds': round(elapsed, 4)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Comma-separated record counts (default: 1000,10000,100000)")
+    parser.add_argument("--output", default="bench_memory.json", help="Results file (default: bench_memory.json)")
+    args = parser.parse_args()
+
+    rows = []
+    for size in (int(s) for s in args.sizes.split(',') if s):
+        records = generate_records(size)
+        body = json.dumps(records).encode('utf-8')
+        desired = [{'hostname': record['key'], 'ip': record['value']} for record in records]
+        del records
+
+        dicts = measure(load_dicts, body)
+        store = measure(load_store, body)
+        stream = measure(load_stream, body)
+
+        # No-op planning time against the store, which the memory saving must not cost
+        existing = load_store(body)
+        start = time.perf_counter()
+        build_plan(existing, desired, '10.0.0.123')
+        plan_seconds = time.perf_counter() - start
+
+        row = {
+            'records': size,
+            'body_bytes': len(body),
+            'dicts': dicts,
+            'store': store,
+            'stream': stream,
+            'retained_ratio': round(store['retained_bytes'] / dicts['retained_bytes'], 3),
+            'plan_seconds': round(plan_seconds, 4)
+        }
+        rows.append(row)
+        print(f"{size:>8} records: dicts {dicts['retained_bytes'] / size:7.0f} B/record, "
+              f"store {store['retained_bytes'] / size:6.0f} B/record "
+              f"({row['retained_ratio']:.0%}); peak dicts {dicts['peak_bytes'] / 2**20:.1f} MiB, "
+              f"store {store['peak_bytes'] / 2**20:.1f} MiB, stream {stream['peak_bytes'] / 2**20:.1f} MiB; "
+              f"load {store['load_seconds']:.3f}s / streamed {stream['load_seconds']:.3f}s; "
+              f"no-op plan {plan_seconds:.3f}s", file=sys.stderr)
+
+    report = {
+        'benchmark': 'memory',
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': rows
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+CLI startup benchmark with a time budget.
+
+Measures how long importing unifi_dns_sync.cli takes using -X importtime and
+how long `unifi-dns-sync --help` takes end to end, lists the slowest imports,
+and fails when the import exceeds the budget or pulls in modules that should
+only load once a controller is contacted (requests, urllib3).
+
+Usage:
+    python benchmarks/bench_startup.py [--budget-ms 100] [--runs 5] [--output startup.json]
+
+Exits with status 1 when a check fails, so it can gate CI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Modules the CLI must not import before it needs a controller connection
+FORBIDDEN_MODULES = ('requests', 'urllib3')
+
+DEFAULT_BUDGET_MS = 100.0
+
+
+def _env() -> dict:
+    env = dict(os.environ, PYTHONPATH=SRC)
+    # Measure with bytecode caching, as an installed package would run
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+
+def import_profile() -> dict:
+    """
+    Import the CLI once under -X importtime.
+
+    Returns:
+        Mapping of module name to (self_us, cumulative_us)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import unifi_dns_sync.cli'],
+        env=_env(), capture_output=True, text=True, check=True
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def help_seconds() -> float:
+    """Time one `unifi-dns-sync --help` run end to end."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'unifi_dns_sync.cli', '--help'],
+                   env=_env(), stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"Maximum median import time of unifi_dns_sync.cli (default: {DEFAULT_BUDGET_MS:g})")
+    parser.add_argument("--runs", type=int, default=5, help="Measured runs (default: 5)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list (default: 10)")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    # Warm-up run, which also writes the bytecode cache
+    import_profile()
+
+    profiles = [import_profile() for _ in range(args.runs)]
+    import_ms = statistics.median(p['unifi_dns_sync.cli'][1] for p in profiles) / 1000
+    help_ms = statistics.median(help_seconds() for _ in range(args.runs)) * 1000
+
+    last = profiles[-1]
+    print(f"import unifi_dns_sync.cli: {import_ms:.1f} ms (budget {args.budget_ms:g} ms)", file=sys.stderr)
+    print(f"unifi-dns-sync --help:     {help_ms:.1f} ms", file=sys.stderr)
+    print("Slowest imports (self time):", file=sys.stderr)
+    for name, (self_us, cumulative_us) in sorted(last.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"  {self_us / 1000:7.2f} ms  {name}", file=sys.stderr)
+
+    failures = []
+    if import_ms > args.budget_ms:
+        failures.append(f"import took {import_ms:.1f} ms, over the {args.budget_ms:g} ms budget")
+    leaked = sorted(name for name in last if name.split('.')[0] in FORBIDDEN_MODULES)
+    if leaked:
+        failures.append(f"CLI import loaded {', '.join(sorted({name.split('.')[0] for name in leaked}))}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'benchmark': 'startup',
+                'timestamp': time.time(),
+                'python': sys.version.split()[0],
+                'import_ms': round(import_ms, 2),
+                'help_ms': round(help_ms, 2),
+                'budget_ms': args.budget_ms,
+                'failures': failures
+            }, f, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+End-to-end sync benchmarks against the mock controller in this directory.
+
+Times UnifiDNSManager.sync_dns_records for three scenarios at several record
+counts and writes machine-readable results for tracking regressions:
+
+  cold         the controller has no records; every hostname is created
+  noop         the controller already matches the desired state
+  mass_change  every hostname moves to a new IP
+
+Usage:
+    python benchmarks/bench_sync.py [--sizes 100,10000,100000] [--output bench_results.json]
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from unifi_dns_sync.config import TransportConfig  # noqa: E402
+from unifi_dns_sync.dns_manager import UnifiDNSManager, DEFAULT_CONCURRENCY  # noqa: E402
+from mock_controller import MockController, generate_records  # noqa: E402
+
+SCENARIOS = ('cold', 'noop', 'mass_change')
+
+
+def desired_entries(records, change_ip: bool) -> list:
+    """Desired entries matching the seeded records, optionally with every IP changed."""
+    entries = []
+    for record in records:
+        ip = record['value']
+        if change_ip:
+            octets = ip.split('.')
+            ip = '.'.join(['172'] + octets[1:])
+        entries.append({'hostname': record['key'], 'ip': ip})
+    return entries
+
+
+def serve_controller(conn, records: int, latency: float, error_rate: float, capacity=None) -> None:
+    """
+    Run a mock controller in a child process.
+
+    Keeping the server out of the benchmark process means it does not compete
+    with the client for the GIL. Sends the URL over conn, resets the request
+    counters on 'reset' and replies with them on 'stop'.
+    """
+    logging.basicConfig(level=logging.WARNING)
+    controller = MockController(latency=latency, error_rate=error_rate, records=records, seed=0, capacity=capacity)
+    with controller:
+        conn.send(controller.url)
+        while True:
+            message = conn.recv()
+            if message == 'reset':
+                controller.reset_counts()
+                conn.send(None)
+            elif message == 'stop':
+                conn.send(dict(controller.request_counts))
+                return
+
+
+def run_scenario(scenario: str, size: int, args: argparse.Namespace) -> dict:
+    """Run one scenario against a fresh mock controller and return its result row."""
+    desired = desired_entries(generate_records(size), change_ip=(scenario == 'mass_change'))
+    seeded = 0 if scenario == 'cold' else size
+
+    conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=serve_controller,
+        args=(child_conn, seeded, args.latency, args.error_rate, args.capacity),
+        daemon=True
+    )
+    process.start()
+    try:
+        url = conn.recv()
+        manager = UnifiDNSManager(
+            url, 'bench', 'bench',
+            concurrency=args.concurrency,
+            transport=TransportConfig(backoff_base=0.01, adaptive_concurrency=args.adaptive,
+                                      min_concurrency=args.min_concurrency)
+        )
+        conn.send('reset')
+        conn.recv()
+
+        start = time.perf_counter()
+        results = manager.sync_dns_records(desired, show_diff=False)
+        elapsed = time.perf_counter() - start
+
+        conn.send('stop')
+        request_counts = conn.recv()
+    finally:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+
+    writes = results['created'] + results['updated'] + results['deleted']
+    return {
+        'scenario': scenario,
+        'records': size,
+        'seconds': round(elapsed, 4),
+        'records_per_second': round(size / elapsed, 1) if elapsed else None,
+        'writes_per_second': round(writes / elapsed, 1) if elapsed and writes else 0.0,
+        'results': results,
+        'requests': request_counts,
+        'write_limit': int(manager.write_limiter.limit)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,10000,100000",
+                        help="Comma-separated record counts (default: 100,10000,100000)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated scenarios (default: {','.join(SCENARIOS)})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Apply concurrency (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock per-request latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Mock fraction of 503 responses")
+    parser.add_argument("--capacity", type=int,
+                        help="Mock concurrent requests handled before answering 503 (default: unlimited)")
+    parser.add_argument("--adaptive", action="store_true", help="Use adaptive write concurrency")
+    parser.add_argument("--min-concurrency", type=int, default=1,
+                        help="Adaptive concurrency floor (default: 1)")
+    parser.add_argument("--output", default="bench_results.json", help="Results file (default: bench_results.json)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    rows = []
+    for size in (int(s) for s in args.sizes.split(',') if s):
+        for scenario in scenarios:
+            row = run_scenario(scenario, size, args)
+            rows.append(row)
+            print(f"{scenario:>12} {size:>8} records: {row['seconds']:>9.3f}s "
+                  f"({row['records_per_second']} records/s)", file=sys.stderr)
+
+    report = {
+        'benchmark': 'sync',
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'concurrency': args.concurrency,
+        'latency': args.latency,
+        'error_rate': args.error_rate,
+        'capacity': args.capacity,
+        'adaptive': args.adaptive,
+        'results': rows
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark for loading and validating desired-state files.
+
+Generates a hostname file mixing all supported entry formats and measures how
+many entries per second DNSSync.load_hostnames_from_json followed by
+DNSSync.filter_valid_hostnames can process, which is what the CLI does.
+
+Usage:
+    python benchmarks/bench_validation.py [--entries 200000] [--repeat 3]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from unifi_dns_sync.sync import DNSSync  # noqa: E402
+
+
+def generate_entries(count: int) -> list:
+    """Generate host entries in every supported format."""
+    entries = []
+    for i in range(count):
+        hostname = f"host-{i}.zone-{i % 97}.example.com"
+        ip = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+        kind = i % 4
+        if kind == 0:
+            entries.append(hostname)
+        elif kind == 1:
+            entries.append({hostname: ip})
+        elif kind == 2:
+            entries.append({'hostname': hostname, 'ip': ip})
+        else:
+            entries.append({'hostname': hostname, 'ips': [ip]})
+    return entries
+
+
+def run(path: str, repeat: int) -> float:
+    """Return the best wall time of loading and filtering the file."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        entries = DNSSync.load_hostnames_from_json(path)
+        DNSSync.filter_valid_hostnames(entries)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=200000, help="Number of host entries (default: 200000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs to take the best of (default: 3)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(generate_entries(args.entries), f)
+        path = f.name
+    try:
+        elapsed = run(path, args.repeat)
+    finally:
+        os.unlink(path)
+
+    print(json.dumps({
+        'benchmark': 'validation',
+        'entries': args.entries,
+        'seconds': round(elapsed, 4),
+        'entries_per_second': round(args.entries / elapsed)
+    }))
+
+
+if __name__ == "__main__":
+    main()
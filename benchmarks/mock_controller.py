@@ -0,0 +1,317 @@
+"""
+Mock Unifi controller for Unifi DNS Sync
+
+This module provides a local stand-in for a Unifi controller that implements
+the login and static-dns endpoints used by UnifiDNSManager, with configurable
+latency, error rates and record counts. It is meant for benchmarks and local
+experiments, not as a faithful emulation of the controller, and serves plain
+HTTP on localhost only by default.
+
+Run it standalone with:
+    python benchmarks/mock_controller.py --port 18443 --records 1000
+"""
+
+import argparse
+import base64
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Unprivileged and distinct from the controller's own 8443, so the mock is never mistaken for it
+DEFAULT_PORT = 18443
+
+STATIC_DNS_PATH = re.compile(r'^/proxy/network/v2/api/site/([^/]+)/static-dns(?:/([^/?]+))?/?(?:\?.*)?$')
+
+
+def _b64(data: Dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+
+
+def make_jwt(csrf_token: str, expires_at: float) -> str:
+    """Build an unsigned JWT shaped like the controller's TOKEN cookie."""
+    header = _b64({'alg': 'HS256', 'typ': 'JWT'})
+    payload = _b64({'csrfToken': csrf_token, 'exp': int(expires_at), 'iat': int(time.time())})
+    return f"{header}.{payload}.mock-signature"
+
+
+def generate_records(count: int, prefix: str = 'host') -> List[Dict]:
+    """Generate static DNS A records named {prefix}-{i}.bench.local."""
+    return [
+        {
+            '_id': uuid.uuid4().hex,
+            'key': f"{prefix}-{i}.bench.local",
+            'value': f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            'record_type': 'A',
+            'enabled': True
+        }
+        for i in range(count)
+    ]
+
+
+class MockController:
+    """A local HTTP server emulating the controller's auth and static-dns APIs."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, username: Optional[str] = None,
+                 password: Optional[str] = None, latency: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, records: int = 0, token_ttl: float = 3600.0,
+                 seed: Optional[int] = None, capacity: Optional[int] = None):
+        """
+        Initialize the mock controller.
+
+        Args:
+            host: Address to listen on
+            port: Port to listen on (0 picks a free port)
+            username: Accepted username (None accepts any)
+            password: Accepted password (None accepts any)
+            latency: Seconds added to every request
+            error_rate: Fraction of static-dns requests answered with 503
+            throttle_rate: Fraction of static-dns requests answered with 429
+            records: Number of A records to seed the default site with
+            token_ttl: Lifetime of issued session tokens in seconds
+            seed: Random seed for reproducible error injection
+            capacity: Static-dns requests handled at once; more concurrent requests
+                get 503, like a small controller under load (default: unlimited)
+        """
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.token_ttl = token_ttl
+        self.capacity = capacity
+        self.in_flight = 0
+        self.sites: Dict[str, Dict[str, Dict]] = {'default': {}}
+        self.sessions: Dict[str, Dict] = {}
+        self.request_counts: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._thread: Optional[threading.Thread] = None
+
+        if records:
+            self.seed_records(generate_records(records))
+
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        """Base URL of the running server."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def seed_records(self, records: List[Dict], site: str = 'default') -> None:
+        """Add records to a site."""
+        with self.lock:
+            site_records = self.sites.setdefault(site, {})
+            for record in records:
+                site_records[record['_id']] = dict(record)
+
+    def records(self, site: str = 'default') -> List[Dict]:
+        """Return a copy of a site's records."""
+        with self.lock:
+            return [dict(record) for record in self.sites.get(site, {}).values()]
+
+    def reset_counts(self) -> None:
+        """Reset the per-method request counters."""
+        with self.lock:
+            self.request_counts = {}
+
+    def start(self) -> 'MockController':
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Mock controller listening on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'MockController':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _make_handler(self):
+        controller = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Send headers and body in one segment; split writes on a keep-alive
+            # connection stall on delayed ACKs
+            wbufsize = 64 * 1024
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                logger.debug("%s - %s", self.address_string(), format % args)
+
+            def _send(self, status: int, body=None, headers: Optional[Dict[str, str]] = None) -> None:
+                data = b'' if body is None else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _read_body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if not length:
+                    return None
+                try:
+                    return json.loads(self.rfile.read(length))
+                except ValueError:
+                    return None
+
+            def _session_valid(self) -> bool:
+                cookie = SimpleCookie(self.headers.get('Cookie', ''))
+                token = cookie['TOKEN'].value if 'TOKEN' in cookie else None
+                with controller.lock:
+                    session = controller.sessions.get(token)
+                if session is None or session['expires_at'] < time.time():
+                    return False
+                return self.headers.get('x-csrf-token') == session['csrf_token']
+
+            def _handle(self, method: str) -> None:
+                with controller.lock:
+                    controller.request_counts[method] = controller.request_counts.get(method, 0) + 1
+
+                body = self._read_body()
+                if method == 'POST' and self.path == '/api/auth/login':
+                    if controller.latency:
+                        time.sleep(controller.latency)
+                    self._login(body or {})
+                    return
+
+                match = STATIC_DNS_PATH.match(self.path)
+                if match is None:
+                    self._send(404, {'error': 'not found'})
+                    return
+                if not self._session_valid():
+                    self._send(401, {'error': 'unauthorized'})
+                    return
+
+                with controller.lock:
+                    roll = controller._random.random()
+                    overloaded = controller.capacity is not None and controller.in_flight >= controller.capacity
+                    if not overloaded:
+                        controller.in_flight += 1
+                if overloaded:
+                    self._send(503, {'error': 'controller overloaded'})
+                    return
+                try:
+                    if controller.latency:
+                        time.sleep(controller.latency)
+                    if roll < controller.throttle_rate:
+                        self._send(429, {'error': 'too many requests'}, {'Retry-After': '0'})
+                        return
+                    if roll < controller.throttle_rate + controller.error_rate:
+                        self._send(503, {'error': 'service unavailable'})
+                        return
+
+                    self._static_dns(method, match.group(1), match.group(2), body)
+                finally:
+                    with controller.lock:
+                        controller.in_flight -= 1
+
+            def _login(self, body: Dict) -> None:
+                if ((controller.username is not None and body.get('username') != controller.username) or
+                        (controller.password is not None and body.get('password') != controller.password)):
+                    self._send(401, {'error': 'invalid credentials'})
+                    return
+                csrf_token = uuid.uuid4().hex
+                expires_at = time.time() + controller.token_ttl
+                token = make_jwt(csrf_token, expires_at)
+                with controller.lock:
+                    controller.sessions[token] = {'csrf_token': csrf_token, 'expires_at': expires_at}
+                self._send(200, {'deviceToken': uuid.uuid4().hex}, {'Set-Cookie': f"TOKEN={token}; Path=/"})
+
+            def _static_dns(self, method: str, site: str, record_id: Optional[str], body) -> None:
+                with controller.lock:
+                    records = controller.sites.setdefault(site, {})
+                    if method == 'GET' and record_id is None:
+                        result = (200, list(records.values()))
+                    elif method == 'POST' and record_id is None and isinstance(body, dict):
+                        record = dict(body, _id=uuid.uuid4().hex)
+                        records[record['_id']] = record
+                        result = (200, record)
+                    elif method == 'PUT' and record_id and isinstance(body, dict):
+                        if record_id in records:
+                            records[record_id] = dict(body, _id=record_id)
+                            result = (200, records[record_id])
+                        else:
+                            result = (404, {'error': 'record not found'})
+                    elif method == 'DELETE' and record_id:
+                        if records.pop(record_id, None) is not None:
+                            result = (200, {})
+                        else:
+                            result = (404, {'error': 'record not found'})
+                    else:
+                        result = (400, {'error': 'bad request'})
+                self._send(*result)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+            def do_DELETE(self):
+                self._handle('DELETE')
+
+        return Handler
+
+
+def main() -> None:
+    """Run a mock controller until interrupted."""
+    parser = argparse.ArgumentParser(description="Run a mock Unifi controller for benchmarks and testing")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--username", help="Accepted username (default: any)")
+    parser.add_argument("--password", help="Accepted password (default: any)")
+    parser.add_argument("--records", type=int, default=0, help="Number of A records to seed (default: 0)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 503 responses (default: 0)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of 429 responses (default: 0)")
+    parser.add_argument("--capacity", type=int, help="Concurrent requests handled before answering 503 (default: unlimited)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    controller = MockController(
+        host=args.host,
+        port=args.port,
+        username=args.username,
+        password=args.password,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        records=args.records,
+        capacity=args.capacity
+    )
+    controller.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
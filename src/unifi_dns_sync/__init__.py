@@ -9,7 +9,24 @@ __author__ = "cswitenky"
 __email__ = ""
 __description__ = "Automatically sync DNS A records on Unifi controllers"
 
-from .dns_manager import UnifiDNSManager
-from .sync import DNSSync
-
 __all__ = ["UnifiDNSManager", "DNSSync"]
+
+# Exports are resolved on first access (PEP 562), so importing the package, or
+# the CLI inside it, does not load requests until a controller is contacted
+_LAZY_EXPORTS = {
+    "UnifiDNSManager": ".dns_manager",
+    "DNSSync": ".sync",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        from importlib import import_module
+        value = getattr(import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_EXPORTS))
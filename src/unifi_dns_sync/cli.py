@@ -7,10 +7,30 @@ This module provides the command line interface for the unifi-dns-sync tool.
 import argparse
 import logging
 import sys
-from typing import Dict
+import time
+from dataclasses import replace
+from typing import TYPE_CHECKING, Dict, Optional
 
-from .dns_manager import UnifiDNSManager
-from .sync import DNSSync
+from .config import (
+    ConfigLoader, TransportConfig, DEFAULT_COALESCE_WINDOW, DEFAULT_CONCURRENCY, DEFAULT_LISTEN, DEFAULT_RECONCILE_INTERVAL, DEFAULT_SITE
+)
+from .entry_cache import load_entries_cached
+from .journal import SyncJournal
+from .metrics import Metrics
+from .plan import ChangePlan, merge_plans
+from .report import DEFAULT_UNCHANGED_LIMIT, REPORT_FORMATS, ChangeReport, TextReport, create_report
+from .scope import DomainScope
+from .state import (
+    DEFAULT_MAX_VERIFY_AGE, StateStore, SyncState,
+    fingerprint_applied, fingerprint_entries, fingerprint_records, source_signature
+)
+from .sync import DNSSync, INPUT_FORMATS
+from .token_cache import TokenCache, default_cache_path
+from .watch import DNSWatcher, DEFAULT_DEBOUNCE, DEFAULT_RESYNC_INTERVAL
+
+if TYPE_CHECKING:
+    from .dns_manager import UnifiDNSManager
+    from .profiling import Profiler
 
 logger = logging.getLogger(__name__)
 
@@ -40,22 +60,69 @@ def create_parser() -> argparse.ArgumentParser:
         help="Path to JSON file containing hostnames or host-to-IP mappings, or '-' for stdin (default: stdin)"
     )
     
+    parser.add_argument(
+        "--input-format",
+        choices=INPUT_FORMATS,
+        default="auto",
+        help="Format of the hostnames input: a JSON array, newline-delimited JSON, "
+             "or auto-detect (default: auto)"
+    )
+
+    parser.add_argument(
+        "--no-entry-cache",
+        action="store_true",
+        help="Do not read or write the compiled cache of the hostnames file "
+             "(kept in $XDG_CACHE_HOME/unifi-dns-sync/entries/)"
+    )
+    
     parser.add_argument(
         "--controller", 
-        required=True, 
-        help="Unifi controller URL (e.g., https://10.0.0.1)"
+        help="Unifi controller URL (e.g., https://10.0.0.1), required unless --fleet is given"
     )
     
     parser.add_argument(
         "--username", 
-        required=True, 
-        help="Unifi controller username"
+        help="Unifi controller username (with --fleet, the default for controllers without one)"
     )
     
     parser.add_argument(
         "--password", 
-        required=True, 
-        help="Unifi controller password"
+        help="Unifi controller password (with --fleet, the default for controllers without one)"
+    )
+    
+    parser.add_argument(
+        "--fleet",
+        metavar="FILE",
+        help="Sync the same records to every controller listed in a fleet config FILE"
+    )
+    
+    parser.add_argument(
+        "--fleet-parallel",
+        type=int,
+        metavar="N",
+        help="With --fleet, sync at most N controllers at a time (default: max_parallel from the fleet file)"
+    )
+    
+    parser.add_argument(
+        "--site",
+        default=DEFAULT_SITE,
+        help=f"Controller site to sync (default: {DEFAULT_SITE})"
+    )
+    
+    parser.add_argument(
+        "--sites",
+        action="store_true",
+        help="Treat the JSON file as an object mapping site names to host lists and sync all "
+             "sites over one session"
+    )
+    
+    parser.add_argument(
+        "--scope",
+        action="append",
+        metavar="PATTERN",
+        help="Only manage records under this zone, '*.example.com' for its subdomains or 'example.com' "
+             "to include the zone's own name; records outside every scope are left alone and each "
+             "zone is synced as its own shard (repeatable)"
     )
     
     parser.add_argument(
@@ -76,6 +143,217 @@ def create_parser() -> argparse.ArgumentParser:
         help="Show detailed diff of DNS record changes"
     )
     
+    parser.add_argument(
+        "--report",
+        choices=REPORT_FORMATS,
+        help="Report every change as it is applied: the text diff, NDJSON lines, one JSON document, "
+             "or only a summary per sync (default: text with --show-diff, otherwise none)"
+    )
+    
+    parser.add_argument(
+        "--report-file",
+        metavar="FILE",
+        help="Write the --report to FILE instead of stdout"
+    )
+    
+    parser.add_argument(
+        "--diff-unchanged",
+        type=int,
+        default=DEFAULT_UNCHANGED_LIMIT,
+        metavar="N",
+        help=f"List at most N unchanged records in the text diff, -1 for all (default: {DEFAULT_UNCHANGED_LIMIT})"
+    )
+    
+    parser.add_argument(
+        "--plan-out",
+        metavar="FILE",
+        help="Write the computed change plan to FILE (combine with --dry-run to only plan)"
+    )
+    
+    parser.add_argument(
+        "--apply-plan",
+        metavar="FILE",
+        help="Apply a plan previously written with --plan-out instead of computing one"
+    )
+    
+    parser.add_argument(
+        "--journal",
+        metavar="FILE",
+        help="Record the plan and every confirmed change in FILE so an interrupted sync can be "
+             "resumed or rolled back"
+    )
+    
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="With --journal, finish an interrupted sync without recomputing its plan"
+    )
+    
+    parser.add_argument(
+        "--rollback",
+        action="store_true",
+        help="With --journal, undo the changes an interrupted sync already made"
+    )
+    
+    parser.add_argument(
+        "--state-file",
+        metavar="FILE",
+        help="Record fingerprints of the desired entries and controller records after each successful sync"
+    )
+    
+    parser.add_argument(
+        "--skip-if-unchanged",
+        action="store_true",
+        help="With --state-file, exit without contacting the controller when the desired entries are unchanged"
+    )
+    
+    parser.add_argument(
+        "--max-verify-age",
+        type=float,
+        default=DEFAULT_MAX_VERIFY_AGE,
+        metavar="SECONDS",
+        help=f"Force a full sync when the last one is older than this (default: {DEFAULT_MAX_VERIFY_AGE})"
+    )
+    
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and apply changes whenever the JSON file changes"
+    )
+    
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEFAULT_DEBOUNCE,
+        metavar="SECONDS",
+        help=f"With --watch, wait for this long without edits before applying (default: {DEFAULT_DEBOUNCE:g})"
+    )
+    
+    parser.add_argument(
+        "--resync-interval",
+        type=float,
+        default=DEFAULT_RESYNC_INTERVAL,
+        metavar="SECONDS",
+        help=f"With --watch, run a full resync this often, 0 to disable (default: {DEFAULT_RESYNC_INTERVAL:g})"
+    )
+    
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Keep running and serve a local REST API for upserting and deleting individual records"
+    )
+    
+    parser.add_argument(
+        "--listen",
+        default=DEFAULT_LISTEN,
+        metavar="HOST:PORT",
+        help=f"With --serve, address to listen on (default: {DEFAULT_LISTEN})"
+    )
+    
+    parser.add_argument(
+        "--reconcile-interval",
+        type=float,
+        default=DEFAULT_RECONCILE_INTERVAL,
+        metavar="SECONDS",
+        help="With --serve, refresh the record mirror from the controller this often, 0 to disable "
+             f"(default: {DEFAULT_RECONCILE_INTERVAL:g})"
+    )
+    
+    parser.add_argument(
+        "--coalesce-window",
+        type=float,
+        default=DEFAULT_COALESCE_WINDOW,
+        metavar="SECONDS",
+        help="With --serve, collect changes for this long and apply only the last state of each hostname "
+             f"(default: {DEFAULT_COALESCE_WINDOW:g})"
+    )
+    
+    parser.add_argument(
+        "--api-token",
+        metavar="TOKEN",
+        help="With --serve, require this bearer token on every API request"
+    )
+    
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=f"Maximum number of record changes applied in parallel (default: {DEFAULT_CONCURRENCY})"
+    )
+    
+    transport_defaults = TransportConfig()
+    
+    parser.add_argument(
+        "--adaptive-concurrency",
+        action="store_true",
+        help="Adjust the number of record changes in flight between --min-concurrency and --concurrency "
+             "based on controller latency and 429/5xx responses"
+    )
+    
+    parser.add_argument(
+        "--min-concurrency",
+        type=int,
+        default=transport_defaults.min_concurrency,
+        help=f"With --adaptive-concurrency, never go below this many writes in flight "
+             f"(default: {transport_defaults.min_concurrency})"
+    )
+    
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=transport_defaults.connect_timeout,
+        help=f"Seconds to wait when connecting to the controller (default: {transport_defaults.connect_timeout:g})"
+    )
+    
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=transport_defaults.read_timeout,
+        help=f"Seconds to wait for a controller response (default: {transport_defaults.read_timeout:g})"
+    )
+    
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=transport_defaults.max_retries,
+        help="Retries with backoff for throttled (429) or failed idempotent requests "
+             f"(default: {transport_defaults.max_retries})"
+    )
+    
+    parser.add_argument(
+        "--token-cache",
+        nargs="?",
+        const=default_cache_path(),
+        default=None,
+        metavar="PATH",
+        help="Cache the controller session on disk and reuse it until it expires "
+             f"(default path: {default_cache_path()})"
+    )
+    
+    parser.add_argument(
+        "--metrics-prom",
+        metavar="FILE",
+        help="Write run metrics to FILE in Prometheus textfile-collector format"
+    )
+    
+    parser.add_argument(
+        "--metrics-json",
+        metavar="FILE",
+        help="Write run metrics to FILE as a JSON summary"
+    )
+    
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="Profile the run with cProfile, write the results to DIR and print the hottest functions"
+    )
+    
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="With --profile, also record the peak traced memory of each phase (slows the run down)"
+    )
+    
     parser.add_argument(
         "--verbose", "-v", 
         action="store_true", 
@@ -85,64 +363,301 @@ def create_parser() -> argparse.ArgumentParser:
     return parser
 
 
-def run_dry_run(dns_manager: UnifiDNSManager, desired_entries: list, show_diff: bool) -> None:
-    """Run in dry-run mode to show what would change.
+def run_dry_run(dns_manager: 'UnifiDNSManager', plan: ChangePlan, show_diff: bool) -> None:
+    """Run in dry-run mode to show what would change, zone by zone if the plan was sharded."""
+    logger.info("DRY RUN MODE - No changes will be made")
+    summary = plan.summary()
+    logger.info(f"Would make: {summary['created']} created, {summary['updated']} updated, "
+                f"{summary['deleted']} deleted, {summary['existing']} existing")
+
+    if show_diff and dns_manager.report is None:
+        logger.info("\nDRY RUN - PREVIEW OF CHANGES:")
+        print()  # Add a blank line for better separation
+    for shard in plan.shards or (plan,):
+        dns_manager.preview_plan(shard, show_diff)
+
+
+def apply_changes(dns_manager: 'UnifiDNSManager', plan: ChangePlan, show_diff: bool,
+                  on_applied=None) -> Dict[str, int]:
+    """Apply a plan, or the zone shards it was merged from concurrently."""
+    if plan.shards:
+        return dns_manager.apply_shards({shard.zone: shard for shard in plan.shards},
+                                        show_diff=show_diff, on_applied=on_applied)
+    return dns_manager.apply_plan(plan, show_diff=show_diff, on_applied=on_applied)
+
+
+def load_entries(json_file: str, input_format: str = 'auto', use_cache: bool = True) -> list:
+    """Load and validate the desired entries named on the command line."""
+    if json_file == '-':
+        logger.info("Loading hostnames from stdin...")
+    else:
+        logger.info(f"Loading hostnames from {json_file}")
+
+    if use_cache and json_file != '-':
+        entries = load_entries_cached(json_file, input_format)
+    else:
+        entries = DNSSync.load_hostnames_from_json(json_file, input_format)
+
+    # Filter and validate entries
+    valid_entries = DNSSync.filter_valid_hostnames(entries)
+    if len(valid_entries) != len(entries):
+        logger.warning(f"Filtered {len(entries) - len(valid_entries)} invalid host entries")
+
+    logger.info(f"Loaded {len(valid_entries)} valid host entries")
+    return valid_entries
+
+
+def transport_from_args(args: argparse.Namespace) -> TransportConfig:
+    """Build the HTTP transport settings given on the command line."""
+    return TransportConfig(
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        max_retries=args.max_retries,
+        adaptive_concurrency=args.adaptive_concurrency,
+        min_concurrency=args.min_concurrency
+    )
+
+
+def create_manager(args: argparse.Namespace, metrics: Optional[Metrics] = None,
+                   report: Optional[ChangeReport] = None) -> 'UnifiDNSManager':
+    """Create an authenticated DNS manager from command line arguments."""
+    # requests and urllib3 are only loaded once a controller is actually contacted
+    from .dns_manager import UnifiDNSManager
+
+    return UnifiDNSManager(
+        controller_url=args.controller,
+        username=args.username,
+        password=args.password,
+        target_ip=args.target_ip,
+        concurrency=args.concurrency,
+        token_cache=TokenCache(args.token_cache) if args.token_cache else None,
+        transport=transport_from_args(args),
+        metrics=metrics,
+        site=args.site,
+        report=report
+    )
+
+
+def write_metrics(args: argparse.Namespace, metrics: Metrics) -> None:
+    """Export metrics to the files requested on the command line."""
+    try:
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+    except OSError as e:
+        logger.error(f"Failed to write metrics: {e}")
+
+
+def open_report(args: argparse.Namespace) -> Optional[ChangeReport]:
+    """Create the change report requested on the command line, if any."""
+    report_format = args.report or ('text' if args.show_diff else None)
+    if report_format is None:
+        return None
+    unchanged_limit = None if args.diff_unchanged < 0 else args.diff_unchanged
+    try:
+        return create_report(report_format, args.report_file, unchanged_limit)
+    except OSError as e:
+        logger.error(f"Cannot write report: {e}")
+        sys.exit(1)
+
+
+def start_profiler(args: argparse.Namespace, metrics: Metrics) -> 'Profiler':
+    """Start profiling the run as requested on the command line."""
+    # cProfile and pstats are only loaded when profiling
+    from .profiling import Profiler
+
+    profiler = Profiler(args.profile, trace_memory=args.profile_memory).attach(metrics)
+    profiler.start()
+    return profiler
+
+
+def finish_profiler(profiler: 'Profiler') -> None:
+    """Stop profiling, write the profile and print its summary."""
+    profiler.stop()
+    try:
+        profiler.write()
+    except OSError as e:
+        logger.error(f"Failed to write profile: {e}")
+    print(profiler.summary(), file=sys.stderr)
+
+
+def run_watch(args: argparse.Namespace, metrics: Metrics, report: Optional[ChangeReport] = None) -> None:
+    """Run in watch mode until interrupted."""
+    dns_manager = create_manager(args, metrics, report)
+
+    def on_sync(results: Dict[str, int]) -> None:
+        metrics.success = not results['failed']
+        write_metrics(args, metrics)
+
+    watcher = DNSWatcher(
+        dns_manager,
+        args.json_file,
+        debounce=args.debounce,
+        resync_interval=args.resync_interval,
+        show_diff=args.show_diff,
+        on_sync=on_sync,
+        input_format=args.input_format
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+
+
+def run_serve(args: argparse.Namespace, metrics: Metrics, report: Optional[ChangeReport] = None) -> None:
+    """Serve the record API until interrupted."""
+    from .server import DNSServer, DNSService
 
-    desired_entries: list of normalized dicts with 'hostname' and optional 'ip'.
+    dns_manager = create_manager(args, metrics, report)
+
+    def on_sync(results: Dict[str, int]) -> None:
+        metrics.success = not results['failed']
+        write_metrics(args, metrics)
+
+    service = DNSService(
+        dns_manager,
+        reconcile_interval=args.reconcile_interval,
+        show_diff=args.show_diff,
+        on_sync=on_sync,
+        coalesce_window=args.coalesce_window
+    )
+    server = DNSServer(service, args.listen, token=args.api_token)
+    service.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopped serving")
+    finally:
+        service.stop()
+
+
+def check_journal_free(path: str) -> None:
+    """Refuse to start a new journaled sync over an unfinished one."""
+    try:
+        journal = SyncJournal.open(path)
+    except FileNotFoundError:
+        return
+    except ValueError as e:
+        raise ValueError(f"Cannot reuse journal {path}: {e}")
+    journal.close()
+    if not journal.finished:
+        raise ValueError(f"Journal {path} holds an unfinished sync; run with --resume or --rollback "
+                         "first, or remove it")
+
+
+def run_journal_recovery(args: argparse.Namespace, metrics: Metrics, report: Optional[ChangeReport] = None) -> bool:
     """
-    logger.info("DRY RUN MODE - No changes will be made")
-    logger.info(f"Would sync these entries: {desired_entries}")
-
-    if show_diff:
-        # Get current state and show what would change
-        existing_records = dns_manager.get_existing_dns_records()
-        # Build existing map hostname -> set of ips
-        existing_map = {}
-        for record in existing_records:
-            if record.get('record_type') != 'A':
-                continue
-            existing_map.setdefault(record.get('key'), set()).add(record.get('value'))
-
-        # Normalize desired entries into hostname -> single ip mapping
-        desired_map = {}
-        for entry in desired_entries:
-            hostname = entry.get('hostname') if isinstance(entry, dict) else entry
-            ip = entry.get('ip') if isinstance(entry, dict) else None
-            if ip is None:
-                desired_map[hostname] = {dns_manager.target_ip}
-            else:
-                desired_map[hostname] = {ip}
+    Resume or roll back the sync recorded in the journal.
 
-        # Construct changes structure compatible with _display_diff
-        changes = {'created': [], 'deleted': [], 'unchanged': []}
+    Returns:
+        True if every remaining operation was applied
+    """
+    action = 'resume' if args.resume else 'roll back'
+    with SyncJournal.open(args.journal) as journal:
+        if journal.finished:
+            logger.info(f"Journal {args.journal} has nothing to {action}")
+            return True
+        logger.info(f"Journal {args.journal}: {len(journal.done)} of {len(journal.operations)} operations "
+                    f"confirmed, {len(journal.undone)} rolled back")
 
-        desired_hostnames = set(desired_map.keys())
-        existing_hostnames = set(existing_map.keys())
+        dns_manager = create_manager(args, metrics, report)
+        if args.resume:
+            existing_records = dns_manager.get_existing_dns_records(journal.plan.site)
+            plan = journal.reconcile(existing_records)
+            on_applied = journal.record_applied
+        else:
+            plan, compensations = journal.rollback_plan()
 
-        for hostname in desired_hostnames:
-            desired_ips = desired_map.get(hostname, {dns_manager.target_ip})
-            existing_ips = existing_map.get(hostname, set())
+            def on_applied(op, result):
+                journal.record_undone(compensations[op])
 
-            # Since only one IP is allowed per hostname, take the single desired IP
-            desired_ip = next(iter(desired_ips))
+        if args.dry_run:
+            run_dry_run(dns_manager, plan, args.show_diff)
+            return True
 
-            if desired_ip in existing_ips:
-                changes['unchanged'].append((hostname, desired_ip))
+        results = dns_manager.apply_plan(plan, show_diff=args.show_diff, on_applied=on_applied)
+        logger.info(f"{'Resumed' if args.resume else 'Rolled back'}: {results['created']} created, "
+                    f"{results['updated']} updated, {results['deleted']} deleted, {results['failed']} failed")
+        if not results['failed']:
+            # Operations rollback_plan skipped cannot be undone; retrying would change nothing
+            if args.resume:
+                journal.mark_complete()
             else:
-                changes['created'].append((hostname, desired_ip))
+                journal.mark_rolled_back()
+        return not results['failed']
 
-            # Any existing IPs that are not the desired one should be deleted
-            for ip in sorted(existing_ips - {desired_ip}):
-                changes['deleted'].append((hostname, ip))
 
-        # Hostnames present in existing but not desired should be deleted entirely
-        for hostname in sorted(existing_hostnames - desired_hostnames):
-            for ip in sorted(existing_map.get(hostname, [])):
-                changes['deleted'].append((hostname, ip))
+def run_sites(args: argparse.Namespace, metrics: Metrics, report: Optional[ChangeReport] = None) -> bool:
+    """
+    Sync every site listed in a site file over one session.
 
-        logger.info("\nDRY RUN - PREVIEW OF CHANGES:")
-        print()  # Add a blank line for better separation
-        dns_manager._display_diff(changes)
+    Returns:
+        True if every site was synced without failures
+    """
+    with metrics.phase('load'):
+        desired_by_site = DNSSync.load_sites_from_json(args.json_file)
+    total = sum(len(entries) for entries in desired_by_site.values())
+    logger.info(f"Loaded {total} valid host entries for {len(desired_by_site)} sites")
+
+    dns_manager = create_manager(args, metrics, report)
+
+    if args.dry_run:
+        for site, plan in sorted(dns_manager.plan_sites(desired_by_site).items()):
+            logger.info(f"Site {site}:")
+            run_dry_run(dns_manager, plan, args.show_diff)
+        return True
+
+    results = dns_manager.sync_sites(desired_by_site, show_diff=args.show_diff)
+
+    ok = True
+    for site, site_results in sorted(results.items()):
+        if 'error' in site_results:
+            logger.error(f"Site {site}: failed: {site_results['error']}")
+            ok = False
+            continue
+        logger.info(f"Site {site}: {site_results['created']} created, {site_results['updated']} updated, "
+                    f"{site_results['deleted']} deleted, {site_results['existing']} existing, "
+                    f"{site_results['failed']} failed, {site_results['retries']} retries")
+        ok = ok and not site_results['failed']
+    return ok
+
+
+def run_fleet(args: argparse.Namespace, metrics: Metrics, report: Optional[ChangeReport] = None) -> bool:
+    """
+    Sync the desired entries to every controller of a fleet.
+
+    Returns:
+        True if every controller was synced without failures
+    """
+    from .fleet import FleetSync, display_fleet_summary
+
+    # The command line's transport settings apply where the fleet file sets none
+    fleet = ConfigLoader.load_fleet(args.fleet, username=args.username, password=args.password,
+                                    transport_defaults=transport_from_args(args))
+    if args.fleet_parallel:
+        fleet.max_parallel = args.fleet_parallel
+    if args.adaptive_concurrency:
+        fleet.transport = replace(fleet.transport, adaptive_concurrency=True, min_concurrency=args.min_concurrency)
+    with metrics.phase('load'):
+        valid_entries = load_entries(args.json_file, args.input_format, not args.no_entry_cache)
+
+    fleet_sync = FleetSync(
+        fleet,
+        concurrency=args.concurrency,
+        token_cache=TokenCache(args.token_cache) if args.token_cache else None,
+        metrics=metrics,
+        default_target_ip=args.target_ip,
+        default_site=args.site,
+        report=report
+    )
+    if args.dry_run:
+        logger.info("DRY RUN MODE - No changes will be made")
+    results = fleet_sync.run(valid_entries, dry_run=args.dry_run, show_diff=args.show_diff)
+    # Keep a machine-readable report on stdout parseable
+    machine_report = report is not None and not isinstance(report, TextReport) and report.stream is sys.stdout
+    display_fleet_summary(results, sys.stderr if machine_report else None)
+    return all(result.status == 'ok' for result in results)
 
 
 def main() -> None:
@@ -150,53 +665,199 @@ def main() -> None:
     parser = create_parser()
     args = parser.parse_args()
     
+    if args.fleet:
+        if args.watch or args.sites or args.apply_plan or args.plan_out or args.state_file:
+            parser.error("--fleet cannot be combined with --watch, --sites, --apply-plan, --plan-out or --state-file")
+    elif not (args.controller and args.username and args.password):
+        parser.error("--controller, --username and --password are required unless --fleet is given")
+    if args.fleet_parallel is not None and args.fleet_parallel < 1:
+        parser.error("--fleet-parallel must be at least 1")
+    if args.serve:
+        if args.json_file != '-':
+            parser.error("--serve does not take a JSON file")
+        if (args.watch or args.fleet or args.sites or args.dry_run or args.apply_plan or args.plan_out
+                or args.journal or args.state_file):
+            parser.error("--serve cannot be combined with --watch, --fleet, --sites, --dry-run, --apply-plan, "
+                         "--plan-out, --journal or --state-file")
+        if args.reconcile_interval < 0 or args.coalesce_window < 0:
+            parser.error("--reconcile-interval and --coalesce-window must not be negative")
+    if args.watch and (args.dry_run or args.apply_plan or args.json_file == '-'):
+        parser.error("--watch needs a JSON file and cannot be combined with --dry-run or --apply-plan")
+    if args.sites and (args.watch or args.apply_plan or args.plan_out or args.state_file or args.journal):
+        parser.error("--sites cannot be combined with --watch, --apply-plan, --plan-out, --state-file or --journal")
+    if args.resume or args.rollback:
+        if not args.journal or (args.resume and args.rollback):
+            parser.error("--resume and --rollback each need --journal and cannot be combined")
+        if args.watch or args.fleet or args.apply_plan:
+            parser.error("--resume and --rollback cannot be combined with --watch, --fleet or --apply-plan")
+    if args.journal and (args.watch or args.fleet):
+        parser.error("--journal cannot be combined with --watch or --fleet")
+    scope = None
+    if args.scope:
+        if args.watch or args.serve or args.fleet or args.sites or args.apply_plan or args.resume or args.rollback:
+            parser.error("--scope cannot be combined with --watch, --serve, --fleet, --sites, --apply-plan, "
+                         "--resume or --rollback")
+        try:
+            scope = DomainScope(args.scope)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    if args.profile_memory and not args.profile:
+        parser.error("--profile-memory needs --profile")
+    if args.report_file and not args.report:
+        parser.error("--report-file needs --report")
+    if args.show_diff and args.report not in (None, 'text'):
+        parser.error("--show-diff cannot be combined with a --report other than text")
+    
     # Set up logging
     setup_logging(args.verbose)
+    metrics = Metrics()
+    report = open_report(args)
+    profiler = start_profiler(args, metrics) if args.profile else None
     
     try:
-        # Load desired hostnames/entries
-        if args.json_file == '-':
-            logger.info("Loading hostnames from stdin...")
-        else:
-            logger.info(f"Loading hostnames from {args.json_file}")
+        if args.watch:
+            run_watch(args, metrics, report)
+            return
+
+        if args.serve:
+            run_serve(args, metrics, report)
+            return
 
-        entries = DNSSync.load_hostnames_from_json(args.json_file)
+        if args.fleet:
+            metrics.success = run_fleet(args, metrics, report)
+            if not metrics.success:
+                sys.exit(1)
+            return
 
-        # Filter and validate entries
-        valid_entries = DNSSync.filter_valid_hostnames(entries)
-        if len(valid_entries) != len(entries):
-            logger.warning(f"Filtered {len(entries) - len(valid_entries)} invalid host entries")
+        if args.resume or args.rollback:
+            metrics.success = run_journal_recovery(args, metrics, report)
+            if not metrics.success:
+                sys.exit(1)
+            return
 
-        logger.info(f"Loaded {len(valid_entries)} valid host entries")
+        if args.journal and not args.dry_run:
+            check_journal_free(args.journal)
+
+        if args.sites:
+            metrics.success = run_sites(args, metrics, report)
+            if not metrics.success:
+                sys.exit(1)
+            return
+
+        state_store = StateStore(args.state_file) if args.state_file else None
+        state = state_store.load() if state_store else None
+        controller_url = args.controller.rstrip('/')
+        scope_patterns = scope.patterns if scope is not None else None
+        # A different target IP changes every entry without an IP of its own,
+        # even when the desired-state file is untouched
+        if state is not None and (state.controller != controller_url or state.site != args.site
+                                  or state.scope != scope_patterns or state.target_ip != args.target_ip):
+            state = None
+
+        # Only real syncs from a desired-state file may take the no-op shortcut
+        can_skip = args.skip_if_unchanged and state is not None and not (args.dry_run or args.apply_plan)
+        if can_skip and not state.is_fresh(args.max_verify_age):
+            logger.info("Last verification is too old, running a full sync")
+            can_skip = False
+
+        if can_skip and state.source_unchanged(args.json_file):
+            logger.info("Desired state file unchanged since last sync, nothing to do")
+            metrics.success = True
+            return
+
+        plan = None
+        valid_entries = None
+        desired_fingerprint = None
+        # Taken before the entries are read, so an edit made while they are
+        # loaded or applied is seen as a change by the next run
+        source = source_signature(args.json_file)
+        if args.apply_plan:
+            logger.info(f"Loading change plan from {args.apply_plan}")
+            plan = ChangePlan.load(args.apply_plan)
+        else:
+            with metrics.phase('load'):
+                valid_entries = load_entries(args.json_file, args.input_format, not args.no_entry_cache)
+            # Entries outside the scope are never synced, so they are not part of the state
+            scoped_entries = valid_entries if scope is None else \
+                [entry for entry in valid_entries if entry['hostname'] in scope]
+            desired_fingerprint = fingerprint_entries(scoped_entries, args.target_ip)
+            if can_skip and desired_fingerprint == state.desired_fingerprint:
+                logger.info("Desired entries unchanged since last sync, nothing to do")
+                state.source_path = args.json_file
+                state.source_signature = source
+                state_store.save(state)
+                metrics.success = True
+                return
 
         # Initialize DNS manager
-        dns_manager = UnifiDNSManager(
-            controller_url=args.controller,
-            username=args.username,
-            password=args.password,
-            target_ip=args.target_ip
-        )
+        dns_manager = create_manager(args, metrics, report)
+
+        if plan is None:
+            existing_records = dns_manager.get_existing_dns_records(scope=scope)
+            if (state is not None and desired_fingerprint == state.desired_fingerprint
+                    and fingerprint_records(existing_records) == state.controller_fingerprint):
+                logger.info("Controller records unchanged since last sync")
+            if scope is not None:
+                shards = dns_manager.plan_shards(valid_entries, scope, existing_records)
+                logger.info(f"Planned {len(shards)} zones of scope {scope.patterns}")
+                plan = merge_plans(shards.values())
+            else:
+                plan = dns_manager.plan_changes(valid_entries, existing_records)
+        if args.plan_out:
+            plan.save(args.plan_out)
 
         if args.dry_run:
-            run_dry_run(dns_manager, valid_entries, args.show_diff)
+            run_dry_run(dns_manager, plan, args.show_diff)
+            metrics.success = True
             return
 
         # Perform synchronization
-        results = dns_manager.sync_dns_records(valid_entries, show_diff=args.show_diff)
+        if args.journal:
+            with SyncJournal.create(args.journal, plan) as journal:
+                results = apply_changes(dns_manager, plan, args.show_diff, journal.record_applied)
+                if not results['failed']:
+                    journal.mark_complete()
+        else:
+            results = apply_changes(dns_manager, plan, args.show_diff)
         
         # Report results
         logger.info("Synchronization completed successfully!")
-        logger.info(f"Results: {results['created']} created, {results['deleted']} deleted, {results['existing']} existing")
+        logger.info(f"Results: {results['created']} created, {results['updated']} updated, {results['deleted']} deleted, {results['existing']} existing, {results['failed']} failed, {results['retries']} retries")
+        metrics.success = not results['failed']
+
+        # Remember what was applied, but only if the controller now matches it
+        if state_store and desired_fingerprint and not results['failed']:
+            state_store.save(SyncState(
+                controller=controller_url,
+                desired_fingerprint=desired_fingerprint,
+                # What the controller holds now, including records the sync left alone
+                controller_fingerprint=fingerprint_applied(existing_records, plan),
+                verified_at=time.time(),
+                source_path=args.json_file,
+                source_signature=source,
+                site=args.site,
+                scope=scope_patterns,
+                target_ip=args.target_ip
+            ))
         
     except KeyboardInterrupt:
         logger.info("Operation cancelled by user")
+        metrics.success = False
         sys.exit(1)
     except Exception as e:
         logger.error(f"Operation failed: {e}")
+        metrics.success = False
         if args.verbose:
             import traceback
             traceback.print_exc()
         sys.exit(1)
+    finally:
+        if report is not None:
+            report.close()
+        if profiler is not None:
+            finish_profiler(profiler)
+        write_metrics(args, metrics)
 
 
 if __name__ == "__main__":
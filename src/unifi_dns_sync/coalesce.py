@@ -0,0 +1,139 @@
+"""
+Mutation coalescing for Unifi DNS Sync
+
+This module queues record mutations for a short window and hands them on in
+batches holding only the last requested state of each hostname, so a hostname
+touched many times in quick succession costs one controller change, and
+changes that cancel out, such as a create followed by a delete, cost none.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .config import DEFAULT_COALESCE_WINDOW
+
+logger = logging.getLogger(__name__)
+
+# Flush without waiting out the window once this many hostnames are pending
+DEFAULT_MAX_BATCH = 1000
+
+ApplyBatch = Callable[[List[Dict], List[str]], Dict]
+
+
+class MutationQueue:
+    """
+    Merges upserts and deletes per hostname and applies them in batches.
+
+    Mutations are applied by a single worker thread, in the order the batches
+    were closed. Within a batch, a later mutation of a hostname replaces any
+    earlier one, whichever kind either is.
+    """
+
+    def __init__(self, apply_batch: ApplyBatch, window: float = DEFAULT_COALESCE_WINDOW,
+                 max_batch: int = DEFAULT_MAX_BATCH):
+        """
+        Initialize the queue.
+
+        Args:
+            apply_batch: Called with the batch's upsert entries and deleted
+                hostnames; its return value is the result of every submission
+                in the batch
+            window: Seconds to collect further mutations after the first one
+                arrives (0 applies immediately, still merging whatever queued
+                up while the previous batch was applied)
+            max_batch: Number of pending hostnames that closes a batch early
+        """
+        self.apply_batch = apply_batch
+        self.window = window
+        self.max_batch = max_batch
+        # hostname -> upsert entry, or None for a delete
+        self._pending: Dict[str, Optional[Dict]] = {}
+        self._waiters: List[Future] = []
+        self._submitted = 0
+        self._first_at: Optional[float] = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='mutation-queue', daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def submit(self, upserts: Iterable[Dict] = (), deletes: Iterable[str] = ()) -> Future:
+        """
+        Queue mutations.
+
+        Args:
+            upserts: Normalized entries with 'hostname' and 'ip'
+            deletes: Hostnames whose records are removed
+
+        Returns:
+            A future resolved with the result of the batch the mutations were
+            applied in, or with its exception
+        """
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Mutation queue is closed")
+            for entry in upserts:
+                self._pending[entry['hostname']] = entry
+                self._submitted += 1
+            for hostname in deletes:
+                self._pending[hostname] = None
+                self._submitted += 1
+            self._waiters.append(future)
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            self._cond.notify()
+        return future
+
+    def close(self) -> None:
+        """Apply whatever is pending, then stop the worker."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _take_batch(self) -> Optional[Tuple[Dict[str, Optional[Dict]], List[Future], int]]:
+        """Wait for a batch to close and take it; None once closed and drained."""
+        with self._cond:
+            while not self._waiters:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            while not self._closed and len(self._pending) < self.max_batch:
+                remaining = self._first_at + self.window - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = (self._pending, self._waiters, self._submitted)
+            self._pending, self._waiters, self._submitted = {}, [], 0
+            self._first_at = None
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            pending, waiters, submitted = batch
+            upserts = [entry for entry in pending.values() if entry is not None]
+            deletes = [hostname for hostname, entry in pending.items() if entry is None]
+            if submitted > len(pending):
+                logger.debug(f"Coalesced {submitted} mutations from {len(waiters)} requests "
+                             f"into {len(pending)} hostnames")
+            try:
+                result = self.apply_batch(upserts, deletes)
+            except BaseException as e:
+                for future in waiters:
+                    future.set_exception(e)
+                if not isinstance(e, Exception):
+                    raise
+                logger.error(f"Failed to apply batch of {len(pending)} hostnames: {e}")
+                continue
+            for future in waiters:
+                future.set_result(result)
@@ -7,11 +7,17 @@ This module provides configuration loading and validation functionality.
 import os
 import json
 import logging
-from typing import Dict, Optional, Any
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Any
+from dataclasses import dataclass, field
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CONCURRENCY = 8
+DEFAULT_SITE = 'default'
+DEFAULT_LISTEN = '127.0.0.1:8053'
+DEFAULT_RECONCILE_INTERVAL = 300.0
+DEFAULT_COALESCE_WINDOW = 0.2
+
 
 @dataclass
 class ControllerConfig:
@@ -35,6 +41,43 @@ class DNSConfig:
     dry_run: bool = False
 
 
+@dataclass
+class TransportConfig:
+    """Configuration for the HTTP transport to the controller."""
+    connect_timeout: float = 10.0
+    read_timeout: float = 30.0
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 30.0
+    pool_size: Optional[int] = None  # None -> match the apply concurrency
+    adaptive_concurrency: bool = False  # Adjust writes in flight between min_concurrency and the concurrency
+    min_concurrency: int = 1
+    
+    def __post_init__(self):
+        if self.max_retries < 0:
+            raise ValueError(f"max_retries must not be negative, got {self.max_retries}")
+        if self.connect_timeout <= 0 or self.read_timeout <= 0:
+            raise ValueError("Timeouts must be positive")
+        if self.min_concurrency < 1:
+            raise ValueError(f"min_concurrency must be at least 1, got {self.min_concurrency}")
+    
+    @classmethod
+    def from_dict(cls, transport_dict: Dict[str, Any],
+                  defaults: Optional['TransportConfig'] = None) -> 'TransportConfig':
+        """Create TransportConfig from dictionary, taking missing keys from defaults (default: TransportConfig())."""
+        defaults = defaults or cls()
+        return cls(
+            connect_timeout=transport_dict.get('connect_timeout', defaults.connect_timeout),
+            read_timeout=transport_dict.get('read_timeout', defaults.read_timeout),
+            max_retries=transport_dict.get('max_retries', defaults.max_retries),
+            backoff_base=transport_dict.get('backoff_base', defaults.backoff_base),
+            backoff_max=transport_dict.get('backoff_max', defaults.backoff_max),
+            pool_size=transport_dict.get('pool_size', defaults.pool_size),
+            adaptive_concurrency=transport_dict.get('adaptive_concurrency', defaults.adaptive_concurrency),
+            min_concurrency=transport_dict.get('min_concurrency', defaults.min_concurrency)
+        )
+
+
 @dataclass
 class AppConfig:
     """Main application configuration."""
@@ -42,6 +85,7 @@ class AppConfig:
     dns: DNSConfig
     hostnames_file: Optional[str] = None
     verbose: bool = False
+    transport: TransportConfig = field(default_factory=TransportConfig)
     
     @classmethod
     def from_dict(cls, config_dict: Dict[str, Any]) -> 'AppConfig':
@@ -65,7 +109,8 @@ class AppConfig:
             controller=controller,
             dns=dns,
             hostnames_file=config_dict.get('hostnames_file'),
-            verbose=config_dict.get('verbose', False)
+            verbose=config_dict.get('verbose', False),
+            transport=TransportConfig.from_dict(config_dict.get('transport', {}))
         )
     
     def to_dict(self) -> Dict[str, Any]:
@@ -82,10 +127,100 @@ class AppConfig:
                 'dry_run': self.dns.dry_run
             },
             'hostnames_file': self.hostnames_file,
-            'verbose': self.verbose
+            'verbose': self.verbose,
+            'transport': {
+                'connect_timeout': self.transport.connect_timeout,
+                'read_timeout': self.transport.read_timeout,
+                'max_retries': self.transport.max_retries,
+                'backoff_base': self.transport.backoff_base,
+                'backoff_max': self.transport.backoff_max,
+                'pool_size': self.transport.pool_size,
+                'adaptive_concurrency': self.transport.adaptive_concurrency,
+                'min_concurrency': self.transport.min_concurrency
+            }
         }
 
 
+@dataclass
+class FleetMember:
+    """One controller of a fleet, with optional overrides of the fleet defaults."""
+    controller: ControllerConfig
+    name: str = ''
+    target_ip: Optional[str] = None
+    site: Optional[str] = None
+    timeout: Optional[float] = None
+    
+    def __post_init__(self):
+        if not self.name:
+            self.name = self.controller.url
+
+
+@dataclass
+class FleetConfig:
+    """Configuration for syncing the same records to many controllers."""
+    controllers: List[FleetMember]
+    max_parallel: int = 8
+    timeout: float = 300.0  # Seconds allowed for each controller's sync
+    target_ip: Optional[str] = None
+    site: Optional[str] = None
+    transport: TransportConfig = field(default_factory=TransportConfig)
+    
+    def __post_init__(self):
+        if self.max_parallel < 1:
+            raise ValueError(f"max_parallel must be at least 1, got {self.max_parallel}")
+        if self.timeout <= 0:
+            raise ValueError("timeout must be positive")
+        names = [member.name for member in self.controllers]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate controller names in fleet: {', '.join(duplicates)}")
+    
+    @classmethod
+    def from_dict(cls, fleet_dict: Dict[str, Any], username: Optional[str] = None,
+                  password: Optional[str] = None,
+                  transport_defaults: Optional[TransportConfig] = None) -> 'FleetConfig':
+        """
+        Create FleetConfig from dictionary.
+        
+        Credentials missing from a controller entry fall back to the fleet's
+        'defaults' section and then to the username and password given here.
+        Transport settings missing from the fleet's 'transport' section are
+        taken from transport_defaults.
+        """
+        defaults = fleet_dict.get('defaults', {})
+        default_username = defaults.get('username', username)
+        default_password = defaults.get('password', password)
+        
+        members = []
+        for entry in fleet_dict.get('controllers', []):
+            if isinstance(entry, str):
+                entry = {'url': entry}
+            if not entry.get('url'):
+                raise ValueError(f"Fleet controller entry without url: {entry}")
+            member_username = entry.get('username', default_username)
+            member_password = entry.get('password', default_password)
+            if not member_username or not member_password:
+                raise ValueError(f"No credentials for fleet controller {entry['url']}")
+            members.append(FleetMember(
+                controller=ControllerConfig(url=entry['url'], username=member_username, password=member_password),
+                name=entry.get('name', ''),
+                target_ip=entry.get('target_ip'),
+                site=entry.get('site'),
+                timeout=entry.get('timeout')
+            ))
+        if not members:
+            raise ValueError("Fleet configuration lists no controllers")
+        
+        return cls(
+            controllers=members,
+            max_parallel=fleet_dict.get('max_parallel', 8),
+            timeout=fleet_dict.get('timeout', 300.0),
+            target_ip=defaults.get('target_ip'),
+            site=defaults.get('site'),
+            transport=TransportConfig.from_dict(fleet_dict.get('transport', {}), transport_defaults)
+        )
+
+
 class ConfigLoader:
     """Handles loading configuration from various sources."""
     
@@ -132,6 +267,22 @@ class ConfigLoader:
             verbose=os.getenv('UNIFI_VERBOSE', 'false').lower() == 'true'
         )
     
+    @staticmethod
+    def load_fleet(fleet_path: str, username: Optional[str] = None, password: Optional[str] = None,
+                   transport_defaults: Optional[TransportConfig] = None) -> FleetConfig:
+        """Load a fleet configuration from JSON file."""
+        try:
+            with open(fleet_path, 'r') as f:
+                fleet_dict = json.load(f)
+            return FleetConfig.from_dict(fleet_dict, username=username, password=password,
+                                         transport_defaults=transport_defaults)
+        except FileNotFoundError:
+            logger.error(f"Fleet file not found: {fleet_path}")
+            raise
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON in fleet file: {e}")
+            raise
+    
     @staticmethod
     def save_to_file(config: AppConfig, config_path: str) -> None:
         """Save configuration to JSON file."""
@@ -4,24 +4,55 @@ DNS Manager for Unifi Controllers
 This module provides the UnifiDNSManager class for managing DNS records on Unifi controllers.
 """
 
+import contextlib
 import json
 import logging
 import base64
-from typing import List, Dict, Set, Optional
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Iterable, List, Dict, Optional, Tuple
 from urllib.parse import urljoin
 import requests
 import urllib3
+from requests.adapters import HTTPAdapter
+
+from .config import DEFAULT_CONCURRENCY, DEFAULT_SITE, TransportConfig
+from .json_stream import CHUNK_SIZE, JSONStreamReader, chunk_reader
+from .metrics import Metrics
+from .plan import ChangePlan, Create, Update, build_plan
+from .ratelimit import AdaptiveLimiter
+from .records import RecordLike, RecordStore
+from .report import ChangeReport, TextReport
+from .scope import DomainScope
+from .token_cache import TokenCache, CachedSession, refresh_margin
 
 # Disable SSL warnings for self-signed certificates
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 logger = logging.getLogger(__name__)
 
+# Methods that are safe to resend after a server error or a dropped connection
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+RETRYABLE_SERVER_ERRORS = frozenset({500, 502, 503, 504})
+
+# Upper bound for a server-provided Retry-After delay, in seconds
+MAX_RETRY_AFTER = 120
+
+
+class SyncCancelled(Exception):
+    """Raised when a request is attempted after the manager was cancelled."""
+
 
 class UnifiDNSManager:
     """Manages DNS records on Unifi controllers."""
     
-    def __init__(self, controller_url: str, username: str, password: str, target_ip: str = "10.0.0.123"):
+    def __init__(self, controller_url: str, username: str, password: str, target_ip: str = "10.0.0.123",
+                 concurrency: int = DEFAULT_CONCURRENCY, token_cache: Optional[TokenCache] = None,
+                 transport: Optional[TransportConfig] = None, metrics: Optional[Metrics] = None,
+                 site: str = DEFAULT_SITE, name: Optional[str] = None, report: Optional[ChangeReport] = None):
         """
         Initialize the Unifi DNS Manager.
         
@@ -30,22 +61,72 @@ class UnifiDNSManager:
             username: Unifi controller username
             password: Unifi controller password
             target_ip: IP address to assign to DNS records (default: 10.0.0.123)
+            concurrency: Maximum number of record writes in flight during a sync (default: 8)
+            token_cache: Optional cache used to reuse a previous session instead of logging in
+            transport: HTTP timeouts, retry policy and pool size (default: TransportConfig())
+            metrics: Collector for phase timings and request latencies (default: a new Metrics)
+            site: Controller site used when a method is not given one (default: 'default')
+            name: Optional label for this controller, shown in diff headers
+            report: Writer receiving every change as it is applied (default: the
+                text diff, printed when show_diff is set)
         """
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+        transport = transport or TransportConfig()
+        if transport.adaptive_concurrency and transport.min_concurrency > concurrency:
+            raise ValueError(f"min_concurrency ({transport.min_concurrency}) exceeds concurrency ({concurrency})")
+
         self.controller_url = controller_url.rstrip('/')
         self.username = username
         self.password = password
         self.target_ip = target_ip
-        self.session = requests.Session()
-        self.session.verify = False  # For self-signed certificates
+        self.concurrency = concurrency
+        self.site = site
+        self.name = name
+        self.report = report
+        self.transport = transport
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.timeout = (self.transport.connect_timeout, self.transport.read_timeout)
+        self.session = self._create_session()
         self.token = None
         self.session_id = None
         self.csrf_token = None
+        self.token_expiry = None
+        self.token_issued_at = None
+        self.token_cache = token_cache
+        self._auth_lock = threading.Lock()
+        self._auth_generation = 0
+        self._stats_lock = threading.Lock()
+        self.retry_count = 0
+        # Bounds record writes across all sites synced at once; with adaptive
+        # concurrency the bound follows the controller's latency and errors
+        self.write_limiter = AdaptiveLimiter(
+            floor=transport.min_concurrency if transport.adaptive_concurrency else concurrency,
+            ceiling=concurrency
+        )
+        self._cancelled = threading.Event()
         
-        # Authenticate on initialization
-        self._authenticate()
+        # Authenticate on initialization, unless a cached session is still valid
+        if not self._restore_cached_session():
+            self._authenticate()
         
+    def _create_session(self) -> requests.Session:
+        """Create the HTTP session with a connection pool sized for the apply concurrency."""
+        pool_size = self.transport.pool_size or self.concurrency
+        # Retries are handled in _make_request so they can honor Retry-After and be counted
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.verify = False  # For self-signed certificates
+        # Every request goes to the same controller, so resolve proxy settings from
+        # the environment once instead of rescanning os.environ on each call
+        session.proxies = requests.utils.get_environ_proxies(self.controller_url)
+        session.trust_env = False
+        return session
+
     def _extract_csrf_token_from_jwt(self, jwt_token: str) -> Optional[str]:
-        """Extract CSRF token from JWT payload."""
+        """Extract CSRF token from JWT payload, recording its iat and exp claims as the token lifetime."""
         try:
             logger.debug(f"Extracting CSRF from JWT: {jwt_token[:50]}...")
             
@@ -66,6 +147,13 @@ class UnifiDNSManager:
             
             logger.debug(f"JWT payload keys: {list(payload_data.keys())}")
             
+            exp = payload_data.get('exp')
+            if isinstance(exp, (int, float)):
+                self.token_expiry = float(exp)
+                # Without an iat claim the token was issued no earlier than this login
+                iat = payload_data.get('iat')
+                self.token_issued_at = float(iat) if isinstance(iat, (int, float)) else time.time()
+
             csrf_token = payload_data.get('csrfToken')
             if csrf_token:
                 logger.debug(f"Found CSRF token: {csrf_token}")
@@ -91,7 +179,9 @@ class UnifiDNSManager:
         
         try:
             logger.info("Authenticating with Unifi controller...")
-            response = self.session.post(login_url, json=login_payload, timeout=30)
+            with self.metrics.phase('authenticate'):
+                response = self._send('POST', login_url, json=login_payload)
+            self.metrics.increment('logins')
             response.raise_for_status()
             
             # Extract tokens from response
@@ -125,7 +215,10 @@ class UnifiDNSManager:
             if not token_cookie and self.token:
                 self.session.cookies.set('TOKEN', self.token)
             
+            self._auth_generation += 1
             logger.info(f"Authentication successful (CSRF token: {'found' if self.csrf_token else 'missing'})")
+
+            self._store_cached_session(token_cookie or self.token)
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Authentication failed: {e}")
@@ -134,73 +227,294 @@ class UnifiDNSManager:
             logger.error(f"Failed to parse authentication response: {e}")
             raise
         
+    def _restore_cached_session(self) -> bool:
+        """Reuse a cached session if one is available and has not expired."""
+        if self.token_cache is None:
+            return False
+
+        cached = self.token_cache.load(self.controller_url, self.username)
+        if cached is None:
+            return False
+
+        self.session.cookies.set('TOKEN', cached.token_cookie)
+        self.token = cached.device_token
+        self.csrf_token = cached.csrf_token
+        self.token_expiry = cached.expires_at
+        self.token_issued_at = cached.issued_at
+        self._auth_generation += 1
+        logger.info("Reusing cached controller session")
+        return True
+
+    def _token_expiring(self) -> bool:
+        """Check whether the session JWT is about to expire."""
+        if self.token_expiry is None:
+            return False
+        return time.time() >= self.token_expiry - refresh_margin(self.token_issued_at, self.token_expiry)
+
+    def _reauthenticate(self, seen_generation: int) -> None:
+        """
+        Log in again, unless another caller already refreshed the session.
+
+        Args:
+            seen_generation: The auth generation the caller's failed or stale request was made with
+        """
+        with self._auth_lock:
+            if self._auth_generation != seen_generation:
+                logger.debug("Session already refreshed by another request")
+                return
+
+            logger.info("Refreshing controller session")
+            if self.token_cache is not None:
+                self.token_cache.invalidate(self.controller_url, self.username)
+            self.session.cookies.clear()
+            self.token = None
+            self.csrf_token = None
+            self.token_expiry = None
+            self.token_issued_at = None
+            self._authenticate()
+
+    def _store_cached_session(self, token_cookie: Optional[str]) -> None:
+        """Save the current session to the token cache, if enabled."""
+        if self.token_cache is None or not token_cookie:
+            return
+        if self.token_expiry is None:
+            logger.debug("Not caching session: JWT has no exp claim")
+            return
+
+        self.token_cache.store(self.controller_url, self.username, CachedSession(
+            token_cookie=token_cookie,
+            csrf_token=self.csrf_token,
+            expires_at=self.token_expiry,
+            device_token=self.token,
+            issued_at=self.token_issued_at
+        ))
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a single HTTP request, recording its latency and outcome."""
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            endpoint = url[len(self.controller_url):] if url.startswith(self.controller_url) else url
+            self.metrics.observe_request(method.upper(), endpoint, status, time.perf_counter() - start)
+
+    def cancel(self) -> None:
+        """
+        Stop the manager from sending further requests.
+
+        Safe to call from another thread; requests already in flight finish
+        (bounded by the transport timeouts), later ones raise SyncCancelled and
+        pending record operations are reported as failed.
+        """
+        self._cancelled.set()
+
+    def _retry_delay(self, retry: int, response: Optional[requests.Response] = None) -> float:
+        """
+        Compute how long to wait before the given retry.
+
+        Honors a Retry-After header when present, otherwise uses exponential
+        backoff with full jitter.
+        """
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    delay = float(retry_after)
+                except ValueError:
+                    try:
+                        delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                    except (TypeError, ValueError):
+                        delay = None
+                if delay is not None:
+                    return min(max(delay, 0.0), MAX_RETRY_AFTER)
+
+        cap = min(self.transport.backoff_max, self.transport.backoff_base * (2 ** retry))
+        return random.uniform(0, cap)
+
+    def _record_retry(self) -> None:
+        with self._stats_lock:
+            self.retry_count += 1
+        self.metrics.increment('http_retries')
+
+    def _observe_write(self, method: str, response: Optional[requests.Response], error: Optional[Exception] = None) -> None:
+        """Feed the outcome of a record write attempt to the write limiter."""
+        if method == 'GET':
+            return
+        if error is not None:
+            self.write_limiter.on_overload(f"{type(error).__name__}")
+        elif response.status_code == 429 or response.status_code >= 500:
+            self.write_limiter.on_overload(f"HTTP {response.status_code}")
+        elif response.ok:
+            self.write_limiter.on_success(response.elapsed.total_seconds())
+
     def _make_request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
-        """Make an authenticated request to the Unifi controller."""
+        """
+        Make an authenticated request to the Unifi controller.
+
+        The session is refreshed shortly before the JWT expires, and a request
+        rejected with 401 is retried exactly once after logging in again.
+        429 responses, and server errors or dropped connections on idempotent
+        methods, are retried with backoff up to transport.max_retries times.
+        """
         url = urljoin(self.controller_url, endpoint)
+        extra_headers = kwargs.pop('headers', None) or {}
+        method = method.upper()
+        idempotent = method in IDEMPOTENT_METHODS
         
-        # Add CSRF token to headers if available
-        headers = kwargs.get('headers', {})
-        if self.csrf_token:
-            headers['x-csrf-token'] = self.csrf_token
-        kwargs['headers'] = headers
-        
-        try:
-            response = self.session.request(method, url, timeout=30, **kwargs)
-            response.raise_for_status()
-            return response
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request failed: {e}")
-            logger.error(f"URL: {url}")
-            logger.error(f"Method: {method}")
-            if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response status: {e.response.status_code}")
-                logger.error(f"Response body: {e.response.text}")
-            raise
+        generation = self._auth_generation
+        if self._token_expiring():
+            self._reauthenticate(generation)
+
+        reauthenticated = False
+        retries = 0
+        while True:
+            if self._cancelled.is_set():
+                raise SyncCancelled(f"{method} {url} not sent, sync was cancelled")
+            generation = self._auth_generation
+
+            # Add CSRF token to headers if available
+            headers = dict(extra_headers)
+            if self.csrf_token:
+                headers['x-csrf-token'] = self.csrf_token
+            
+            try:
+                try:
+                    response = self._send(method, url, headers=headers, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    self._observe_write(method, None, e)
+                    # A connect timeout means the request never reached the controller
+                    safe = idempotent or isinstance(e, requests.exceptions.ConnectTimeout)
+                    if safe and retries < self.transport.max_retries:
+                        delay = self._retry_delay(retries)
+                        retries += 1
+                        self._record_retry()
+                        logger.warning(f"{method} {url} failed ({e}), retry {retries} in {delay:.2f}s")
+                        self._cancelled.wait(delay)
+                        continue
+                    raise
+
+                self._observe_write(method, response)
+                if response.status_code == 401 and not reauthenticated:
+                    logger.info(f"Got 401 for {method} {url}, re-authenticating")
+                    # Release the connection of a streamed response before trying again
+                    response.close()
+                    reauthenticated = True
+                    self._reauthenticate(generation)
+                    continue
+
+                status = response.status_code
+                retryable = status == 429 or (idempotent and status in RETRYABLE_SERVER_ERRORS)
+                if retryable and retries < self.transport.max_retries:
+                    delay = self._retry_delay(retries, response)
+                    retries += 1
+                    self._record_retry()
+                    logger.warning(f"{method} {url} returned {status}, retry {retries} in {delay:.2f}s")
+                    response.close()
+                    self._cancelled.wait(delay)
+                    continue
+
+                response.raise_for_status()
+                return response
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Request failed: {e}")
+                logger.error(f"URL: {url}")
+                logger.error(f"Method: {method}")
+                if hasattr(e, 'response') and e.response is not None:
+                    logger.error(f"Response status: {e.response.status_code}")
+                    logger.error(f"Response body: {e.response.text}")
+                raise
     
-    def get_existing_dns_records(self) -> List[Dict]:
+    def _static_dns_endpoint(self, site: Optional[str], record_id: Optional[str] = None) -> str:
+        """Return the static-dns API path for a site, or for one record in it."""
+        endpoint = f"/proxy/network/v2/api/site/{site or self.site}/static-dns"
+        return f"{endpoint}/{record_id}" if record_id else endpoint
+
+    def get_existing_dns_records(self, site: Optional[str] = None,
+                                 scope: Optional[DomainScope] = None) -> RecordStore:
         """
         Get all existing static DNS records from the controller.
         
+        Args:
+            site: Controller site (default: the manager's site)
+            scope: Keep only the records in these zones (default: all records)
+
         Returns:
-            List of DNS record dictionaries
+            The records, in a compact store indexed by hostname
         """
-        logger.info("Fetching existing DNS records...")
-        response = self._make_request("GET", "/proxy/network/v2/api/site/default/static-dns")
-        records = response.json()
-        logger.info(f"Found {len(records)} existing DNS records")
+        logger.info(f"Fetching existing DNS records for site {site or self.site}...")
+        with self.metrics.phase('fetch'):
+            # Records are parsed and indexed as the body arrives, so neither
+            # the whole body nor the whole parsed listing is held at once
+            response = self._make_request("GET", self._static_dns_endpoint(site), stream=True)
+            with contextlib.closing(response):
+                reader = JSONStreamReader(chunk_reader(response.iter_content(chunk_size=CHUNK_SIZE)))
+                listing = reader.iter_array()
+                # The API has no server-side filter, so out-of-scope records
+                # are dropped as they stream past instead of being stored
+                records = RecordStore(scope.filter_records(listing) if scope is not None else listing)
+        logger.info(f"Found {len(records)} existing DNS records" + (f" in scope {scope.patterns}" if scope else ""))
         return records
     
-    def create_dns_record(self, hostname: str, ip: str = None) -> Dict:
+    def create_dns_record(self, hostname: str, ip: str = None, site: Optional[str] = None,
+                          record: Optional[Dict] = None) -> Dict:
         """
         Create a new DNS A record for the given hostname and IP.
 
         If ip is None the manager's default target_ip will be used to preserve backward compatibility.
+        If site is None the manager's site is used. Fields of record other than its ID
+        (such as ttl or enabled, when restoring a deleted record) are sent along.
         """
         if ip is None:
             ip = self.target_ip
 
-        payload = {
+        payload = {"enabled": True}
+        if record:
+            payload.update((name, value) for name, value in record.items() if name != '_id')
+        payload.update({
             "record_type": "A",
             "value": ip,
-            "key": hostname,
-            "enabled": True
-        }
+            "key": hostname
+        })
 
         logger.info(f"Creating DNS record: {hostname} -> {ip}")
         response = self._make_request(
             "POST", 
-            "/proxy/network/v2/api/site/default/static-dns",
+            self._static_dns_endpoint(site),
+            json=payload
+        )
+        return response.json()
+    
+    def update_dns_record(self, record: Dict, ip: str, site: Optional[str] = None) -> Dict:
+        """
+        Point an existing DNS A record at a new IP, keeping its ID.
+
+        Args:
+            record: The existing record as returned by get_existing_dns_records
+            ip: The new IP address for the record
+            site: Controller site (default: the manager's site)
+        """
+        payload = dict(record)
+        payload['value'] = ip
+
+        logger.info(f"Updating DNS record: {record.get('key')} {record.get('value')} -> {ip}")
+        response = self._make_request(
+            "PUT",
+            self._static_dns_endpoint(site, record['_id']),
             json=payload
         )
         return response.json()
     
-    def delete_dns_record(self, record_id: str, hostname: str = None) -> None:
+    def delete_dns_record(self, record_id: str, hostname: str = None, site: Optional[str] = None) -> None:
         """
         Delete a DNS record by ID.
         
         Args:
             record_id: The ID of the DNS record to delete
             hostname: Optional hostname for logging purposes
+            site: Controller site (default: the manager's site)
         """
         log_msg = f"Deleting DNS record ID: {record_id}"
         if hostname:
@@ -209,134 +523,381 @@ class UnifiDNSManager:
         
         self._make_request(
             "DELETE", 
-            f"/proxy/network/v2/api/site/default/static-dns/{record_id}"
+            self._static_dns_endpoint(site, record_id)
         )
     
-    def sync_dns_records(self, desired_entries: List[Dict], show_diff: bool = True) -> Dict[str, int]:
+    def plan_changes(self, desired_entries: List[Dict], existing_records: Optional[Iterable[RecordLike]] = None,
+                     site: Optional[str] = None) -> ChangePlan:
+        """
+        Compute the changes needed to reach the desired entries, without applying them.
+
+        Args:
+            desired_entries: List of dicts with 'hostname' and optional 'ip' (None -> use target_ip)
+            existing_records: Records already fetched from the controller (default: fetch them)
+            site: Controller site (default: the manager's site)
+        """
+        site = site or self.site
+        if existing_records is None:
+            existing_records = self.get_existing_dns_records(site)
+        with self.metrics.phase('plan'):
+            return build_plan(existing_records, desired_entries, self.target_ip,
+                              controller=self.controller_url, site=site)
+
+    def plan_shards(self, desired_entries: List[Dict], scope: DomainScope,
+                    existing_records: Optional[RecordStore] = None,
+                    site: Optional[str] = None) -> Dict[str, ChangePlan]:
+        """
+        Compute one change plan per zone of a scope, without applying them.
+
+        Only records in the scope are considered: records outside it are never
+        updated or deleted, and desired entries outside it are skipped.
+
+        Args:
+            desired_entries: List of dicts with 'hostname' and optional 'ip' (None -> use target_ip)
+            scope: The managed zones
+            existing_records: Records already fetched from the controller (default:
+                fetch the records in scope)
+            site: Controller site (default: the manager's site)
+
+        Returns:
+            Mapping of zone pattern to its change plan, for every zone with
+            desired entries or existing records
+        """
+        site = site or self.site
+        if existing_records is None:
+            existing_records = self.get_existing_dns_records(site, scope=scope)
+        with self.metrics.phase('plan'):
+            entries_by_zone, outside = scope.partition_entries(desired_entries)
+            if outside:
+                sample = ', '.join(entry['hostname'] for entry in outside[:5])
+                logger.warning(f"Skipping {len(outside)} desired entries outside scope {scope.patterns}: "
+                               f"{sample}{', ...' if len(outside) > 5 else ''}")
+            hostnames_by_zone = scope.partition_hostnames(existing_records.hostnames())
+            # Planning is CPU-bound, so zones are planned one after another;
+            # only applying them, which waits on the controller, runs concurrently
+            return {
+                zone: build_plan(existing_records.select(hostnames_by_zone.get(zone, ())),
+                                 entries_by_zone.get(zone, []), self.target_ip,
+                                 controller=self.controller_url, site=site, zone=zone)
+                for zone in sorted(set(entries_by_zone) | set(hostnames_by_zone))
+            }
+
+    def apply_shards(self, plans: Dict[str, ChangePlan], show_diff: bool = True,
+                     on_applied: Optional[Callable[[Any, Optional[Dict]], None]] = None) -> Dict[str, int]:
+        """
+        Apply the per-zone plans of a scoped sync concurrently.
+
+        Zones share no hostnames, so their plans are independent; record writes
+        across all zones still share the manager's concurrency limit.
+
+        Args:
+            plans: Mapping of zone pattern to change plan, from plan_shards
+            show_diff: Whether to display a diff of changes for each zone
+            on_applied: Optional callback invoked with each successful operation
+
+        Returns:
+            Counts of created, updated, deleted, existing and failed records and
+            of HTTP retries, summed across zones
+
+        Raises:
+            RuntimeError: If applying any zone failed outright
+        """
+        retries_before = self.retry_count
+        results, errors = self._run_concurrently(
+            plans, lambda zone, plan: self.apply_plan(plan, show_diff=show_diff, on_applied=on_applied), kind='Zone')
+        if errors:
+            raise RuntimeError(f"Failed to apply zones: {', '.join(sorted(errors))}")
+
+        totals = {'created': 0, 'updated': 0, 'deleted': 0, 'existing': 0, 'failed': 0}
+        for zone, zone_results in sorted(results.items()):
+            logger.info(f"Zone {zone}: {zone_results['created']} created, {zone_results['updated']} updated, "
+                        f"{zone_results['deleted']} deleted, {zone_results['failed']} failed")
+            for name in totals:
+                totals[name] += zone_results[name]
+        # Retries are counted per manager, so per-zone deltas overlap
+        totals['retries'] = self.retry_count - retries_before
+        return totals
+
+    def sync_dns_records(self, desired_entries: List[Dict], show_diff: bool = True,
+                         site: Optional[str] = None, scope: Optional[DomainScope] = None) -> Dict[str, int]:
         """
         Synchronize DNS records with the desired list.
 
         Args:
             desired_entries: List of dicts with 'hostname' and optional 'ip' (None -> use target_ip)
             show_diff: Whether to display a diff of changes
+            site: Controller site (default: the manager's site)
+            scope: Only sync the records in these zones, one shard per zone
+                (default: all records)
+
+        Hostnames whose IP changed have one of their existing records updated in
+        place; a record is only created when the hostname has no A record to reuse.
 
         Returns:
-            Dictionary with counts of created, deleted, and existing records
-        """
-        # Get existing records
-        existing_records = self.get_existing_dns_records()
-
-        # Build mapping of existing records: hostname -> ip -> record
-        existing_map = {}
-        for record in existing_records:
-            if record.get('record_type') != 'A':
-                continue
-            key = record.get('key')
-            value = record.get('value')
-            if not key:
-                continue
-            existing_map.setdefault(key, {})[value] = record
-
-        # Normalize desired entries into mapping hostname -> ip (single)
-        desired_map = {}
-        for entry in desired_entries:
-            hostname = entry.get('hostname')
-            ip_val = entry.get('ip')  # may be None
-            if ip_val is None:
-                desired_ip = self.target_ip
-            else:
-                desired_ip = ip_val
-            desired_map[hostname] = desired_ip
+            Dictionary with counts of created, updated, deleted, existing and failed
+            records, and the number of HTTP retries made during the sync
+        """
+        retries_before = self.retry_count
+        if scope is not None:
+            results = self.apply_shards(self.plan_shards(desired_entries, scope, site=site), show_diff=show_diff)
+        else:
+            plan = self.plan_changes(desired_entries, site=site)
+            results = self.apply_plan(plan, show_diff=show_diff)
+        results['retries'] = self.retry_count - retries_before
+        return results
 
-        desired_hostnames = set(desired_map.keys())
-        existing_hostnames = set(existing_map.keys())
+    def plan_sites(self, desired_by_site: Dict[str, List[Dict]]) -> Dict[str, ChangePlan]:
+        """
+        Compute change plans for several sites, fetching their records concurrently.
 
-        # Determine hostnames to remove entirely (present in existing but not in desired)
-        hosts_to_remove = existing_hostnames - desired_hostnames
+        Args:
+            desired_by_site: Mapping of site name to desired entries
 
-        # Prepare counters and change lists
-        created_count = 0
-        deleted_count = 0
-        unchanged_count = 0
-        changes = {'created': [], 'deleted': [], 'unchanged': []}
+        Returns:
+            Mapping of site name to its change plan
 
-        # For hostnames present in desired, compare single IP each
-        for hostname, desired_ip in desired_map.items():
-            existing_ips = set(existing_map.get(hostname, {}).keys())
+        Raises:
+            RuntimeError: If fetching the records of any site failed
+        """
+        plans, errors = self._run_concurrently(
+            desired_by_site, lambda site, entries: self.plan_changes(entries, site=site))
+        if errors:
+            raise RuntimeError(f"Failed to plan sites: {', '.join(sorted(errors))}")
+        return plans
 
-            # If desired_ip already exists, nothing to do
-            if desired_ip in existing_ips:
-                changes['unchanged'].append((hostname, desired_ip))
-                unchanged_count += 1
-            else:
-                # Create the desired ip record
-                try:
-                    self.create_dns_record(hostname, desired_ip)
-                    changes['created'].append((hostname, desired_ip))
-                    created_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to create record for {hostname} -> {desired_ip}: {e}")
+    def sync_sites(self, desired_by_site: Dict[str, List[Dict]], show_diff: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Synchronize several sites over the manager's single session.
 
-                # Delete any other A records that exist for this hostname (because only one IP allowed)
-                for ip, record in list(existing_map.get(hostname, {}).items()):
-                    try:
-                        self.delete_dns_record(record['_id'], hostname)
-                        changes['deleted'].append((hostname, ip))
-                        deleted_count += 1
-                    except Exception as e:
-                        logger.error(f"Failed to delete record for {hostname} -> {ip}: {e}")
-
-        # Delete hostnames that are no longer desired
-        for hostname in hosts_to_remove:
-            for ip, record in existing_map.get(hostname, {}).items():
+        Each site is fetched, planned and applied independently, so one site's
+        fetch overlaps with another's writes; record writes across all sites
+        share the manager's concurrency limit.
+
+        Args:
+            desired_by_site: Mapping of site name to desired entries
+            show_diff: Whether to display a diff of changes for each site
+
+        Returns:
+            Mapping of site name to the apply results for that site; a site
+            that could not be synced maps to {'error': message} instead
+        """
+        results, errors = self._run_concurrently(
+            desired_by_site, lambda site, entries: self.apply_plan(self.plan_changes(entries, site=site),
+                                                                   show_diff=show_diff))
+        for site, error in errors.items():
+            results[site] = {'error': error}
+        return results
+
+    def _run_concurrently(self, items: Dict[str, Any], work: Callable[[str, Any], Any],
+                          kind: str = 'Site') -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Run work(name, item) for every site or zone concurrently, collecting results and errors."""
+        results: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        if not items:
+            return results, errors
+
+        with ThreadPoolExecutor(max_workers=min(len(items), self.concurrency)) as executor:
+            futures = {name: executor.submit(work, name, item) for name, item in items.items()}
+            for name, future in futures.items():
                 try:
-                    self.delete_dns_record(record['_id'], hostname)
-                    changes['deleted'].append((hostname, ip))
-                    deleted_count += 1
+                    results[name] = future.result()
                 except Exception as e:
-                    logger.error(f"Failed to delete record for {hostname} -> {ip}: {e}")
+                    logger.error(f"{kind} {name} failed: {e}")
+                    errors[name] = str(e)
+        return results, errors
+
+    def apply_plan(self, plan: ChangePlan, show_diff: bool = True,
+                   on_applied: Optional[Callable[[Any, Optional[Dict]], None]] = None) -> Dict[str, int]:
+        """
+        Apply a change plan to the controller.
+
+        Args:
+            plan: The plan to apply, from plan_changes or ChangePlan.load
+            show_diff: Whether to display a diff of the changes made (ignored if the
+                manager has a report, which always receives them)
+            on_applied: Optional callback invoked from worker threads with each
+                operation that succeeded and the record returned by the controller
+                (None for deletes)
+
+        Returns:
+            Dictionary with counts of created, updated, deleted, existing and failed
+            records, and the number of HTTP retries made while applying
+        """
+        if plan.controller and plan.controller != self.controller_url:
+            logger.warning(f"Plan was computed for {plan.controller}, applying to {self.controller_url}")
+        site = plan.site or self.site
 
-        # Display diff if there were changes
-        if show_diff and (changes['created'] or changes['deleted']):
-            self._display_diff(changes)
-        elif not (changes['created'] or changes['deleted']):
-            logger.info("No changes made - DNS records are already synchronized")
+        retries_before = self.retry_count
+        report = self._report_for(show_diff)
 
-        return {
+        # Work is grouped per hostname so that the create or update for a name
+        # always lands before its stale A records are deleted; hostnames
+        # themselves are independent and are applied concurrently.
+        changes = {'created': [], 'updated': [], 'deleted': [], 'unchanged': list(plan.unchanged), 'failed': []}
+        with self.metrics.phase('apply'), ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [
+                executor.submit(self._apply_host_operations, operations, on_applied, site, report, plan.zone)
+                for operations in plan.host_operations().values()
+            ]
+            try:
+                for future in futures:
+                    host_changes = future.result()
+                    for kind, items in host_changes.items():
+                        changes[kind].extend(items)
+            except KeyboardInterrupt:
+                # Let in-flight writes finish, but start no new ones
+                self.cancel()
+                raise
+
+        created_count = len(changes['created'])
+        updated_count = len(changes['updated'])
+        deleted_count = len(changes['deleted'])
+        unchanged_count = len(changes['unchanged'])
+        failed_count = len(changes['failed'])
+        changed = created_count or updated_count or deleted_count
+
+        if not changed:
+            where = f"zone {plan.zone} of site {site}" if plan.zone else f"site {site}"
+            logger.info(f"No changes made - DNS records for {where} are already synchronized")
+
+        limiter = self.write_limiter
+        if limiter.adaptive and changed:
+            logger.info(f"Adaptive write limit settled at {int(limiter.limit)} "
+                        f"(floor {limiter.floor}, ceiling {limiter.ceiling}, {limiter.decreases} backoffs)")
+
+        results = {
             'created': created_count,
+            'updated': updated_count,
             'deleted': deleted_count,
-            'existing': unchanged_count
+            'existing': unchanged_count,
+            'failed': failed_count,
+            'retries': self.retry_count - retries_before
         }
+        if report is not None:
+            with self.metrics.phase('display'):
+                report.finish(results, plan.unchanged, controller=self.report_name, site=site,
+                              scope=self.diff_scope(site, plan.zone), zone=plan.zone)
+        self.metrics.record_results(results)
+        return results
+
+    def preview_plan(self, plan: ChangePlan, show_diff: bool = True) -> None:
+        """
+        Report the changes of a plan without applying them, as for a dry run.
+
+        Args:
+            plan: The plan to preview
+            show_diff: Whether to display a diff of the planned changes (ignored
+                if the manager has a report, which always receives them)
+        """
+        report = self._report_for(show_diff)
+        if report is not None:
+            with self.metrics.phase('display'):
+                report.report_plan(plan, controller=self.report_name, site=plan.site or self.site,
+                                   scope=self.diff_scope(plan.site, plan.zone))
+
+    def _report_for(self, show_diff: bool) -> Optional[ChangeReport]:
+        if self.report is not None:
+            return self.report
+        return TextReport() if show_diff else None
+
+    @property
+    def report_name(self) -> str:
+        """Name of the controller in change reports."""
+        return self.name or self.controller_url
     
-    def _display_diff(self, changes: Dict[str, List[tuple]]) -> None:
-        """Display a diff-style summary of DNS record changes.
-
-        Accepts changes lists containing (hostname, ip) tuples.
-        """
-        print("\n" + "="*60)
-        print("DNS RECORD CHANGES")
-        print("="*60)
-
-        # Show deletions (red/minus)
-        if changes['deleted']:
-            print(f"\n❌ DELETED ({len(changes['deleted'])} records):")
-            for hostname, ip in sorted(changes['deleted']):
-                print(f"  - {hostname} -> {ip}")
-        # Show additions (green/plus) 
-        if changes['created']:
-            print(f"\n✅ CREATED ({len(changes['created'])} records):")
-            for hostname, ip in sorted(changes['created']):
-                print(f"  + {hostname} -> {ip}")
-
-        # Show unchanged (for context)
-        if changes['unchanged']:
-            print(f"\n⚪ UNCHANGED ({len(changes['unchanged'])} records):")
-            for hostname, ip in sorted(changes['unchanged']):
-                print(f"    {hostname} -> {ip}")
-
-        print("\n" + "="*60)
-
-        # Summary line
-        total_changes = len(changes['created']) + len(changes['deleted'])
-        print(f"SUMMARY: {total_changes} changes ({len(changes['created'])} created, {len(changes['deleted'])} deleted)")
-        print("="*60)
\ No newline at end of file
+    def _apply_host_operations(self, operations: List[Any],
+                               on_applied: Optional[Callable[[Any, Optional[Dict]], None]] = None,
+                               site: Optional[str] = None,
+                               report: Optional[ChangeReport] = None,
+                               zone: Optional[str] = None) -> Dict[str, List[tuple]]:
+        """
+        Apply the planned operations of a single hostname, in order.
+
+        Args:
+            operations: Create, Update and Delete operations for one hostname
+            on_applied: Optional callback invoked with each successful operation
+            site: Controller site (default: the manager's site)
+            report: Optional writer receiving each change as it completes
+            zone: Scope zone the hostname belongs to, for the report
+
+        Returns:
+            Dictionary of created and deleted (hostname, ip) tuples and
+            updated (hostname, old_ip, new_ip) tuples that succeeded, and
+            the operations that failed
+        """
+        changes = {'created': [], 'updated': [], 'deleted': [], 'failed': []}
+
+        for op in operations:
+            with self.write_limiter.slot():
+                self._apply_operation(op, changes, on_applied, site, report, zone)
+        return changes
+
+    def _apply_operation(self, op: Any, changes: Dict[str, List],
+                         on_applied: Optional[Callable[[Any, Optional[Dict]], None]], site: Optional[str],
+                         report: Optional[ChangeReport] = None, zone: Optional[str] = None) -> None:
+        """Apply a single planned operation, recording its outcome in changes and the report."""
+        if self._cancelled.is_set():
+            changes['failed'].append(op)
+            if report is not None:
+                self._report_failure(report, op, site, zone, "sync cancelled")
+            return
+        try:
+            if isinstance(op, Create):
+                result = self.create_dns_record(op.hostname, op.ip, site, op.record)
+                changes['created'].append((op.hostname, op.ip))
+            elif isinstance(op, Update):
+                record = op.record
+                if record is None:
+                    # Plans saved before records were carried along only know the ID
+                    record = {'_id': op.record_id, 'key': op.hostname, 'value': op.old_ip,
+                              'record_type': 'A', 'enabled': True}
+                result = self.update_dns_record(record, op.new_ip, site)
+                changes['updated'].append((op.hostname, op.old_ip, op.new_ip))
+            else:
+                self.delete_dns_record(op.record_id, op.hostname, site)
+                result = None
+                changes['deleted'].append((op.hostname, op.ip))
+        except Exception as e:
+            if isinstance(op, Create):
+                logger.error(f"Failed to create record for {op.hostname} -> {op.ip}: {e}")
+            elif isinstance(op, Update):
+                logger.error(f"Failed to update record for {op.hostname} {op.old_ip} -> {op.new_ip}: {e}")
+            else:
+                logger.error(f"Failed to delete record for {op.hostname} -> {op.ip}: {e}")
+            changes['failed'].append(op)
+            if report is not None:
+                self._report_failure(report, op, site, zone, str(e))
+            return
+
+        if report is not None:
+            site = site or self.site
+            if isinstance(op, Create):
+                report.change('created', op.hostname, op.ip, controller=self.report_name, site=site, zone=zone)
+            elif isinstance(op, Update):
+                report.change('updated', op.hostname, op.new_ip, op.old_ip, controller=self.report_name, site=site,
+                              zone=zone)
+            else:
+                report.change('deleted', op.hostname, op.ip, controller=self.report_name, site=site, zone=zone)
+        if on_applied is not None:
+            on_applied(op, result)
+
+    def _report_failure(self, report: ChangeReport, op: Any, site: Optional[str], zone: Optional[str],
+                        error: str) -> None:
+        if isinstance(op, Create):
+            operation, ip, old_ip = 'create', op.ip, None
+        elif isinstance(op, Update):
+            operation, ip, old_ip = 'update', op.new_ip, op.old_ip
+        else:
+            operation, ip, old_ip = 'delete', op.ip, None
+        report.change('failed', op.hostname, ip, old_ip, controller=self.report_name, site=site or self.site,
+                      error=error, operation=operation, zone=zone)
+
+    def diff_scope(self, site: Optional[str] = None, zone: Optional[str] = None) -> Optional[str]:
+        """Describe the controller name, non-default site and scope zone for a diff header, if any."""
+        site = site or self.site
+        parts = [self.name] if self.name else []
+        if site != DEFAULT_SITE:
+            parts.append(f"site: {site}")
+        if zone:
+            parts.append(f"zone: {zone}")
+        return ', '.join(parts) or None
@@ -0,0 +1,209 @@
+"""
+Compiled desired-state cache for Unifi DNS Sync
+
+This module caches the validated, normalized entries of a desired-state file
+in a compact binary file in the user's cache directory, so runs against an
+unchanged file skip JSON parsing and validation. The cache is keyed by the source's path, size,
+mtime and content hash, and by a signature of the loader's validation rules,
+so editing the file or upgrading the loader invalidates it.
+"""
+
+import hashlib
+import logging
+import marshal
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from .sync import ENTRY_RULES_VERSION, HOSTNAME_PATTERN, IPV4_PATTERN, DNSSync, ValidatedEntries, normalize_entries
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+
+# A source modified this close to the time its cache was written may have been
+# changed again within the same mtime tick, so its stat alone is not trusted
+RACY_WINDOW_NS = 2_000_000_000
+
+_READ_SIZE = 64 * 1024
+
+
+def loader_signature(input_format: str) -> str:
+    """Fingerprint everything, besides the file itself, that decides the loaded entries."""
+    rules = (ENTRY_RULES_VERSION, HOSTNAME_PATTERN.pattern, IPV4_PATTERN.pattern,
+             tuple(sys.version_info[:2]), input_format)
+    return hashlib.sha256(repr(rules).encode('utf-8')).hexdigest()
+
+
+def default_cache_dir() -> str:
+    """Return the directory compiled entry caches are kept in."""
+    cache_home = os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'unifi-dns-sync', 'entries')
+
+
+def cache_path_for(source_path: str) -> str:
+    """
+    Return the cache file used for a desired-state file.
+
+    Caches live in the user's cache directory, keyed by the source's real
+    path, so the source's own directory (often a checkout or a read-only
+    mount) is never written to.
+    """
+    key = hashlib.sha256(os.path.realpath(source_path).encode('utf-8', 'surrogateescape')).hexdigest()[:32]
+    return os.path.join(default_cache_dir(), f"{key}.cache")
+
+
+class _HashingReader:
+    """Wraps a binary file, hashing everything read through it."""
+
+    def __init__(self, f):
+        self._f = f
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._f.read(size)
+        self.digest.update(chunk)
+        return chunk
+
+    def drain(self) -> None:
+        """Hash whatever the parser left unread."""
+        while self.read(_READ_SIZE):
+            pass
+
+
+def file_digest(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_READ_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EntryCache:
+    """Reads and writes the compiled cache of one desired-state file."""
+
+    def __init__(self, source_path: str, input_format: str = 'auto', cache_path: Optional[str] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            source_path: Desired-state file the cache belongs to
+            input_format: Input format the file is parsed with
+            cache_path: Cache file (default: one per source under default_cache_dir())
+        """
+        self.source_path = os.path.realpath(source_path)
+        self.input_format = input_format
+        self.path = cache_path or cache_path_for(source_path)
+        self.signature = loader_signature(input_format)
+
+    def load(self) -> Optional[ValidatedEntries]:
+        """
+        Load the cached entries if they still match the source file.
+
+        Returns:
+            The entries, or None if there is no usable cache
+        """
+        try:
+            st = os.stat(self.source_path)
+            # marshal.load reads a file object in small pieces; loads of the whole file is far faster
+            with open(self.path, 'rb') as f:
+                payload = marshal.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.debug(f"Ignoring unreadable entry cache {self.path}: {e}")
+            return None
+
+        if not isinstance(payload, tuple) or len(payload) != 9 or payload[0] != CACHE_FORMAT_VERSION:
+            logger.debug(f"Ignoring entry cache {self.path} with unsupported format")
+            return None
+        _, signature, path, size, mtime_ns, digest, written_ns, hostnames, ips = payload
+        if signature != self.signature or path != self.source_path or size != st.st_size:
+            return None
+
+        if mtime_ns != st.st_mtime_ns or st.st_mtime_ns + RACY_WINDOW_NS >= written_ns:
+            # Touched, or possibly rewritten within the same tick: the content
+            # decides, and a match is written back so the next run can trust the stat
+            try:
+                if file_digest(self.source_path) != digest:
+                    return None
+            except OSError:
+                return None
+            self._write(st, digest, hostnames, ips)
+
+        logger.debug(f"Loaded {len(hostnames)} entries from cache {self.path}")
+        return ValidatedEntries({'hostname': hostname, 'ip': ip} for hostname, ip in zip(hostnames, ips))
+
+    def compile(self) -> ValidatedEntries:
+        """
+        Load and validate the source file, caching the result.
+
+        The content hash is computed from the same bytes that are parsed, and
+        nothing is cached if the file changed while it was being read.
+
+        Raises:
+            Whatever DNSSync.load_hostnames_from_json raises for an invalid file
+        """
+        before = os.stat(self.source_path)
+        with open(self.source_path, 'rb') as f:
+            reader = _HashingReader(f)
+            entries = normalize_entries(DNSSync.iter_raw_entries(reader, self.input_format))
+            reader.drain()
+        after = os.stat(self.source_path)
+
+        if (before.st_size, before.st_mtime_ns) == (after.st_size, after.st_mtime_ns):
+            hostnames = tuple(entry['hostname'] for entry in entries)
+            ips = tuple(entry['ip'] for entry in entries)
+            self._write(after, reader.digest.hexdigest(), hostnames, ips)
+        else:
+            logger.debug(f"{self.source_path} changed while it was read, not caching it")
+        return entries
+
+    def _write(self, st: os.stat_result, digest: str, hostnames: tuple, ips: tuple) -> None:
+        """Atomically write the cache; a cache that cannot be written is skipped."""
+        payload = (CACHE_FORMAT_VERSION, self.signature, self.source_path, st.st_size, st.st_mtime_ns,
+                   digest, time.time_ns(), hostnames, ips)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.entry-cache-')
+        except OSError as e:
+            logger.debug(f"Not caching entries, cannot write to {directory}: {e}")
+            return
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(marshal.dumps(payload))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            os.unlink(tmp_path)
+            logger.debug(f"Not caching entries, failed to write {self.path}: {e}")
+            return
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        logger.debug(f"Cached {len(hostnames)} entries in {self.path}")
+
+
+def load_entries_cached(source_path: str, input_format: str = 'auto') -> ValidatedEntries:
+    """
+    Load validated entries from a desired-state file through its cache.
+
+    Returns:
+        Entries as DNSSync.load_hostnames_from_json would return them
+    """
+    cache = EntryCache(source_path, input_format)
+    entries = cache.load()
+    if entries is not None:
+        logger.info(f"Loaded {len(entries)} host entries from the compiled cache of {source_path}")
+        return entries
+    try:
+        return cache.compile()
+    except FileNotFoundError:
+        logger.error(f"JSON file not found: {source_path}")
+        raise
+    except Exception as e:
+        logger.error(f"Error loading hostnames: {e}")
+        raise
@@ -0,0 +1,191 @@
+"""
+Fleet sync for Unifi DNS Sync
+
+This module pushes the same desired record set to many controllers at once,
+with a cap on how many controllers are synced in parallel and a deadline for
+each controller so one slow branch does not hold up the rest.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, List, Optional, TextIO
+
+from .config import DEFAULT_CONCURRENCY, DEFAULT_SITE, FleetConfig, FleetMember
+from .dns_manager import UnifiDNSManager
+from .metrics import Metrics
+from .report import ChangeReport
+from .token_cache import TokenCache
+
+logger = logging.getLogger(__name__)
+
+# How often running controllers are checked against their deadline, in seconds
+DEADLINE_CHECK_INTERVAL = 0.5
+
+
+@dataclass
+class ControllerResult:
+    """Outcome of syncing one controller of the fleet."""
+    name: str
+    url: str
+    status: str  # 'ok', 'failed' or 'timeout'
+    duration: float
+    results: Optional[Dict[str, int]] = None
+    error: Optional[str] = None
+
+
+class _FleetJob:
+    """Tracks a running controller sync so it can be cancelled at its deadline."""
+
+    def __init__(self, member: FleetMember, timeout: float):
+        self.member = member
+        self.timeout = timeout
+        self.started_at: Optional[float] = None
+        self.timed_out = False
+        self.manager: Optional[UnifiDNSManager] = None
+        self._lock = threading.Lock()
+
+    def attach(self, manager: UnifiDNSManager) -> None:
+        with self._lock:
+            self.manager = manager
+            if self.timed_out:
+                manager.cancel()
+
+    def expire(self) -> None:
+        with self._lock:
+            self.timed_out = True
+            if self.manager is not None:
+                self.manager.cancel()
+
+
+class FleetSync:
+    """Syncs one desired record set to every controller of a fleet."""
+
+    def __init__(self, fleet: FleetConfig, concurrency: int = DEFAULT_CONCURRENCY,
+                 token_cache: Optional[TokenCache] = None, metrics: Optional[Metrics] = None,
+                 default_target_ip: str = "10.0.0.123", default_site: str = DEFAULT_SITE,
+                 report: Optional[ChangeReport] = None):
+        """
+        Initialize the fleet sync.
+
+        Args:
+            fleet: Controllers to sync, with the parallelism cap and timeouts
+            concurrency: Record writes in flight per controller
+            token_cache: Optional session cache shared by all controllers
+            metrics: Optional collector shared by all controllers
+            default_target_ip: IP for entries without one, unless the fleet or controller overrides it
+            default_site: Site to sync, unless the fleet or controller overrides it
+            report: Optional writer shared by all controllers, receiving every change
+        """
+        self.fleet = fleet
+        self.concurrency = concurrency
+        self.token_cache = token_cache
+        self.metrics = metrics
+        self.default_target_ip = default_target_ip
+        self.default_site = default_site
+        self.report = report
+
+    def _create_manager(self, member: FleetMember) -> UnifiDNSManager:
+        return UnifiDNSManager(
+            controller_url=member.controller.url,
+            username=member.controller.username,
+            password=member.controller.password,
+            target_ip=member.target_ip or self.fleet.target_ip or self.default_target_ip,
+            concurrency=self.concurrency,
+            token_cache=self.token_cache,
+            transport=self.fleet.transport,
+            metrics=self.metrics,
+            site=member.site or self.fleet.site or self.default_site,
+            name=member.name,
+            report=self.report
+        )
+
+    def _sync_one(self, job: _FleetJob, desired_entries: List[Dict], dry_run: bool,
+                  show_diff: bool) -> ControllerResult:
+        member = job.member
+        job.started_at = time.monotonic()
+        try:
+            manager = self._create_manager(member)
+            job.attach(manager)
+            plan = manager.plan_changes(desired_entries)
+            if dry_run:
+                results = dict(plan.summary(), failed=0, retries=manager.retry_count)
+                if (show_diff and plan.has_changes) or self.report is not None:
+                    manager.preview_plan(plan, show_diff=show_diff)
+            else:
+                results = manager.apply_plan(plan, show_diff=show_diff)
+        except Exception as e:
+            status = 'timeout' if job.timed_out else 'failed'
+            error = f"timed out after {job.timeout:g}s" if job.timed_out else str(e)
+            return ControllerResult(member.name, member.controller.url, status,
+                                    time.monotonic() - job.started_at, error=error)
+
+        duration = time.monotonic() - job.started_at
+        if job.timed_out:
+            return ControllerResult(member.name, member.controller.url, 'timeout', duration, results,
+                                    error=f"timed out after {job.timeout:g}s")
+        status = 'failed' if results['failed'] else 'ok'
+        return ControllerResult(member.name, member.controller.url, status, duration, results)
+
+    def run(self, desired_entries: List[Dict], dry_run: bool = False,
+            show_diff: bool = False) -> List[ControllerResult]:
+        """
+        Sync every controller, at most fleet.max_parallel at a time.
+
+        A controller still running when its timeout expires is cancelled: no
+        further requests are sent to it and it is reported as timed out.
+
+        Args:
+            desired_entries: Validated desired entries, shared by all controllers
+            dry_run: Only plan, without changing any controller
+            show_diff: Whether to display each controller's diff
+
+        Returns:
+            One result per controller, in fleet order
+        """
+        jobs = [_FleetJob(member, member.timeout or self.fleet.timeout) for member in self.fleet.controllers]
+        logger.info(f"Syncing {len(jobs)} controllers, {self.fleet.max_parallel} at a time")
+
+        with ThreadPoolExecutor(max_workers=self.fleet.max_parallel) as executor:
+            futures = {executor.submit(self._sync_one, job, desired_entries, dry_run, show_diff): job
+                       for job in jobs}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=DEADLINE_CHECK_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    logger.info(f"Controller {result.name}: {result.status} in {result.duration:.1f}s")
+                now = time.monotonic()
+                for future in pending:
+                    job = futures[future]
+                    if (not job.timed_out and job.started_at is not None
+                            and now - job.started_at > job.timeout):
+                        logger.warning(f"Controller {job.member.name} exceeded its {job.timeout:g}s timeout, cancelling")
+                        job.expire()
+
+            return [future.result() for future in futures]
+
+
+def display_fleet_summary(results: List[ControllerResult], stream: Optional[TextIO] = None) -> None:
+    """Print a per-controller summary table of a fleet sync to stream (default: stdout)."""
+    width = max([len(result.name) for result in results] + [10])
+
+    print("\n" + "="*60, file=stream)
+    print("FLEET SUMMARY", file=stream)
+    print("="*60, file=stream)
+    for result in results:
+        line = f"{result.name:<{width}}  {result.status:<7}  {result.duration:6.1f}s"
+        if result.results is not None:
+            r = result.results
+            line += (f"  {r['created']} created, {r['updated']} updated, {r['deleted']} deleted, "
+                     f"{r['existing']} existing, {r['failed']} failed")
+        if result.error:
+            line += f"  ({result.error})"
+        print(line, file=stream)
+    print("="*60, file=stream)
+
+    counts = {status: sum(1 for result in results if result.status == status) for status in ('ok', 'failed', 'timeout')}
+    print(f"CONTROLLERS: {len(results)} total ({counts['ok']} ok, {counts['failed']} failed, {counts['timeout']} timed out)", file=stream)
+    print("="*60, file=stream)
@@ -0,0 +1,237 @@
+"""
+Operation journal for Unifi DNS Sync
+
+This module keeps a write-ahead journal of an applied change plan: the plan
+is written before the first request and every operation confirmed by the
+controller is appended as it completes, so an interrupted sync can be resumed
+without redoing finished work, or compensated by rolling it back.
+
+The journal is a JSON-lines file:
+
+    {"type": "plan", "version": 1, "plan": {...}}
+    {"type": "done", "index": 3, "record_id": "..."}
+    {"type": "undone", "index": 3}
+    {"type": "complete"}
+    {"type": "rolled_back"}
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .plan import ChangePlan, Create, Update, Delete
+from .records import RecordLike, RecordStore
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_FORMAT_VERSION = 1
+
+
+def plan_operations(plan: ChangePlan) -> List[Any]:
+    """Return the plan's operations in the order used for journal indexes."""
+    return list(plan.creates) + list(plan.updates) + list(plan.deletes)
+
+
+def _plan_from(operations: Iterable[Any], template: ChangePlan) -> ChangePlan:
+    operations = list(operations)
+    return ChangePlan(
+        creates=tuple(op for op in operations if isinstance(op, Create)),
+        updates=tuple(op for op in operations if isinstance(op, Update)),
+        deletes=tuple(op for op in operations if isinstance(op, Delete)),
+        controller=template.controller,
+        site=template.site
+    )
+
+
+class SyncJournal:
+    """A write-ahead journal of one change plan and the progress made applying it."""
+
+    def __init__(self, path: str, plan: ChangePlan):
+        self.path = path
+        self.plan = plan
+        self.operations = plan_operations(plan)
+        self._index = {op: i for i, op in enumerate(self.operations)}
+        self.done: Dict[int, Optional[str]] = {}
+        self.undone = set()
+        self.complete = False
+        self.rolled_back = False
+        self._lock = threading.Lock()
+        self._file = None
+
+    @classmethod
+    def create(cls, path: str, plan: ChangePlan) -> 'SyncJournal':
+        """Start a new journal for a plan, replacing any previous journal at path."""
+        journal = cls(path, plan)
+        journal._file = open(path, 'w')
+        journal._write({'type': 'plan', 'version': JOURNAL_FORMAT_VERSION, 'plan': plan.to_dict()}, sync=True)
+        return journal
+
+    @classmethod
+    def open(cls, path: str) -> 'SyncJournal':
+        """
+        Load an existing journal and reopen it for appending.
+
+        A truncated last line, left by a crash mid-write, is ignored.
+
+        Raises:
+            FileNotFoundError: If there is no journal at path
+            ValueError: If the file is not a journal in a supported format
+        """
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+        if not lines:
+            raise ValueError(f"Journal {path} is empty")
+
+        try:
+            header = json.loads(lines[0])
+        except ValueError as e:
+            raise ValueError(f"Journal {path} has an unreadable header: {e}") from e
+        if header.get('type') != 'plan' or header.get('version') != JOURNAL_FORMAT_VERSION:
+            raise ValueError(f"Unsupported journal format in {path}")
+
+        journal = cls(path, ChangePlan.from_dict(header['plan']))
+        for number, line in enumerate(lines[1:], start=2):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                if number == len(lines):
+                    logger.warning(f"Ignoring truncated last line of journal {path}")
+                    break
+                raise ValueError(f"Corrupt journal {path} at line {number}")
+            kind = entry.get('type')
+            if kind == 'done':
+                journal.done[entry['index']] = entry.get('record_id')
+            elif kind == 'undone':
+                journal.undone.add(entry['index'])
+            elif kind == 'complete':
+                journal.complete = True
+            elif kind == 'rolled_back':
+                journal.rolled_back = True
+
+        journal._file = open(path, 'a')
+        return journal
+
+    def _write(self, entry: Dict[str, Any], sync: bool = False) -> None:
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            # Flushing hands the line to the OS, which is enough to survive the
+            # process being killed; fsync is reserved for the plan and the end
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    @property
+    def finished(self) -> bool:
+        """Whether the journal needs no resume or rollback."""
+        return self.complete or self.rolled_back or (bool(self.done) and set(self.done) <= self.undone)
+
+    def record_applied(self, op: Any, result: Optional[Dict]) -> None:
+        """Record an operation confirmed by the controller; usable as apply_plan's on_applied."""
+        index = self._index[op]
+        record_id = getattr(op, 'record_id', None)
+        if isinstance(op, Create) and isinstance(result, dict):
+            record_id = result.get('_id')
+        self.done[index] = record_id
+        self._write({'type': 'done', 'index': index, 'record_id': record_id})
+
+    def mark_complete(self) -> None:
+        """Record that every operation of the plan was applied."""
+        self.complete = True
+        self._write({'type': 'complete'}, sync=True)
+
+    def mark_rolled_back(self) -> None:
+        """Record that everything the plan applied was undone, or could not be."""
+        self.rolled_back = True
+        self._write({'type': 'rolled_back'}, sync=True)
+
+    def pending_operations(self) -> List[Any]:
+        """Operations not yet confirmed, in plan order."""
+        return [op for i, op in enumerate(self.operations) if i not in self.done]
+
+    def reconcile(self, existing_records: Iterable[RecordLike]) -> ChangePlan:
+        """
+        Work out which pending operations still need to be applied.
+
+        An operation may have reached the controller just before the process
+        died, without its confirmation reaching the journal. Pending operations
+        whose effect is already visible in existing_records are recorded as done
+        instead of being applied twice.
+
+        Returns:
+            A plan of the operations that still have to be applied
+        """
+        existing = RecordStore.coerce(existing_records)
+
+        remaining = []
+        landed = 0
+        for op in self.pending_operations():
+            record_id = existing.find_a_record(op.hostname, op.ip) if isinstance(op, Create) else None
+            current = existing.get(op.record_id) if not isinstance(op, Create) else None
+            if record_id is not None:
+                self.record_applied(op, {'_id': record_id})
+            elif isinstance(op, Update) and current is not None and current.value == op.new_ip:
+                self.record_applied(op, None)
+            elif isinstance(op, Delete) and current is None:
+                self.record_applied(op, None)
+            else:
+                remaining.append(op)
+                continue
+            landed += 1
+
+        if landed:
+            logger.info(f"{landed} unconfirmed operations had already reached the controller")
+        return _plan_from(remaining, self.plan)
+
+    def rollback_plan(self) -> Tuple[ChangePlan, Dict[Any, int]]:
+        """
+        Build the compensating operations for everything applied and not yet undone.
+
+        Created records are deleted, updates are reverted to their old record
+        and deleted records are created again from their saved fields (with a
+        new ID). Operations are undone latest first; apply_plan then runs each
+        hostname's compensations in the reverse of the order its operations are
+        applied in: deleted records come back before its create or update is
+        undone.
+
+        Returns:
+            The compensating plan and a mapping of each compensating operation
+            to the journal index of the operation it undoes
+        """
+        compensations: Dict[Any, int] = {}
+        for index in reversed(list(self.done)):
+            if index in self.undone:
+                continue
+            op = self.operations[index]
+            record_id = self.done[index]
+            if isinstance(op, Create):
+                if not record_id:
+                    logger.warning(f"Cannot roll back creation of {op.hostname}: the controller returned no ID")
+                    continue
+                compensations[Delete(record_id, op.hostname, op.ip)] = index
+            elif isinstance(op, Update):
+                compensations[Update(op.record_id, op.hostname, op.new_ip, op.old_ip, op.record)] = index
+            else:
+                compensations[Create(op.hostname, op.ip, op.record)] = index
+        return _plan_from(compensations, self.plan), compensations
+
+    def record_undone(self, index: int) -> None:
+        """Record that the operation at index was compensated."""
+        self.undone.add(index)
+        self._write({'type': 'undone', 'index': index})
+
+    def close(self) -> None:
+        """Flush the journal to disk and close it."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+    def __enter__(self) -> 'SyncJournal':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,216 @@
+"""
+Incremental JSON reading for Unifi DNS Sync
+
+This module reads large JSON documents piece by piece, yielding the elements
+of a top-level array (or the values of newline-delimited JSON) as soon as they
+are parsed instead of building the whole document in memory first.
+"""
+
+import codecs
+import json
+import re
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# An array separator with the whitespace around it: group 1 is set for ","
+_SEPARATOR = re.compile(r'[ \t\n\r]*(?:(,)[ \t\n\r]*|\])')
+
+# The same for objects
+_MEMBER_SEPARATOR = re.compile(r'[ \t\n\r]*(?:(,)[ \t\n\r]*|\})')
+
+# Characters that may continue a number split across chunks, e.g. "4." + "5e10"
+_NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+
+def chunk_reader(chunks: Iterable[Any]) -> Callable[[int], Any]:
+    """
+    Adapt an iterable of str or bytes chunks to the read(size) interface.
+
+    Useful for reading from Response.iter_content: size is ignored and each
+    call returns the next non-empty chunk, or an empty string at the end.
+    """
+    iterator = iter(chunks)
+
+    def read(size: int) -> Any:
+        for chunk in iterator:
+            if chunk:
+                return chunk
+        return ''
+
+    return read
+
+
+class JSONStreamReader:
+    """Incrementally parses JSON read from a file-like object in chunks."""
+
+    def __init__(self, read: Callable[[int], Any], chunk_size: int = CHUNK_SIZE):
+        """
+        Initialize the reader.
+
+        Args:
+            read: A read(size) function such as file.read, returning str or bytes
+                (see chunk_reader for iterables of chunks)
+            chunk_size: Number of characters to read at a time
+        """
+        self._read = read
+        self._chunk_size = chunk_size
+        self._scan = json.JSONDecoder().scan_once
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def _more(self) -> bool:
+        """Read another chunk, discarding what was already consumed."""
+        if self._eof:
+            return False
+        chunk = self._read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            # Raises if the input ended in the middle of a multi-byte character
+            self._utf8.decode(b'', final=True)
+            return False
+        if isinstance(chunk, bytes):
+            # The incremental decoder holds back characters split across chunks
+            chunk = self._utf8.decode(chunk)
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> Optional[str]:
+        """Skip whitespace and return the next character without consuming it, or None at the end."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._more():
+                return None
+
+    def _error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self._buf, self._pos)
+
+    def _decode_value(self) -> Any:
+        """Decode the value starting at the current position."""
+        while True:
+            try:
+                value, end = self._scan(self._buf, self._pos)
+            except (StopIteration, json.JSONDecodeError) as e:
+                # The value may just be cut off at the end of the buffer
+                if self._more():
+                    self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+                    continue
+                if isinstance(e, json.JSONDecodeError):
+                    raise
+                raise self._error("Expecting value") from None
+            # A number ending at (or just before) the buffer boundary may continue in the next chunk
+            if (end == len(self._buf) or self._buf[end] in _NUMBER_CHARS) and self._more():
+                continue
+            self._pos = end
+            return value
+
+    def _next_separator(self, pattern=_SEPARATOR, closing: str = ']') -> bool:
+        """Consume the separator after an element; returns True for ',' and False for the closing bracket."""
+        while True:
+            match = pattern.match(self._buf, self._pos)
+            if match is not None:
+                self._pos = match.end()
+                return match.group(1) is not None
+            char = self.peek()
+            if char is None or char not in ',' + closing:
+                raise self._error("Expecting ',' delimiter")
+
+    def _expect(self, char: str, message: str) -> None:
+        if self.peek() != char:
+            raise self._error(message)
+        self._pos += 1
+
+    def _iter_elements(self) -> Iterator[Any]:
+        """Yield the elements of the array whose '[' was just consumed, consuming its closing ']'."""
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._decode_value()
+            if not self._next_separator():
+                return
+
+    def iter_array(self) -> Iterator[Any]:
+        """
+        Yield the elements of a top-level JSON array as they are parsed.
+
+        Raises:
+            json.JSONDecodeError: If the input is not a well-formed JSON array
+        """
+        if self.peek() != '[':
+            raise self._error("Expecting '['")
+        self._pos += 1
+
+        yield from self._iter_elements()
+
+        if self.peek() is not None:
+            raise self._error("Extra data")
+
+    def iter_object(self, stream_arrays: bool = False) -> Iterator[Tuple[str, Any]]:
+        """
+        Yield the (key, value) members of a top-level JSON object as they are parsed.
+
+        Each value is decoded as a whole, so only one member is held in memory at a time.
+
+        Args:
+            stream_arrays: Yield array values as iterators of their elements, parsed
+                as they are consumed, instead of decoding them as a whole. Elements
+                left unread are skipped when the next member is requested.
+
+        Raises:
+            json.JSONDecodeError: If the input is not a well-formed JSON object
+        """
+        self._expect('{', "Expecting '{'")
+
+        if self.peek() == '}':
+            self._pos += 1
+        else:
+            while True:
+                if self.peek() != '"':
+                    raise self._error("Expecting property name enclosed in double quotes")
+                key = self._decode_value()
+                self._expect(':', "Expecting ':' delimiter")
+                if stream_arrays and self.peek() == '[':
+                    self._pos += 1
+                    elements = self._iter_elements()
+                    yield key, elements
+                    for _ in elements:
+                        pass
+                else:
+                    self.peek()
+                    yield key, self._decode_value()
+                if not self._next_separator(_MEMBER_SEPARATOR, '}'):
+                    break
+
+        if self.peek() is not None:
+            raise self._error("Extra data")
+
+    def iter_lines(self) -> Iterator[Any]:
+        """
+        Yield the values of newline-delimited JSON, one per non-blank line.
+
+        Raises:
+            json.JSONDecodeError: If a line is not valid JSON
+        """
+        while True:
+            newline = self._buf.find('\n', self._pos)
+            if newline == -1:
+                if self._more():
+                    continue
+                line = self._buf[self._pos:]
+                self._pos = len(self._buf)
+                if line.strip():
+                    yield json.loads(line)
+                return
+
+            line = self._buf[self._pos:newline]
+            self._pos = newline + 1
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,226 @@
+"""
+Metrics for Unifi DNS Sync
+
+This module collects per-phase timings, HTTP request latency histograms and
+record change counts, and exports them as a Prometheus textfile-collector file
+or a JSON summary.
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Latency histogram buckets in seconds (the Prometheus client defaults)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_PREFIX = 'unifi_dns_sync'
+
+# Record IDs in endpoint paths are replaced so latency is grouped per endpoint
+_RECORD_ID = re.compile(r'(/static-dns)/[^/?]+')
+
+PhaseHook = Callable[[str, bool], None]
+
+
+def endpoint_template(endpoint: str) -> str:
+    """Strip record IDs and query strings from an endpoint path."""
+    return _RECORD_ID.sub(r'\1/{id}', endpoint.split('?', 1)[0])
+
+
+class Histogram:
+    """A cumulative-bucket latency histogram."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'buckets': {str(bound): count for bound, count in zip(self.buckets, self.counts)}
+        }
+
+
+def _labels(**labels: str) -> str:
+    escaped = (
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Metrics:
+    """Thread-safe collector for sync metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.requests: Dict[Tuple[str, str], Histogram] = {}
+        self.responses: Dict[Tuple[str, str, str], int] = {}
+        self.success: Optional[bool] = None
+        self._phase_hooks: List[PhaseHook] = []
+
+    def add_phase_hook(self, hook: PhaseHook) -> None:
+        """Register a callback invoked with (phase, entering) around every phase."""
+        self._phase_hooks.append(hook)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a phase of the run; repeated phases accumulate."""
+        for hook in self._phase_hooks:
+            hook(name, True)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            for hook in self._phase_hooks:
+                hook(name, False)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Increase a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe_request(self, method: str, endpoint: str, status: str, seconds: float) -> None:
+        """Record the latency and outcome of one HTTP request."""
+        endpoint = endpoint_template(endpoint)
+        with self._lock:
+            histogram = self.requests.get((method, endpoint))
+            if histogram is None:
+                histogram = self.requests[(method, endpoint)] = Histogram()
+            histogram.observe(seconds)
+            key = (method, endpoint, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def record_results(self, results: Dict[str, int]) -> None:
+        """Add the counts returned by apply_plan or sync_dns_records."""
+        for action in ('created', 'updated', 'deleted', 'existing', 'failed'):
+            self.increment(f'records_{action}', results.get(action, 0))
+
+    @property
+    def duration(self) -> float:
+        """Seconds since the collector was created."""
+        return time.perf_counter() - self._started
+
+    def to_dict(self) -> Dict:
+        """Return a JSON-serializable summary."""
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'duration_seconds': round(self.duration, 6),
+                'success': self.success,
+                'phases': {name: round(seconds, 6) for name, seconds in self.phases.items()},
+                'counters': dict(self.counters),
+                'requests': [
+                    dict(histogram.to_dict(), method=method, endpoint=endpoint)
+                    for (method, endpoint), histogram in sorted(self.requests.items())
+                ],
+                'responses': [
+                    {'method': method, 'endpoint': endpoint, 'status': status, 'count': count}
+                    for (method, endpoint, status), count in sorted(self.responses.items())
+                ]
+            }
+
+    def to_prometheus(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        p = METRIC_PREFIX
+        lines = []
+        with self._lock:
+            lines += [
+                f'# HELP {p}_last_run_timestamp_seconds Unix time the run started.',
+                f'# TYPE {p}_last_run_timestamp_seconds gauge',
+                f'{p}_last_run_timestamp_seconds {self.started_at:.3f}',
+                f'# HELP {p}_run_duration_seconds Total duration of the run.',
+                f'# TYPE {p}_run_duration_seconds gauge',
+                f'{p}_run_duration_seconds {self.duration:.6f}',
+            ]
+            if self.success is not None:
+                lines += [
+                    f'# HELP {p}_last_run_success Whether the run completed without errors.',
+                    f'# TYPE {p}_last_run_success gauge',
+                    f'{p}_last_run_success {int(self.success)}',
+                ]
+
+            lines += [
+                f'# HELP {p}_phase_duration_seconds Time spent in each phase of the run.',
+                f'# TYPE {p}_phase_duration_seconds gauge',
+            ]
+            for name, seconds in sorted(self.phases.items()):
+                lines.append(f'{p}_phase_duration_seconds{_labels(phase=name)} {seconds:.6f}')
+
+            lines += [
+                f'# HELP {p}_records_total DNS records by sync outcome.',
+                f'# TYPE {p}_records_total counter',
+            ]
+            for name, value in sorted(self.counters.items()):
+                if name.startswith('records_'):
+                    lines.append(f'{p}_records_total{_labels(action=name[len("records_"):])} {value}')
+            for name, value in sorted(self.counters.items()):
+                if not name.startswith('records_'):
+                    lines += [f'# TYPE {p}_{name}_total counter', f'{p}_{name}_total {value}']
+
+            lines += [
+                f'# HELP {p}_http_request_duration_seconds Controller request latency.',
+                f'# TYPE {p}_http_request_duration_seconds histogram',
+            ]
+            for (method, endpoint), histogram in sorted(self.requests.items()):
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    labels = _labels(method=method, endpoint=endpoint, le=f'{bound:g}')
+                    lines.append(f'{p}_http_request_duration_seconds_bucket{labels} {count}')
+                labels = _labels(method=method, endpoint=endpoint, le='+Inf')
+                lines.append(f'{p}_http_request_duration_seconds_bucket{labels} {histogram.count}')
+                labels = _labels(method=method, endpoint=endpoint)
+                lines.append(f'{p}_http_request_duration_seconds_sum{labels} {histogram.sum:.6f}')
+                lines.append(f'{p}_http_request_duration_seconds_count{labels} {histogram.count}')
+
+            lines += [
+                f'# HELP {p}_http_responses_total Controller responses by status.',
+                f'# TYPE {p}_http_responses_total counter',
+            ]
+            for (method, endpoint, status), count in sorted(self.responses.items()):
+                labels = _labels(method=method, endpoint=endpoint, status=status)
+                lines.append(f'{p}_http_responses_total{labels} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _write_atomic(path: str, content: str) -> None:
+        # node-exporter may read the file at any time, so never expose a partial write
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def write_prometheus(self, path: str) -> None:
+        """Write a Prometheus textfile-collector file."""
+        self._write_atomic(path, self.to_prometheus())
+
+    def write_json(self, path: str) -> None:
+        """Write the JSON summary."""
+        self._write_atomic(path, json.dumps(self.to_dict(), indent=2) + '\n')
@@ -0,0 +1,89 @@
+"""
+In-memory mirror of controller DNS records
+
+This module keeps a local copy of the controller's static DNS records that is
+updated as changes are applied, so long-running modes can plan changes without
+fetching the full record list every time.
+"""
+
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from .plan import Create, Update, Delete
+from .records import DNSRecord, RecordLike, RecordStore
+
+logger = logging.getLogger(__name__)
+
+
+class RecordMirror:
+    """Thread-safe, hostname-indexed copy of the controller's DNS records."""
+
+    def __init__(self, records: Optional[Iterable[RecordLike]] = None):
+        self._lock = threading.Lock()
+        self._store = RecordStore()
+        self.needs_refresh = False
+        if records is not None:
+            self.replace(records)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._store)
+
+    def replace(self, records: Iterable[RecordLike]) -> None:
+        """Replace the mirror's contents with a fresh listing from the controller."""
+        if isinstance(records, RecordStore):
+            store = records
+        else:
+            store = RecordStore(record for record in records
+                                if (record.id if isinstance(record, DNSRecord) else record.get('_id')))
+
+        with self._lock:
+            self._store = store
+            self.needs_refresh = False
+
+    def records(self, hostnames: Optional[Iterable[str]] = None) -> RecordStore:
+        """
+        Return a snapshot of mirrored records.
+
+        Args:
+            hostnames: Only return records for these hostnames (default: all records)
+        """
+        with self._lock:
+            if hostnames is None:
+                return RecordStore(self._store)
+            return self._store.select(hostnames)
+
+    def by_hostname(self, hostname: str) -> List[DNSRecord]:
+        """Return the mirrored records for a hostname."""
+        with self._lock:
+            return self._store.by_hostname(hostname)
+
+    def by_ip(self, ip: str) -> List[DNSRecord]:
+        """Return the mirrored records pointing at an IP."""
+        with self._lock:
+            return self._store.by_ip(ip)
+
+    def apply(self, op, result: Optional[Dict]) -> None:
+        """
+        Record an operation that succeeded on the controller.
+
+        Suitable as the on_applied callback of UnifiDNSManager.apply_plan.
+        """
+        with self._lock:
+            if isinstance(op, Create):
+                if not isinstance(result, dict) or not result.get('_id'):
+                    # Without the new record's ID it cannot be updated or deleted later
+                    logger.debug(f"Controller returned no record ID for {op.hostname}, mirror needs refresh")
+                    self.needs_refresh = True
+                    return
+                record = dict(result)
+                record.setdefault('key', op.hostname)
+                record.setdefault('value', op.ip)
+                record.setdefault('record_type', 'A')
+                self._store.add(record)
+            elif isinstance(op, Update):
+                if not self._store.set_value(op.record_id, op.new_ip):
+                    self._store.add(DNSRecord(op.record_id, op.hostname, op.new_ip))
+            elif isinstance(op, Delete):
+                self._store.remove(op.record_id)
@@ -0,0 +1,295 @@
+"""
+Change planning for Unifi DNS Sync
+
+This module computes the set of record changes needed to move the controller
+from its existing DNS records to the desired entries. Planning has no side
+effects, so the same plan drives dry-runs, real syncs and plans saved to disk
+for later approval.
+"""
+
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .records import RecordLike, RecordStore
+
+logger = logging.getLogger(__name__)
+
+PLAN_FORMAT_VERSION = 1
+
+
+@dataclass(frozen=True)
+class Create:
+    """Create a new A record."""
+    hostname: str
+    ip: str
+    # Other fields to create the record with, such as those of a deleted record being restored
+    record: Optional[Dict[str, Any]] = field(default=None, compare=False, repr=False)
+
+
+@dataclass(frozen=True)
+class Update:
+    """Point an existing A record at a new IP, keeping its ID and other fields."""
+    record_id: str
+    hostname: str
+    old_ip: str
+    new_ip: str
+    # The record as fetched, sent back with only its value changed (None: unknown)
+    record: Optional[Dict[str, Any]] = field(default=None, compare=False, repr=False)
+
+
+@dataclass(frozen=True)
+class Delete:
+    """Delete an existing A record."""
+    record_id: str
+    hostname: str
+    ip: str
+    # The record as fetched, so that a rollback can recreate it (None: unknown)
+    record: Optional[Dict[str, Any]] = field(default=None, compare=False, repr=False)
+
+
+@dataclass(frozen=True)
+class ChangePlan:
+    """An immutable, serializable set of DNS record changes."""
+    creates: Tuple[Create, ...] = ()
+    updates: Tuple[Update, ...] = ()
+    deletes: Tuple[Delete, ...] = ()
+    unchanged: Tuple[Tuple[str, str], ...] = ()
+    controller: Optional[str] = None
+    site: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    zone: Optional[str] = None  # Scope zone of a shard plan
+    # The per-zone plans a merged plan was built from, by merge_plans
+    shards: Tuple['ChangePlan', ...] = field(default=(), compare=False, repr=False)
+
+    @property
+    def has_changes(self) -> bool:
+        """Whether applying the plan would modify any record."""
+        return bool(self.creates or self.updates or self.deletes)
+
+    def summary(self) -> Dict[str, int]:
+        """Count the operations in the plan."""
+        return {
+            'created': len(self.creates),
+            'updated': len(self.updates),
+            'deleted': len(self.deletes),
+            'existing': len(self.unchanged)
+        }
+
+    def host_operations(self) -> Dict[str, List[Any]]:
+        """
+        Group the plan's operations by hostname.
+
+        For each hostname the create or update comes first, followed by the
+        deletes of its stale records, which is the order they must be applied in.
+        """
+        grouped: Dict[str, List[Any]] = {}
+        for op in self.creates:
+            grouped.setdefault(op.hostname, []).append(op)
+        for op in self.updates:
+            grouped.setdefault(op.hostname, []).append(op)
+        for op in self.deletes:
+            grouped.setdefault(op.hostname, []).append(op)
+        return grouped
+
+    def to_changes(self) -> Dict[str, List[tuple]]:
+        """Convert the plan into the changes structure used by render_diff."""
+        return {
+            'created': [(op.hostname, op.ip) for op in self.creates],
+            'updated': [(op.hostname, op.old_ip, op.new_ip) for op in self.updates],
+            'deleted': [(op.hostname, op.ip) for op in self.deletes],
+            'unchanged': list(self.unchanged)
+        }
+
+    def _changes_dict(self) -> Dict[str, Any]:
+        return {
+            'creates': [{'hostname': op.hostname, 'ip': op.ip, 'record': op.record} for op in self.creates],
+            'updates': [
+                {'record_id': op.record_id, 'hostname': op.hostname, 'old_ip': op.old_ip, 'new_ip': op.new_ip,
+                 'record': op.record}
+                for op in self.updates
+            ],
+            'deletes': [
+                {'record_id': op.record_id, 'hostname': op.hostname, 'ip': op.ip, 'record': op.record}
+                for op in self.deletes
+            ],
+            'unchanged': [[hostname, ip] for hostname, ip in self.unchanged]
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the plan to a JSON-serializable dictionary."""
+        plan_dict = {
+            'version': PLAN_FORMAT_VERSION,
+            'controller': self.controller,
+            'site': self.site,
+            'zone': self.zone,
+            'created_at': self.created_at
+        }
+        if self.shards:
+            # Kept per zone, so a saved plan is applied zone by zone again
+            plan_dict['shards'] = [dict(shard._changes_dict(), zone=shard.zone) for shard in self.shards]
+        else:
+            plan_dict.update(self._changes_dict())
+        return plan_dict
+
+    @classmethod
+    def from_dict(cls, plan_dict: Dict[str, Any]) -> 'ChangePlan':
+        """Create a ChangePlan from a dictionary produced by to_dict."""
+        version = plan_dict.get('version')
+        if version != PLAN_FORMAT_VERSION:
+            raise ValueError(f"Unsupported plan format version: {version}")
+
+        header = {
+            'controller': plan_dict.get('controller'),
+            'site': plan_dict.get('site'),
+            'created_at': plan_dict.get('created_at', 0.0)
+        }
+        try:
+            if 'shards' in plan_dict:
+                return merge_plans(cls._from_changes(shard, zone=shard.get('zone'), **header)
+                                   for shard in plan_dict['shards'])
+            return cls._from_changes(plan_dict, zone=plan_dict.get('zone'), **header)
+        except (AttributeError, TypeError, ValueError) as e:
+            raise ValueError(f"Malformed plan: {e}") from e
+
+    @classmethod
+    def _from_changes(cls, changes: Dict[str, Any], **header) -> 'ChangePlan':
+        return cls(
+            creates=tuple(Create(**op) for op in changes.get('creates', [])),
+            updates=tuple(Update(**op) for op in changes.get('updates', [])),
+            deletes=tuple(Delete(**op) for op in changes.get('deletes', [])),
+            unchanged=tuple((hostname, ip) for hostname, ip in changes.get('unchanged', [])),
+            **header
+        )
+
+    def save(self, path: str) -> None:
+        """Write the plan to a JSON file."""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        logger.info(f"Plan saved to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> 'ChangePlan':
+        """Read a plan from a JSON file written by save."""
+        try:
+            with open(path, 'r') as f:
+                plan_dict = json.load(f)
+        except FileNotFoundError:
+            logger.error(f"Plan file not found: {path}")
+            raise
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON in plan file: {e}")
+            raise
+        return cls.from_dict(plan_dict)
+
+
+def merge_plans(plans: Iterable[ChangePlan]) -> ChangePlan:
+    """
+    Combine plans of disjoint hostnames, such as the shards of a scoped sync, into one.
+
+    The controller, site and creation time are taken from the first plan. The
+    plans themselves are kept as the merged plan's shards.
+    """
+    plans = tuple(plans)
+    first = plans[0] if plans else ChangePlan()
+    return ChangePlan(
+        creates=tuple(op for plan in plans for op in plan.creates),
+        updates=tuple(op for plan in plans for op in plan.updates),
+        deletes=tuple(op for plan in plans for op in plan.deletes),
+        unchanged=tuple(pair for plan in plans for pair in plan.unchanged),
+        controller=first.controller,
+        site=first.site,
+        created_at=first.created_at,
+        shards=plans
+    )
+
+
+def resolve_desired(desired_entries: Iterable[Dict], default_ip: str) -> Dict[str, str]:
+    """
+    Map each desired hostname to its single IP.
+
+    Entries without an IP resolve to default_ip; later entries for the same
+    hostname win.
+    """
+    desired_map: Dict[str, str] = {}
+    for entry in desired_entries:
+        ip = entry.get('ip')
+        desired_map[entry.get('hostname')] = default_ip if ip is None else ip
+    return desired_map
+
+
+def _delete(existing: RecordStore, record_id: str, hostname: str, ip: str) -> Delete:
+    record = existing.find(hostname, record_id)
+    return Delete(record_id, hostname, ip, record.to_dict() if record is not None else None)
+
+
+def build_plan(existing_records: Iterable[RecordLike], desired_entries: Iterable[Dict], default_ip: str,
+               controller: Optional[str] = None, site: Optional[str] = None, zone: Optional[str] = None) -> ChangePlan:
+    """
+    Compute the changes needed to reach the desired entries.
+
+    Runs in linear time over the existing records and desired entries.
+
+    Args:
+        existing_records: A RecordStore, or records as returned by the controller's static-dns endpoint
+        desired_entries: Normalized dicts with 'hostname' and optional 'ip' (None -> default_ip)
+        default_ip: IP used for entries without an explicit IP
+        controller: Optional controller URL recorded in the plan
+        site: Optional controller site recorded in the plan
+        zone: Optional scope zone recorded in the plan
+
+    Returns:
+        The change plan. Each desired hostname ends up with exactly one A record:
+        an existing record with the desired IP is kept, otherwise one existing
+        record is updated in place (or a record is created if there is none),
+        and every other A record for the hostname is deleted.
+    """
+    existing = RecordStore.coerce(existing_records)
+
+    # Normalize desired entries into mapping hostname -> ip (single)
+    desired_map = resolve_desired(desired_entries, default_ip)
+
+    creates: List[Create] = []
+    updates: List[Update] = []
+    deletes: List[Delete] = []
+    unchanged: List[Tuple[str, str]] = []
+
+    for hostname, desired_ip in desired_map.items():
+        # Mapping of the hostname's existing A records: ip -> record_id
+        stale = existing.a_records(hostname)
+        if not stale:
+            creates.append(Create(hostname, desired_ip))
+            continue
+
+        if desired_ip in stale:
+            del stale[desired_ip]
+            unchanged.append((hostname, desired_ip))
+        else:
+            # Reuse one existing record for the new IP instead of create + delete
+            old_ip = next(iter(stale))
+            record_id = stale.pop(old_ip)
+            record = existing.find(hostname, record_id)
+            updates.append(Update(record_id, hostname, old_ip, desired_ip,
+                                  record.to_dict() if record is not None else None))
+
+        for ip, record_id in stale.items():
+            deletes.append(_delete(existing, record_id, hostname, ip))
+
+    # Hostnames present on the controller but not desired are deleted entirely
+    for hostname in existing.hostnames():
+        if not hostname or hostname in desired_map:
+            continue
+        for ip, record_id in existing.a_records(hostname).items():
+            deletes.append(_delete(existing, record_id, hostname, ip))
+
+    return ChangePlan(
+        creates=tuple(creates),
+        updates=tuple(updates),
+        deletes=tuple(deletes),
+        unchanged=tuple(unchanged),
+        controller=controller,
+        site=site,
+        zone=zone
+    )
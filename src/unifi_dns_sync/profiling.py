@@ -0,0 +1,223 @@
+"""
+Profiling for Unifi DNS Sync
+
+This module records where a run spends its time and memory: a cProfile
+profile of the calling thread and of every thread started while profiling
+(the apply workers among them), and optionally the peak memory traced by
+tracemalloc during each metrics phase. The results are written to a
+directory and summarized as the top functions by own time.
+
+Usage from Python:
+
+    metrics = Metrics()
+    with Profiler('profile-out', trace_memory=True).attach(metrics) as profiler:
+        manager = UnifiDNSManager(..., metrics=metrics)
+        manager.sync_dns_records(entries)
+    print(profiler.summary())
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from .metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP = 15
+
+PROFILE_FILE = 'profile.pstats'
+REPORT_FILE = 'profile.txt'
+MEMORY_FILE = 'memory.json'
+
+
+def _reset_peak() -> None:
+    """Restart peak tracking from the memory traced now."""
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        # Python 3.8 can only reset the peak along with the traces themselves,
+        # so its peaks count only memory allocated since the phase boundary
+        tracemalloc.clear_traces()
+
+
+class Profiler:
+    """Profiles CPU time of a run and, optionally, peak memory per phase."""
+
+    def __init__(self, output_dir: str, trace_memory: bool = False, top: int = DEFAULT_TOP):
+        """
+        Initialize the profiler.
+
+        Args:
+            output_dir: Directory the profile artifacts are written to
+            trace_memory: Whether to trace allocations and record each phase's peak
+            top: Number of functions listed in the summary
+        """
+        self.output_dir = output_dir
+        self.trace_memory = trace_memory
+        self.top = top
+        self.metrics: Optional[Metrics] = None
+        # Peak traced bytes per phase, and the running peaks of the phases in progress
+        self.memory_peaks: Dict[str, int] = {}
+        self.memory_peak = 0
+        self._open_phases: List[str] = []
+        self._running_peaks: Dict[str, int] = {}
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._started_tracing = False
+        self._active = False
+        self._started: Optional[float] = None
+        self.wall_seconds = 0.0
+
+    def attach(self, metrics: Metrics) -> 'Profiler':
+        """Record memory peaks for the phases timed by metrics; returns self for chaining."""
+        self.metrics = metrics
+        metrics.add_phase_hook(self._on_phase)
+        return self
+
+    def start(self) -> None:
+        """Start profiling the calling thread and threads started from now on."""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        profile = cProfile.Profile()
+        self._profiles.append(profile)
+        self._active = True
+        threading.setprofile(self._profile_thread)
+        self._started = time.perf_counter()
+        profile.enable()
+
+    def stop(self) -> None:
+        """Stop profiling."""
+        if not self._active:
+            return
+        self._profiles[0].disable()
+        self.wall_seconds = time.perf_counter() - self._started
+        threading.setprofile(None)
+        with self._lock:
+            self._active = False
+            for profile in self._profiles[1:]:
+                profile.disable()
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.memory_peak = max(self.memory_peak, tracemalloc.get_traced_memory()[1])
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def __enter__(self) -> 'Profiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+        self.write()
+
+    def _profile_thread(self, frame, event, arg) -> None:
+        """threading.setprofile hook: give each new thread a profiler of its own."""
+        sys.setprofile(None)
+        with self._lock:
+            if not self._active:
+                return
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Interpreters whose profiler is process-wide allow only one
+                logger.debug(f"Not profiling thread {threading.current_thread().name}: {e}")
+                return
+            self._profiles.append(profile)
+
+    def _on_phase(self, name: str, entering: bool) -> None:
+        """Metrics phase hook recording the peak traced memory of each phase."""
+        if not self.trace_memory or not tracemalloc.is_tracing():
+            return
+        with self._lock:
+            # The peak is process-wide and reset on every phase boundary, so
+            # fold it into every phase still open before resetting it
+            peak = tracemalloc.get_traced_memory()[1]
+            self.memory_peak = max(self.memory_peak, peak)
+            for phase in self._open_phases:
+                self._running_peaks[phase] = max(self._running_peaks.get(phase, 0), peak)
+            if entering:
+                self._open_phases.append(name)
+                self._running_peaks.setdefault(name, 0)
+            elif name in self._open_phases:
+                self._open_phases.remove(name)
+                if name not in self._open_phases:
+                    self.memory_peaks[name] = max(self.memory_peaks.get(name, 0), self._running_peaks.pop(name))
+            _reset_peak()
+
+    def stats(self) -> Optional[pstats.Stats]:
+        """Return the merged profile of all profiled threads, or None if nothing was profiled."""
+        stats = None
+        for profile in self._profiles:
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile, stream=io.StringIO())
+            else:
+                stats.add(profile)
+        return stats
+
+    def summary(self) -> str:
+        """Return a short report of the hottest functions and, if traced, each phase's memory peak."""
+        lines = [f"Profile of {self.wall_seconds:.3f}s run across {len(self._profiles)} thread(s)"]
+        phases = self.metrics.to_dict()['phases'] if self.metrics is not None else {}
+        if phases:
+            lines.append("Phases: " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in phases.items()))
+        if self.memory_peaks:
+            lines.append("Peak traced memory: " + ", ".join(
+                f"{name} {peak / 2**20:.1f} MiB" for name, peak in self.memory_peaks.items())
+                + f" (overall {self.memory_peak / 2**20:.1f} MiB)")
+
+        stats = self.stats()
+        if stats is not None:
+            lines.append(f"Top {self.top} functions by own time, summed across threads:")
+            lines.append(f"{'own s':>9} {'total s':>9} {'calls':>9}  function")
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:self.top]
+            for (filename, line, function), (_, calls, own, total, _) in rows:
+                location = f"{os.path.basename(filename)}:{line}" if line else filename
+                lines.append(f"{own:9.3f} {total:9.3f} {calls:9d}  {function} ({location})")
+        return "\n".join(lines)
+
+    def write(self) -> Dict[str, str]:
+        """
+        Write the profile artifacts to the output directory.
+
+        Returns:
+            Paths of the written files by kind: 'pstats' (load with pstats or
+            snakeviz), 'report' (text, sorted by cumulative time) and, when
+            memory was traced, 'memory' (JSON)
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = {}
+        stats = self.stats()
+        if stats is not None:
+            paths['pstats'] = os.path.join(self.output_dir, PROFILE_FILE)
+            stats.dump_stats(paths['pstats'])
+
+            paths['report'] = os.path.join(self.output_dir, REPORT_FILE)
+            with open(paths['report'], 'w') as f:
+                stats.stream = f
+                stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats()
+                stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top * 4)
+
+        if self.trace_memory:
+            paths['memory'] = os.path.join(self.output_dir, MEMORY_FILE)
+            with open(paths['memory'], 'w') as f:
+                json.dump({
+                    'peak_bytes': self.memory_peak,
+                    'phases': {name: {'peak_bytes': peak} for name, peak in self.memory_peaks.items()}
+                }, f, indent=2)
+
+        logger.info(f"Profile written to {self.output_dir}")
+        return paths
@@ -0,0 +1,148 @@
+"""
+Adaptive concurrency limiting for Unifi DNS Sync
+
+This module provides an AIMD limiter for record writes. It grows the number of
+writes in flight while the controller answers quickly and cuts it back as soon
+as latency climbs or the controller answers with 429, 5xx or a dropped
+connection, so small controllers are not overloaded and large ones are not
+left idle.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Latency above this multiple of the best observed latency counts as congestion
+DEFAULT_LATENCY_TOLERANCE = 2.0
+
+# Latency must also exceed the baseline by this many seconds, so jitter on a
+# controller answering in a millisecond or two is not mistaken for congestion
+MIN_LATENCY_HEADROOM = 0.005
+
+# Multiplicative decrease applied on congestion
+DEFAULT_BACKOFF_RATIO = 0.7
+
+# Weight of the newest sample in the smoothed latency
+_SMOOTHING = 0.2
+
+# Per-sample drift of the baseline latency, so a controller that becomes
+# permanently slower does not pin the limit at the floor forever
+_BASELINE_DRIFT = 0.001
+
+
+class AdaptiveLimiter:
+    """
+    Limits writes in flight, adjusting the limit with additive-increase/multiplicative-decrease.
+
+    The limit starts at the floor and doubles every round trip (slow start)
+    until the first sign of congestion, after which it grows by one per round
+    trip and is multiplied by backoff_ratio, at most once per round trip, on
+    congestion. A limiter with floor == ceiling is a plain semaphore.
+    """
+
+    def __init__(self, floor: int = 1, ceiling: int = 8, initial: Optional[int] = None,
+                 latency_tolerance: float = DEFAULT_LATENCY_TOLERANCE,
+                 backoff_ratio: float = DEFAULT_BACKOFF_RATIO):
+        """
+        Initialize the limiter.
+
+        Args:
+            floor: Lowest limit the limiter will back off to
+            ceiling: Highest limit the limiter will grow to
+            initial: Starting limit (default: floor)
+            latency_tolerance: Multiple of the baseline latency treated as congestion
+            backoff_ratio: Factor applied to the limit on congestion
+        """
+        if floor < 1 or ceiling < floor:
+            raise ValueError(f"Need 1 <= floor <= ceiling, got floor={floor}, ceiling={ceiling}")
+        if not 0 < backoff_ratio < 1:
+            raise ValueError(f"backoff_ratio must be between 0 and 1, got {backoff_ratio}")
+
+        self.floor = floor
+        self.ceiling = ceiling
+        self.latency_tolerance = latency_tolerance
+        self.backoff_ratio = backoff_ratio
+        self.limit = float(min(max(initial if initial is not None else floor, floor), ceiling))
+        self.in_flight = 0
+        self.decreases = 0
+        self._slow_start = True
+        self._baseline: Optional[float] = None
+        self._smoothed: Optional[float] = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def adaptive(self) -> bool:
+        """Whether the limit can change at all."""
+        return self.floor != self.ceiling
+
+    def acquire(self) -> None:
+        """Block until a write may be started."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        """Mark a write started with acquire as finished."""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one write slot for the duration of the block."""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self, latency: float) -> None:
+        """Report a write answered successfully after latency seconds."""
+        if not self.adaptive:
+            return
+        with self._condition:
+            if self._baseline is None or latency < self._baseline:
+                self._baseline = latency
+            else:
+                self._baseline *= 1 + _BASELINE_DRIFT
+            self._smoothed = latency if self._smoothed is None else (
+                _SMOOTHING * latency + (1 - _SMOOTHING) * self._smoothed)
+
+            threshold = max(self.latency_tolerance * self._baseline, self._baseline + MIN_LATENCY_HEADROOM)
+            if self._smoothed > threshold:
+                self._decrease(f"latency {self._smoothed * 1000:.0f}ms over baseline {self._baseline * 1000:.0f}ms")
+                return
+
+            previous = int(self.limit)
+            # Both steps are per completed write: +1 each is doubling per round
+            # trip, +1/limit each is +1 per round trip
+            self.limit = min(self.limit + (1.0 if self._slow_start else 1.0 / self.limit), self.ceiling)
+            if int(self.limit) > previous:
+                logger.debug(f"Write limit raised to {int(self.limit)}")
+                self._condition.notify_all()
+
+    def on_overload(self, reason: str) -> None:
+        """Report a write rejected with 429/5xx or lost to a connection error."""
+        if not self.adaptive:
+            return
+        with self._condition:
+            self._decrease(reason)
+
+    def _decrease(self, reason: str) -> None:
+        """Back off multiplicatively, at most once per round trip. Caller holds the lock."""
+        now = time.monotonic()
+        if now - self._last_decrease < (self._smoothed or 0.0):
+            return
+        self._last_decrease = now
+        self._slow_start = False
+        self.decreases += 1
+        previous = int(self.limit)
+        self.limit = max(self.limit * self.backoff_ratio, float(self.floor))
+        if int(self.limit) != previous:
+            logger.debug(f"Write limit lowered to {int(self.limit)} ({reason})")
@@ -0,0 +1,453 @@
+"""
+Compact record storage for Unifi DNS Sync
+
+This module keeps the controller's static DNS records in columns instead of
+one dict per record: IDs and IPv4 addresses are packed into shared byte
+arrays, record types and flags take one byte each, and hostnames are
+interned. The controller's other fields (ttl, weight and so on) are kept as
+interned tuples shared by every record with the same values, so an update
+can send a record back unchanged apart from its value. This cuts the memory
+held for a listing of 100k records to a fraction of the parsed JSON.
+"""
+
+import sys
+from array import array
+from socket import inet_aton, inet_ntoa
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Flag bits stored per row
+_ENABLED = 1
+_REMOVED = 2
+
+# Record types are stored as one-byte codes; A records always have code 0
+_A = 0
+
+# Rewrite the columns once more than this fraction of the rows has been removed
+_COMPACT_RATIO = 0.5
+
+# Fields with a column of their own; any other field is kept with the record's extras
+_CORE_FIELDS = frozenset(('_id', 'key', 'value', 'record_type', 'enabled'))
+
+ExtraFields = Tuple[Tuple[str, Any], ...]
+
+
+def _extra_fields(record: Dict) -> ExtraFields:
+    """Return the fields of a controller record that have no column, in their original order."""
+    return tuple((name, value) for name, value in record.items() if name not in _CORE_FIELDS)
+
+
+def pack_ipv4(value: Any) -> Optional[bytes]:
+    """
+    Pack a dotted-quad IPv4 address into 4 bytes.
+
+    Returns:
+        The packed address, or None if value is not an IPv4 address in
+        canonical form (which unpack_ipv4 would not reproduce exactly)
+    """
+    try:
+        packed = inet_aton(value)
+    except (OSError, TypeError, ValueError):
+        return None
+    # inet_aton also accepts forms such as "10.1" or "010.0.0.1"
+    return packed if inet_ntoa(packed) == value else None
+
+
+def unpack_ipv4(packed: bytes) -> str:
+    """Convert an address packed by pack_ipv4 back to dotted-quad form."""
+    return inet_ntoa(packed)
+
+
+def _pack_id(record_id: Any) -> Optional[bytes]:
+    """Pack a lowercase hex record ID (as used by the controller) into bytes."""
+    try:
+        packed = bytes.fromhex(record_id)
+    except (TypeError, ValueError):
+        return None
+    # Only IDs that unpack to exactly the same string can be packed
+    return packed if packed.hex() == record_id else None
+
+
+def _index_add(index: Dict, key: Any, row: int) -> None:
+    # Most keys map to a single row, which is stored without a list around it
+    rows = index.get(key)
+    if rows is None:
+        index[key] = row
+    elif isinstance(rows, list):
+        rows.append(row)
+    else:
+        index[key] = [rows, row]
+
+
+def _index_remove(index: Dict, key: Any, row: int) -> None:
+    rows = index.get(key)
+    if isinstance(rows, list):
+        rows.remove(row)
+        if len(rows) == 1:
+            index[key] = rows[0]
+    elif rows == row:
+        del index[key]
+
+
+def _index_rows(index: Dict, key: Any) -> Tuple[int, ...]:
+    rows = index.get(key)
+    if rows is None:
+        return ()
+    return tuple(rows) if isinstance(rows, list) else (rows,)
+
+
+class DNSRecord:
+    """A single static DNS record read from a RecordStore."""
+
+    __slots__ = ('id', 'hostname', 'value', 'record_type', 'enabled', 'extra')
+
+    def __init__(self, id: Optional[str], hostname: Optional[str], value: Optional[str],
+                 record_type: Optional[str] = 'A', enabled: bool = True, extra: ExtraFields = ()):
+        self.id = id
+        self.hostname = hostname
+        self.value = value
+        self.record_type = record_type
+        self.enabled = enabled
+        # The controller's other fields, as (name, value) pairs
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> 'DNSRecord':
+        """Create a record from the controller's JSON representation."""
+        return cls(record.get('_id'), record.get('key'), record.get('value'),
+                   record.get('record_type'), bool(record.get('enabled', True)), _extra_fields(record))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the record to the controller's JSON representation."""
+        record = {'_id': self.id, 'key': self.hostname, 'value': self.value,
+                  'record_type': self.record_type, 'enabled': self.enabled}
+        record.update(self.extra)
+        return record
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, DNSRecord):
+            return NotImplemented
+        return (self.id, self.hostname, self.value, self.record_type, self.enabled, self.extra) == \
+            (other.id, other.hostname, other.value, other.record_type, other.enabled, other.extra)
+
+    def __repr__(self) -> str:
+        return (f"DNSRecord(id={self.id!r}, hostname={self.hostname!r}, value={self.value!r}, "
+                f"record_type={self.record_type!r}, enabled={self.enabled!r}, extra={self.extra!r})")
+
+
+RecordLike = Union[Dict, DNSRecord]
+
+
+class RecordStore:
+    """
+    Column-oriented store of static DNS records, indexed by hostname.
+
+    Lookups by ID and by IP use indexes built on first use, so a store that
+    is only planned against never pays for them. A store is not thread-safe;
+    callers sharing one across threads must lock around it.
+    """
+
+    def __init__(self, records: Optional[Iterable[RecordLike]] = None):
+        """
+        Initialize the store.
+
+        Args:
+            records: Records to load, as controller JSON dicts or DNSRecords
+        """
+        self._ids = bytearray()
+        self._id_width: Optional[int] = None
+        self._raw_ids: Dict[int, Any] = {}
+        self._hosts: List[Optional[str]] = []
+        self._ips = bytearray()
+        self._raw_values: Dict[int, Any] = {}
+        self._types = bytearray()
+        self._type_names: List[Optional[str]] = ['A']
+        self._type_codes: Dict[Optional[str], int] = {'A': _A}
+        self._flags = bytearray()
+        # Per row, an index into the distinct extra-field tuples seen so far
+        self._extras = array('I')
+        self._extra_sets: List[ExtraFields] = [()]
+        self._extra_codes: Dict[ExtraFields, int] = {(): 0}
+        self._removed = 0
+        self._by_host: Dict[str, Any] = {}
+        self._by_id: Optional[Dict[str, int]] = None
+        self._by_ip: Optional[Dict[Any, Any]] = None
+        if records is not None:
+            self.extend(records)
+
+    @classmethod
+    def coerce(cls, records: Iterable[RecordLike]) -> 'RecordStore':
+        """Return records as a RecordStore, loading them into one unless they already are."""
+        return records if isinstance(records, RecordStore) else cls(records)
+
+    def __len__(self) -> int:
+        return len(self._hosts) - self._removed
+
+    def __iter__(self) -> Iterator[DNSRecord]:
+        for row in range(len(self._hosts)):
+            if not self._flags[row] & _REMOVED:
+                yield self._record(row)
+
+    def __repr__(self) -> str:
+        return f"RecordStore({len(self)} records)"
+
+    # Columns
+
+    def _id(self, row: int) -> Any:
+        if self._raw_ids and row in self._raw_ids:
+            return self._raw_ids[row]
+        width = self._id_width
+        return self._ids[row * width:(row + 1) * width].hex()
+
+    def _value(self, row: int) -> Any:
+        if self._raw_values and row in self._raw_values:
+            return self._raw_values[row]
+        return inet_ntoa(self._ips[row * 4:row * 4 + 4])
+
+    def _ip_key(self, row: int) -> Any:
+        # Packed addresses are keyed by their bytes, anything else by its raw value
+        if self._raw_values and row in self._raw_values:
+            return self._raw_values[row]
+        return bytes(self._ips[row * 4:row * 4 + 4])
+
+    def _record(self, row: int) -> DNSRecord:
+        return DNSRecord(self._id(row), self._hosts[row], self._value(row),
+                         self._type_names[self._types[row]], bool(self._flags[row] & _ENABLED),
+                         self._extra_sets[self._extras[row]])
+
+    # Indexes
+
+    def _id_index(self) -> Dict[str, int]:
+        if self._by_id is None:
+            by_id = {}
+            for row in range(len(self._hosts)):
+                if not self._flags[row] & _REMOVED:
+                    record_id = self._id(row)
+                    if record_id is not None:
+                        by_id[record_id] = row
+            self._by_id = by_id
+        return self._by_id
+
+    def _ip_index(self) -> Dict[Any, Any]:
+        if self._by_ip is None:
+            by_ip: Dict[Any, Any] = {}
+            for row in range(len(self._hosts)):
+                if not self._flags[row] & _REMOVED:
+                    _index_add(by_ip, self._ip_key(row), row)
+            self._by_ip = by_ip
+        return self._by_ip
+
+    # Mutation
+
+    def extend(self, records: Iterable[RecordLike]) -> None:
+        """
+        Append records without checking for duplicate IDs.
+
+        Meant for loading a listing from the controller, whose IDs are unique;
+        use add to insert or replace a single record.
+        """
+        # Loading runs once per record of the listing, so the columns are
+        # bound to locals and the common single-row index case is inlined
+        ids, raw_ids, hosts, ips, raw_values = self._ids, self._raw_ids, self._hosts, self._ips, self._raw_values
+        types, type_codes, flags, by_host = self._types, self._type_codes, self._flags, self._by_host
+        extras, extra_sets, extra_codes = self._extras, self._extra_sets, self._extra_codes
+        intern = sys.intern
+
+        for record in records:
+            if isinstance(record, DNSRecord):
+                record_id, hostname, value = record.id, record.hostname, record.value
+                record_type, enabled, extra = record.record_type, record.enabled, record.extra
+            else:
+                record_id, hostname, value = record.get('_id'), record.get('key'), record.get('value')
+                record_type, enabled = record.get('record_type'), record.get('enabled', True)
+                extra = _extra_fields(record)
+            row = len(hosts)
+
+            packed_id = _pack_id(record_id)
+            width = self._id_width
+            if width is None:
+                # The controller's IDs all have the same length, so the first one
+                # sets the width; IDs that do not fit it are kept as they are
+                width = self._id_width = 0 if packed_id is None else len(packed_id)
+            if packed_id is not None and width and len(packed_id) == width:
+                ids += packed_id
+            else:
+                ids += bytes(width)
+                raw_ids[row] = record_id
+
+            packed_ip = pack_ipv4(value)
+            if packed_ip is None:
+                ips += b'\0\0\0\0'
+                raw_values[row] = value
+            else:
+                ips += packed_ip
+
+            code = type_codes.get(record_type)
+            if code is None:
+                if len(self._type_names) > 255:
+                    raise ValueError("Too many distinct record types")
+                code = type_codes[record_type] = len(self._type_names)
+                self._type_names.append(record_type)
+            types.append(code)
+            flags.append(_ENABLED if enabled else 0)
+
+            # Records mostly share the same few extra values, so each distinct
+            # tuple is stored once; unhashable ones (nested JSON) get their own
+            try:
+                extra_code = extra_codes.get(extra)
+                if extra_code is None:
+                    extra_code = extra_codes[extra] = len(extra_sets)
+                    extra_sets.append(extra)
+            except TypeError:
+                extra_code = len(extra_sets)
+                extra_sets.append(extra)
+            extras.append(extra_code)
+
+            if hostname is not None:
+                hostname = intern(hostname)
+                if hostname in by_host:
+                    _index_add(by_host, hostname, row)
+                else:
+                    by_host[hostname] = row
+            hosts.append(hostname)
+
+            if self._by_id is not None and record_id is not None:
+                self._by_id[record_id] = row
+            if self._by_ip is not None:
+                _index_add(self._by_ip, self._ip_key(row), row)
+
+    def add(self, record: RecordLike) -> None:
+        """Insert a record, replacing any record with the same ID."""
+        if not isinstance(record, DNSRecord):
+            record = DNSRecord.from_dict(record)
+        if record.id is not None:
+            self.remove(record.id)
+        self.extend((record,))
+
+    def remove(self, record_id: str) -> bool:
+        """
+        Remove the record with the given ID.
+
+        Returns:
+            Whether a record was removed
+        """
+        row = self._id_index().pop(record_id, None)
+        if row is None:
+            return False
+        hostname = self._hosts[row]
+        if hostname is not None:
+            _index_remove(self._by_host, hostname, row)
+        if self._by_ip is not None:
+            _index_remove(self._by_ip, self._ip_key(row), row)
+        self._flags[row] |= _REMOVED
+        self._removed += 1
+        if self._removed > _COMPACT_RATIO * len(self._hosts):
+            self._compact()
+        return True
+
+    def set_value(self, record_id: str, value: str) -> bool:
+        """
+        Change the value of the record with the given ID.
+
+        Returns:
+            Whether the record exists
+        """
+        row = self._id_index().get(record_id)
+        if row is None:
+            return False
+        if self._by_ip is not None:
+            _index_remove(self._by_ip, self._ip_key(row), row)
+        packed_ip = pack_ipv4(value)
+        if packed_ip is None:
+            self._raw_values[row] = value
+        else:
+            self._ips[row * 4:row * 4 + 4] = packed_ip
+            self._raw_values.pop(row, None)
+        if self._by_ip is not None:
+            _index_add(self._by_ip, self._ip_key(row), row)
+        return True
+
+    def _compact(self) -> None:
+        """Rewrite the columns without removed rows."""
+        live = list(self)
+        had_id_index = self._by_id is not None
+        had_ip_index = self._by_ip is not None
+        self.__init__()
+        self.extend(live)
+        if had_id_index:
+            self._id_index()
+        if had_ip_index:
+            self._ip_index()
+
+    # Queries
+
+    def get(self, record_id: str) -> Optional[DNSRecord]:
+        """Return the record with the given ID, or None."""
+        row = self._id_index().get(record_id)
+        return None if row is None else self._record(row)
+
+    def find(self, hostname: str, record_id: str) -> Optional[DNSRecord]:
+        """Return the hostname's record with the given ID, or None, without building the ID index."""
+        for row in _index_rows(self._by_host, hostname):
+            if self._id(row) == record_id:
+                return self._record(row)
+        return None
+
+    def hostnames(self) -> List[str]:
+        """Return every hostname with at least one record, in first-seen order."""
+        return list(self._by_host)
+
+    def by_hostname(self, hostname: str) -> List[DNSRecord]:
+        """Return the records for a hostname."""
+        return [self._record(row) for row in _index_rows(self._by_host, hostname)]
+
+    def by_ip(self, ip: str) -> List[DNSRecord]:
+        """Return the records whose value is the given IP (or other value)."""
+        packed_ip = pack_ipv4(ip)
+        key = ip if packed_ip is None else packed_ip
+        return [self._record(row) for row in _index_rows(self._ip_index(), key)]
+
+    def a_records(self, hostname: str) -> Dict[Any, Any]:
+        """
+        Map each IP of the hostname's A records to the record's ID.
+
+        A hostname with several A records for the same IP maps it to the last
+        of them, as the planner has always done.
+        """
+        rows = self._by_host.get(hostname)
+        if rows is None:
+            return {}
+        if not isinstance(rows, list):
+            # The common case of a single record is inlined: the planner calls
+            # this once per desired hostname
+            row = rows
+            if self._types[row] != _A:
+                return {}
+            value = self._raw_values[row] if self._raw_values and row in self._raw_values \
+                else inet_ntoa(self._ips[row * 4:row * 4 + 4])
+            if self._raw_ids and row in self._raw_ids:
+                return {value: self._raw_ids[row]}
+            width = self._id_width
+            return {value: self._ids[row * width:(row + 1) * width].hex()}
+        return {self._value(row): self._id(row) for row in rows if self._types[row] == _A}
+
+    def find_a_record(self, hostname: str, ip: str) -> Optional[str]:
+        """Return the ID of the first A record for hostname with the given IP, or None."""
+        for row in _index_rows(self._by_host, hostname):
+            if self._types[row] == _A and self._value(row) == ip:
+                return self._id(row)
+        return None
+
+    def a_pairs(self) -> Iterator[Tuple[str, Any]]:
+        """Yield (hostname, ip) for every A record with a hostname."""
+        for row in range(len(self._hosts)):
+            if not self._flags[row] & _REMOVED and self._hosts[row] and self._types[row] == _A:
+                yield self._hosts[row], self._value(row)
+
+    def select(self, hostnames: Iterable[str]) -> 'RecordStore':
+        """Return a new store with only the records of the given hostnames."""
+        by_host = self._by_host
+        return RecordStore(self._record(row) for hostname in hostnames for row in _index_rows(by_host, hostname))
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Return every record in the controller's JSON representation."""
+        return [record.to_dict() for record in self]
@@ -0,0 +1,322 @@
+"""
+Change reports for Unifi DNS Sync
+
+This module reports the record changes of a sync as they happen. Each
+completed operation is passed to a report writer, which either streams it
+right away as machine-readable NDJSON or JSON, or, for the human-readable
+diff, collects it until the sync finishes. Every applied or previewed plan
+ends with a summary of its counts.
+"""
+
+import heapq
+import json
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, TextIO, Tuple
+
+REPORT_FORMATS = ('text', 'ndjson', 'json', 'summary')
+
+# Unchanged records listed in the text diff before the rest are only counted
+DEFAULT_UNCHANGED_LIMIT = 20
+
+_SUMMARY_COUNTS = ('created', 'updated', 'deleted', 'existing', 'failed', 'retries')
+
+
+class ChangeReport:
+    """
+    Base class for change report writers.
+
+    Methods may be called from several worker threads at once; subclasses
+    write under the report's lock.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, close_stream: bool = False):
+        """
+        Initialize the report.
+
+        Args:
+            stream: Text stream the report is written to (default: stdout)
+            close_stream: Whether close() also closes the stream
+        """
+        self.stream = stream if stream is not None else sys.stdout
+        self.close_stream = close_stream
+        self._lock = threading.Lock()
+
+    def change(self, action: str, hostname: str, ip: Optional[str], old_ip: Optional[str] = None,
+               controller: Optional[str] = None, site: Optional[str] = None, error: Optional[str] = None,
+               operation: Optional[str] = None, dry_run: bool = False, zone: Optional[str] = None) -> None:
+        """
+        Report one change.
+
+        Args:
+            action: 'created', 'updated', 'deleted' or 'failed'
+            hostname: Hostname of the record
+            ip: IP the record points at (after the change, for updates)
+            old_ip: Previous IP of an updated record
+            controller: Controller name or URL
+            site: Controller site
+            error: Why a failed operation failed
+            operation: The failed operation: 'create', 'update' or 'delete'
+            dry_run: Whether the change is only planned
+            zone: Scope zone of the record, in a scoped sync
+        """
+
+    def finish(self, results: Dict[str, int], unchanged: Iterable[Tuple[str, str]] = (),
+               controller: Optional[str] = None, site: Optional[str] = None, scope: Optional[str] = None,
+               dry_run: bool = False, zone: Optional[str] = None) -> None:
+        """
+        Report the end of one applied or previewed plan.
+
+        Args:
+            results: Counts as returned by UnifiDNSManager.apply_plan
+            unchanged: (hostname, ip) pairs already in the desired state
+            controller: Controller name or URL
+            site: Controller site
+            scope: Description of the controller and site for human-readable headers
+            dry_run: Whether the plan was only previewed
+            zone: Scope zone of the plan, in a scoped sync
+        """
+
+    def report_plan(self, plan, controller: Optional[str] = None, site: Optional[str] = None,
+                    scope: Optional[str] = None) -> None:
+        """Report the changes of a plan that is not applied, as for a dry run."""
+        site = site or plan.site
+        zone = plan.zone
+        for op in plan.deletes:
+            self.change('deleted', op.hostname, op.ip, controller=controller, site=site, dry_run=True, zone=zone)
+        for op in plan.updates:
+            self.change('updated', op.hostname, op.new_ip, op.old_ip, controller=controller, site=site,
+                        dry_run=True, zone=zone)
+        for op in plan.creates:
+            self.change('created', op.hostname, op.ip, controller=controller, site=site, dry_run=True, zone=zone)
+        self.finish(dict(plan.summary(), failed=0, retries=0), plan.unchanged, controller=controller,
+                    site=site, scope=scope, dry_run=True, zone=zone)
+
+    def close(self) -> None:
+        """Finish the report."""
+        with self._lock:
+            self._close()
+            if self.close_stream:
+                self.stream.close()
+            else:
+                self.stream.flush()
+
+    def _close(self) -> None:
+        pass
+
+    @staticmethod
+    def _change_dict(action: str, hostname: str, ip: Optional[str], old_ip: Optional[str],
+                     controller: Optional[str], site: Optional[str], error: Optional[str],
+                     operation: Optional[str], dry_run: bool, zone: Optional[str]) -> Dict[str, Any]:
+        item = {'action': action, 'hostname': hostname, 'ip': ip}
+        if old_ip is not None:
+            item['old_ip'] = old_ip
+        if operation is not None:
+            item['operation'] = operation
+        if error is not None:
+            item['error'] = error
+        if controller is not None:
+            item['controller'] = controller
+        if site is not None:
+            item['site'] = site
+        if zone is not None:
+            item['zone'] = zone
+        if dry_run:
+            item['dry_run'] = True
+        return item
+
+    @staticmethod
+    def _summary_dict(results: Dict[str, int], controller: Optional[str], site: Optional[str],
+                      dry_run: bool, zone: Optional[str]) -> Dict[str, Any]:
+        item: Dict[str, Any] = {name: results.get(name, 0) for name in _SUMMARY_COUNTS}
+        if controller is not None:
+            item['controller'] = controller
+        if site is not None:
+            item['site'] = site
+        if zone is not None:
+            item['zone'] = zone
+        item['dry_run'] = dry_run
+        return item
+
+
+class NDJSONReport(ChangeReport):
+    """Writes each change, and each plan's summary, as a JSON line as soon as it is reported."""
+
+    def change(self, action, hostname, ip, old_ip=None, controller=None, site=None, error=None,
+               operation=None, dry_run=False, zone=None) -> None:
+        item = self._change_dict(action, hostname, ip, old_ip, controller, site, error, operation, dry_run, zone)
+        line = json.dumps(dict(type='change', **item)) + '\n'
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+    def finish(self, results, unchanged=(), controller=None, site=None, scope=None, dry_run=False,
+               zone=None) -> None:
+        line = json.dumps(dict(type='summary', **self._summary_dict(results, controller, site, dry_run, zone))) + '\n'
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+
+class SummaryReport(ChangeReport):
+    """Writes only each plan's summary, as a JSON line."""
+
+    def finish(self, results, unchanged=(), controller=None, site=None, scope=None, dry_run=False,
+               zone=None) -> None:
+        line = json.dumps(self._summary_dict(results, controller, site, dry_run, zone)) + '\n'
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+
+class JSONReport(ChangeReport):
+    """
+    Writes one JSON document: {"changes": [...], "summaries": [...]}.
+
+    Changes are streamed into the document as they are reported; the
+    summaries follow when the report is closed.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, close_stream: bool = False):
+        super().__init__(stream, close_stream)
+        self._count = 0
+        self._summaries: List[Dict[str, Any]] = []
+
+    def change(self, action, hostname, ip, old_ip=None, controller=None, site=None, error=None,
+               operation=None, dry_run=False, zone=None) -> None:
+        item = json.dumps(self._change_dict(action, hostname, ip, old_ip, controller, site, error, operation, dry_run, zone))
+        with self._lock:
+            self.stream.write(('{"changes": [\n' if not self._count else ',\n') + item)
+            self._count += 1
+
+    def finish(self, results, unchanged=(), controller=None, site=None, scope=None, dry_run=False,
+               zone=None) -> None:
+        with self._lock:
+            self._summaries.append(self._summary_dict(results, controller, site, dry_run, zone))
+            self.stream.flush()
+
+    def _close(self) -> None:
+        self.stream.write('{"changes": [' if not self._count else '\n')
+        self.stream.write('],\n"summaries": ' + json.dumps(self._summaries) + '}\n')
+
+
+class TextReport(ChangeReport):
+    """The human-readable diff, printed once each plan finishes, with the unchanged section capped."""
+
+    # Diffs of concurrent syncs, possibly of different managers, share stdout
+    _render_lock = threading.Lock()
+
+    def __init__(self, stream: Optional[TextIO] = None, close_stream: bool = False,
+                 unchanged_limit: Optional[int] = DEFAULT_UNCHANGED_LIMIT):
+        """
+        Initialize the report.
+
+        Args:
+            stream: Text stream the report is written to (default: stdout)
+            close_stream: Whether close() also closes the stream
+            unchanged_limit: Unchanged records listed per diff (None lists all)
+        """
+        super().__init__(stream, close_stream)
+        self.unchanged_limit = unchanged_limit
+        # Changes awaiting their plan's diff, by controller, site and zone
+        self._pending: Dict[Tuple[Optional[str], ...], Dict[str, List[tuple]]] = {}
+
+    def change(self, action, hostname, ip, old_ip=None, controller=None, site=None, error=None,
+               operation=None, dry_run=False, zone=None) -> None:
+        if action == 'failed':
+            return
+        with self._lock:
+            changes = self._pending.setdefault((controller, site, zone), {'created': [], 'updated': [], 'deleted': []})
+            changes[action].append((hostname, old_ip, ip) if action == 'updated' else (hostname, ip))
+
+    def finish(self, results, unchanged=(), controller=None, site=None, scope=None, dry_run=False,
+               zone=None) -> None:
+        with self._lock:
+            changes = self._pending.pop((controller, site, zone), None)
+        if changes is None and not dry_run:
+            return
+        changes = changes or {'created': [], 'updated': [], 'deleted': []}
+        changes['unchanged'] = unchanged
+        with self._render_lock:
+            render_diff(changes, scope, self.unchanged_limit, self.stream)
+
+
+def render_diff(changes: Dict[str, Iterable[tuple]], scope: Optional[str] = None,
+                unchanged_limit: Optional[int] = DEFAULT_UNCHANGED_LIMIT, stream: Optional[TextIO] = None) -> None:
+    """Write a diff-style summary of DNS record changes.
+
+    Accepts changes lists containing (hostname, ip) tuples, and an optional
+    'updated' list of (hostname, old_ip, new_ip) tuples. The scope, if
+    given, is shown in the header. At most unchanged_limit unchanged records
+    are listed (None lists all of them).
+    """
+    stream = stream if stream is not None else sys.stdout
+    created = changes.get('created', [])
+    updated = changes.get('updated', [])
+    deleted = changes.get('deleted', [])
+    unchanged = changes.get('unchanged', [])
+    lines = ["", "=" * 60, f"DNS RECORD CHANGES ({scope})" if scope else "DNS RECORD CHANGES", "=" * 60]
+
+    # Show deletions (red/minus)
+    if deleted:
+        lines.append(f"\n❌ DELETED ({len(deleted)} records):")
+        lines.extend(f"  - {hostname} -> {ip}" for hostname, ip in sorted(deleted))
+    # Show in-place updates
+    if updated:
+        lines.append(f"\n🔄 UPDATED ({len(updated)} records):")
+        lines.extend(f"  ~ {hostname} -> {old_ip} => {new_ip}" for hostname, old_ip, new_ip in sorted(updated))
+    # Show additions (green/plus)
+    if created:
+        lines.append(f"\n✅ CREATED ({len(created)} records):")
+        lines.extend(f"  + {hostname} -> {ip}" for hostname, ip in sorted(created))
+
+    # Show unchanged (for context)
+    unchanged = list(unchanged)
+    if unchanged:
+        lines.append(f"\n⚪ UNCHANGED ({len(unchanged)} records):")
+        if unchanged_limit is None or len(unchanged) <= unchanged_limit:
+            shown = sorted(unchanged)
+        else:
+            # Only the listed records need sorting
+            shown = heapq.nsmallest(unchanged_limit, unchanged)
+        lines.extend(f"    {hostname} -> {ip}" for hostname, ip in shown)
+        if len(shown) < len(unchanged):
+            lines.append(f"    ... and {len(unchanged) - len(shown)} more")
+
+    lines.append("\n" + "=" * 60)
+
+    # Summary line
+    total_changes = len(created) + len(updated) + len(deleted)
+    lines.append(f"SUMMARY: {total_changes} changes ({len(created)} created, {len(updated)} updated, "
+                 f"{len(deleted)} deleted)")
+    lines.append("=" * 60)
+    stream.write("\n".join(lines) + "\n")
+    stream.flush()
+
+
+def create_report(report_format: str, path: Optional[str] = None,
+                  unchanged_limit: Optional[int] = DEFAULT_UNCHANGED_LIMIT) -> ChangeReport:
+    """
+    Create a report writer.
+
+    Args:
+        report_format: One of REPORT_FORMATS
+        path: File to write the report to (default or '-': stdout)
+        unchanged_limit: For the text format, unchanged records listed per diff (None lists all)
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format: {report_format}")
+    if path and path != '-':
+        stream, close_stream = open(path, 'w', encoding='utf-8'), True
+    else:
+        stream, close_stream = sys.stdout, False
+    if report_format == 'text':
+        return TextReport(stream, close_stream, unchanged_limit)
+    if report_format == 'ndjson':
+        return NDJSONReport(stream, close_stream)
+    if report_format == 'json':
+        return JSONReport(stream, close_stream)
+    return SummaryReport(stream, close_stream)
@@ -0,0 +1,115 @@
+"""
+Sync scopes for Unifi DNS Sync
+
+This module limits a sync to the hostnames under a set of managed domain
+suffixes, such as "*.k8s.example.com". Records outside the scope belong to
+someone else: they are dropped as the controller listing is read, so they are
+never planned against, updated or deleted. Within the scope, hostnames are
+partitioned by the zone that manages them, and each zone is planned and
+applied as an independent shard.
+"""
+
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .records import DNSRecord, RecordLike
+from .sync import DNSSync
+
+logger = logging.getLogger(__name__)
+
+
+class DomainScope:
+    """
+    A set of managed zones, matched through a suffix index.
+
+    A pattern "*.zone" manages every hostname under zone; a plain "zone"
+    manages the zone's own name as well. A hostname belongs to the most
+    specific zone that manages it, found with one dictionary lookup per label.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        """
+        Initialize the scope.
+
+        Args:
+            patterns: Zones, each either "*.example.com" or "example.com"
+
+        Raises:
+            ValueError: If there are no patterns or one is not a valid zone
+        """
+        # Suffix index: zone name -> (pattern, whether the zone's own name is managed)
+        self._zones: Dict[str, Tuple[str, bool]] = {}
+        for pattern in patterns:
+            pattern = pattern.strip().lower().rstrip('.')
+            wildcard = pattern.startswith('*.')
+            zone = pattern[2:] if wildcard else pattern
+            if not DNSSync.validate_hostname(zone) or '*' in zone or '' in zone.split('.'):
+                raise ValueError(f"Invalid scope pattern: {pattern!r}, expected '*.example.com' or 'example.com'")
+            known = self._zones.get(zone)
+            if known is not None and known[1]:
+                # "example.com" already covers "*.example.com"
+                continue
+            self._zones[zone] = (pattern, not wildcard)
+        if not self._zones:
+            raise ValueError("A scope needs at least one pattern")
+
+    @property
+    def patterns(self) -> List[str]:
+        """The managed zones' patterns, sorted."""
+        return sorted(pattern for pattern, _ in self._zones.values())
+
+    def __repr__(self) -> str:
+        return f"DomainScope({self.patterns!r})"
+
+    def zone_of(self, hostname: Optional[str]) -> Optional[str]:
+        """Return the pattern of the most specific zone managing hostname, or None if it is out of scope."""
+        if not hostname:
+            return None
+        name = hostname.lower().rstrip('.')
+        zone = self._zones.get(name)
+        if zone is not None and zone[1]:
+            return zone[0]
+        dot = name.find('.')
+        while dot != -1:
+            zone = self._zones.get(name[dot + 1:])
+            if zone is not None:
+                return zone[0]
+            dot = name.find('.', dot + 1)
+        return None
+
+    def __contains__(self, hostname: Optional[str]) -> bool:
+        return self.zone_of(hostname) is not None
+
+    def filter_records(self, records: Iterable[RecordLike]) -> Iterator[RecordLike]:
+        """Yield only the records whose hostname is in scope."""
+        zone_of = self.zone_of
+        for record in records:
+            hostname = record.hostname if isinstance(record, DNSRecord) else record.get('key')
+            if zone_of(hostname) is not None:
+                yield record
+
+    def partition_hostnames(self, hostnames: Iterable[str]) -> Dict[str, List[str]]:
+        """Group in-scope hostnames by zone pattern, dropping the rest."""
+        by_zone: Dict[str, List[str]] = {}
+        for hostname in hostnames:
+            zone = self.zone_of(hostname)
+            if zone is not None:
+                by_zone.setdefault(zone, []).append(hostname)
+        return by_zone
+
+    def partition_entries(self, entries: Iterable[Dict]) -> Tuple[Dict[str, List[Dict]], List[Dict]]:
+        """
+        Group desired entries by zone pattern.
+
+        Returns:
+            The in-scope entries by zone, and the entries outside the scope
+        """
+        by_zone: Dict[str, List[Dict]] = {}
+        outside: List[Dict] = []
+        for entry in entries:
+            zone = self.zone_of(entry.get('hostname'))
+            if zone is None:
+                outside.append(entry)
+            else:
+                by_zone.setdefault(zone, []).append(entry)
+        return by_zone, outside
@@ -0,0 +1,373 @@
+"""
+API server mode for Unifi DNS Sync
+
+This module keeps one authenticated session and an in-memory mirror of the
+controller's static DNS records, and serves a small local REST API to upsert
+and remove individual records without a full fetch and diff per change:
+
+    GET    /health                  service status
+    GET    /records[?hostname=&ip=] mirrored records, optionally filtered
+    GET    /records/<hostname>      records for one hostname
+    PUT    /records/<hostname>      point a hostname at {"ip": ...} (default: target IP)
+    DELETE /records/<hostname>      remove a hostname's A records
+    POST   /records/batch           {"upsert": [entries], "delete": [hostnames]}
+
+Reads are answered from the mirror, which is updated as changes are applied
+and refreshed from the controller periodically, so records changed outside
+the service are picked up. Changes arriving close together are coalesced per
+hostname and applied as one batch.
+"""
+
+import hmac
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .coalesce import MutationQueue
+from .config import DEFAULT_COALESCE_WINDOW, DEFAULT_LISTEN, DEFAULT_RECONCILE_INTERVAL
+from .mirror import RecordMirror
+from .plan import Create, Update, build_plan
+from .sync import DNSSync, normalize_entries
+
+logger = logging.getLogger(__name__)
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+RECORDS_PATH = re.compile(r'^/records(?:/([^/]+))?/?$')
+
+
+def parse_listen(listen: str) -> Tuple[str, int]:
+    """
+    Split a HOST:PORT listen address.
+
+    Raises:
+        ValueError: If the address has no valid port
+    """
+    host, sep, port = listen.rpartition(':')
+    if not sep or not port.isdigit() or int(port) > 65535:
+        raise ValueError(f"Invalid listen address, expected HOST:PORT: {listen}")
+    return host or '0.0.0.0', int(port)
+
+
+class RequestError(Exception):
+    """A client error, reported with the given HTTP status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class DNSService:
+    """Applies record changes through one manager, keeping a mirror of the controller's records."""
+
+    def __init__(self, dns_manager, reconcile_interval: float = DEFAULT_RECONCILE_INTERVAL,
+                 show_diff: bool = False, on_sync: Optional[Callable[[Dict[str, int]], None]] = None,
+                 coalesce_window: float = DEFAULT_COALESCE_WINDOW):
+        """
+        Initialize the service.
+
+        Args:
+            dns_manager: Authenticated UnifiDNSManager used for the whole session
+            reconcile_interval: Seconds between refreshes of the mirror from the controller (0 disables them)
+            show_diff: Whether to display a diff after each change
+            on_sync: Optional callback invoked with the results of every applied batch
+            coalesce_window: Seconds to collect changes into one batch, merged per hostname
+        """
+        self.dns_manager = dns_manager
+        self.reconcile_interval = reconcile_interval
+        self.show_diff = show_diff
+        self.on_sync = on_sync
+        self.mirror = RecordMirror()
+        self.last_reconcile: Optional[float] = None
+        self.last_reconcile_error: Optional[str] = None
+        self.stop_event = threading.Event()
+        # Changes and refreshes are serialized, so every plan sees the mirror
+        # as left by the previous change
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.queue = MutationQueue(self._apply_batch, window=coalesce_window)
+
+    def reconcile(self) -> None:
+        """Refresh the mirror from the controller."""
+        with self._lock:
+            self._reconcile()
+
+    def _reconcile(self) -> None:
+        start = time.monotonic()
+        self.mirror.replace(self.dns_manager.get_existing_dns_records())
+        self.last_reconcile = time.time()
+        self.last_reconcile_error = None
+        logger.info(f"Mirror refreshed: {len(self.mirror)} records in {time.monotonic() - start:.2f}s")
+
+    def _reconcile_loop(self) -> None:
+        while not self.stop_event.wait(self.reconcile_interval):
+            try:
+                self.reconcile()
+            except Exception as e:
+                self.last_reconcile_error = str(e)
+                logger.error(f"Periodic refresh failed, keeping the previous mirror: {e}")
+
+    def start(self) -> None:
+        """Load the mirror and start the periodic refresh."""
+        self.reconcile()
+        if self.reconcile_interval:
+            self._thread = threading.Thread(target=self._reconcile_loop, name='reconcile', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Apply the pending changes and stop the periodic refresh."""
+        self.queue.close()
+        self.stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def records(self, hostname: Optional[str] = None, ip: Optional[str] = None) -> List[Dict]:
+        """Return mirrored records, optionally only those of a hostname and/or pointing at an IP."""
+        if hostname is not None:
+            records = self.mirror.by_hostname(hostname)
+            if ip is not None:
+                records = [record for record in records if record.value == ip]
+        elif ip is not None:
+            records = self.mirror.by_ip(ip)
+        else:
+            records = list(self.mirror.records())
+        return [record.to_dict() for record in records]
+
+    def apply(self, upserts: Iterable[Any] = (), deletes: Iterable[str] = ()) -> Dict[str, Any]:
+        """
+        Upsert and delete hostnames, touching no other records.
+
+        Args:
+            upserts: Host entries in any format accepted in the desired state file
+            deletes: Hostnames whose A records are removed
+
+        Returns:
+            The outcome of each hostname ('created', 'updated', 'deleted',
+            'unchanged' or 'failed') and its resulting records; a hostname
+            changed again later in the same batch reports that final change
+
+        Raises:
+            RequestError: If an entry or hostname is invalid, or a hostname is
+                both upserted and deleted
+        """
+        try:
+            entries = normalize_entries(upserts)
+        except ValueError as e:
+            raise RequestError(400, str(e))
+        deletes = list(deletes)
+        for hostname in deletes:
+            if not isinstance(hostname, str) or not DNSSync.validate_hostname(hostname):
+                raise RequestError(400, f"Invalid hostname: {hostname}")
+        deletes = [hostname.strip() for hostname in deletes]
+        conflicting = {entry['hostname'] for entry in entries} & set(deletes)
+        if conflicting:
+            raise RequestError(400, f"Hostnames both upserted and deleted: {', '.join(sorted(conflicting))}")
+
+        hostnames = [entry['hostname'] for entry in entries] + deletes
+        # The batch may hold other requests' hostnames too; answer only for ours
+        outcomes = self.queue.submit(entries, deletes).result()
+        return {
+            'results': {hostname: outcomes[hostname] for hostname in hostnames},
+            'records': {hostname: self.records(hostname) for hostname in hostnames}
+        }
+
+    def _apply_batch(self, entries: List[Dict], deletes: List[str]) -> Dict[str, str]:
+        """Apply a coalesced batch of upserts and deletes, returning the outcome of each hostname."""
+        applied: List[Any] = []
+
+        def on_applied(op, result: Optional[Dict]) -> None:
+            self.mirror.apply(op, result)
+            applied.append(op)
+
+        with self._lock:
+            if self.mirror.needs_refresh:
+                self._reconcile()
+            # Planning against only these hostnames' records leaves every other record alone
+            hostnames = [entry['hostname'] for entry in entries] + deletes
+            plan = build_plan(self.mirror.records(hostnames), entries, self.dns_manager.target_ip,
+                              controller=self.dns_manager.controller_url, site=self.dns_manager.site)
+            results = self.dns_manager.apply_plan(plan, show_diff=self.show_diff, on_applied=on_applied)
+
+        if plan.has_changes:
+            logger.info(f"Applied: {results['created']} created, {results['updated']} updated, "
+                        f"{results['deleted']} deleted, {results['failed']} failed")
+        if self.on_sync is not None:
+            self.on_sync(results)
+
+        done = Counter(op.hostname for op in applied)
+        deleted = set(deletes)
+        outcomes = dict.fromkeys(hostnames, 'unchanged')
+        for hostname, operations in plan.host_operations().items():
+            if done[hostname] < len(operations):
+                outcomes[hostname] = 'failed'
+            elif isinstance(operations[0], Create):
+                outcomes[hostname] = 'created'
+            elif isinstance(operations[0], Update) or hostname not in deleted:
+                # Dropping an upserted hostname's duplicate records updates it too
+                outcomes[hostname] = 'updated'
+            else:
+                outcomes[hostname] = 'deleted'
+        return outcomes
+
+    def health(self) -> Dict[str, Any]:
+        """Describe the service's state."""
+        return {
+            'status': 'ok' if self.last_reconcile_error is None else 'degraded',
+            'controller': self.dns_manager.controller_url,
+            'site': self.dns_manager.site,
+            'records': len(self.mirror),
+            'last_reconcile': self.last_reconcile,
+            'last_reconcile_error': self.last_reconcile_error
+        }
+
+
+class DNSServer:
+    """Serves the REST API of a DNSService over HTTP."""
+
+    def __init__(self, service: DNSService, listen: str = DEFAULT_LISTEN, token: Optional[str] = None):
+        """
+        Initialize the server.
+
+        Args:
+            service: Service handling the requests
+            listen: HOST:PORT to listen on (port 0 picks a free port)
+            token: Bearer token required on every request (default: no authentication)
+        """
+        self.service = service
+        self.token = token
+        self.server = ThreadingHTTPServer(parse_listen(listen), self._make_handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self) -> None:
+        """Serve requests until shutdown is called or the process is interrupted."""
+        logger.info(f"Serving the DNS API on {self.url}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+
+    def shutdown(self) -> None:
+        """Stop a running serve_forever; call from another thread."""
+        self.server.shutdown()
+
+    def _make_handler(self):
+        server = self
+        service = self.service
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                logger.debug("%s - %s", self.address_string(), format % args)
+
+            def _send(self, status: int, body: Any) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _read_body(self) -> Any:
+                length = int(self.headers.get('Content-Length') or 0)
+                if length > MAX_BODY_SIZE:
+                    raise RequestError(413, f"Request body larger than {MAX_BODY_SIZE} bytes")
+                if not length:
+                    return None
+                try:
+                    return json.loads(self.rfile.read(length))
+                except ValueError as e:
+                    raise RequestError(400, f"Invalid JSON: {e}")
+
+            def _authorized(self) -> bool:
+                if server.token is None:
+                    return True
+                header = self.headers.get('Authorization', '')
+                return hmac.compare_digest(header.encode(), f"Bearer {server.token}".encode())
+
+            def _handle(self, method: str) -> None:
+                try:
+                    if not self._authorized():
+                        raise RequestError(401, "Missing or invalid bearer token")
+                    status, body = self._route(method)
+                except RequestError as e:
+                    status, body = e.status, {'error': str(e)}
+                except Exception as e:
+                    logger.exception(f"{method} {self.path} failed")
+                    status, body = 500, {'error': str(e)}
+                self._send(status, body)
+
+            def _route(self, method: str):
+                url = urlsplit(self.path)
+                if url.path == '/health' and method == 'GET':
+                    return 200, service.health()
+
+                if url.path == '/records/batch':
+                    if method != 'POST':
+                        raise RequestError(405, "Use POST for batches")
+                    body = self._read_body()
+                    if not isinstance(body, dict) or not set(body) <= {'upsert', 'delete'}:
+                        raise RequestError(400, 'Expected {"upsert": [...], "delete": [...]}')
+                    upserts, deletes = body.get('upsert') or [], body.get('delete') or []
+                    if not isinstance(upserts, list) or not isinstance(deletes, list):
+                        raise RequestError(400, '"upsert" and "delete" must be lists')
+                    return self._applied(service.apply(upserts, deletes))
+
+                match = RECORDS_PATH.match(url.path)
+                if match is None:
+                    raise RequestError(404, f"Not found: {url.path}")
+                hostname = unquote(match.group(1)) if match.group(1) else None
+
+                if hostname is None:
+                    if method != 'GET':
+                        raise RequestError(405, "Use /records/<hostname> or /records/batch to make changes")
+                    query = parse_qs(url.query)
+                    return 200, {'records': service.records(query.get('hostname', [None])[0],
+                                                            query.get('ip', [None])[0])}
+
+                if method == 'GET':
+                    records = service.records(hostname)
+                    if not records:
+                        raise RequestError(404, f"No records for {hostname}")
+                    return 200, {'records': records}
+                if method == 'PUT':
+                    body = self._read_body() or {}
+                    if not isinstance(body, dict):
+                        raise RequestError(400, 'Expected {"ip": ...}')
+                    return self._applied(service.apply(upserts=[{'hostname': hostname, 'ip': body.get('ip')}]))
+                if method == 'DELETE':
+                    return self._applied(service.apply(deletes=[hostname]))
+                raise RequestError(405, f"Method {method} not allowed")
+
+            @staticmethod
+            def _applied(outcome: Dict[str, Any]):
+                # A change to one of the request's hostnames that the controller
+                # rejected makes the request a bad gateway
+                return (502 if 'failed' in outcome['results'].values() else 200), outcome
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+            def do_DELETE(self):
+                self._handle('DELETE')
+
+        return Handler
@@ -0,0 +1,178 @@
+"""
+Sync state tracking for Unifi DNS Sync
+
+This module fingerprints the desired entries and the controller records seen
+after a successful sync, so that scheduled runs with nothing to do can return
+without contacting the controller.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .entry_cache import RACY_WINDOW_NS, file_digest
+from .plan import ChangePlan, resolve_desired
+from .records import RecordLike, RecordStore
+
+logger = logging.getLogger(__name__)
+
+STATE_FORMAT_VERSION = 1
+
+# Force a full verification against the controller at least this often, in seconds
+DEFAULT_MAX_VERIFY_AGE = 3600
+
+
+def fingerprint_pairs(pairs: Iterable[Tuple[str, str]]) -> str:
+    """Fingerprint a set of (hostname, ip) pairs independently of their order."""
+    digest = hashlib.sha256()
+    for hostname, ip in sorted(pairs):
+        digest.update(f"{hostname}\t{ip}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def fingerprint_entries(desired_entries: Iterable[Dict], default_ip: str) -> str:
+    """
+    Fingerprint normalized desired entries.
+
+    Entries are resolved the same way as the planner does (None -> default_ip,
+    later entries win), so the result equals fingerprint_records of a
+    controller that is in sync with them.
+    """
+    return fingerprint_pairs(resolve_desired(desired_entries, default_ip).items())
+
+
+def fingerprint_records(records: Iterable[RecordLike]) -> str:
+    """Fingerprint the A records returned by the controller."""
+    return fingerprint_pairs(RecordStore.coerce(records).a_pairs())
+
+
+def fingerprint_applied(records: Iterable[RecordLike], plan: ChangePlan) -> str:
+    """
+    Fingerprint the A records the controller holds once a plan has been fully applied.
+
+    Args:
+        records: The records the plan was computed from, as fetched
+        plan: The plan applied to them without failures
+
+    Returns:
+        The fingerprint fingerprint_records would give for the controller's
+        records after the sync, including records the plan left alone
+    """
+    pairs = Counter(RecordStore.coerce(records).a_pairs())
+    pairs.subtract((op.hostname, op.ip) for op in plan.deletes)
+    pairs.subtract((op.hostname, op.old_ip) for op in plan.updates)
+    pairs.update((op.hostname, op.new_ip) for op in plan.updates)
+    pairs.update((op.hostname, op.ip) for op in plan.creates)
+    return fingerprint_pairs(pairs.elements())
+
+
+def source_signature(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Return the size and mtime of a desired-state file, or None for stdin.
+
+    A file modified within RACY_WINDOW_NS of the stat may be changed again
+    without its mtime moving, so its content hash is recorded as well.
+    """
+    if path is None or path == '-':
+        return None
+    try:
+        st = os.stat(path)
+        signature: Dict[str, Any] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        if st.st_mtime_ns + RACY_WINDOW_NS >= time.time_ns():
+            signature['sha256'] = file_digest(path)
+    except OSError:
+        return None
+    return signature
+
+
+@dataclass
+class SyncState:
+    """What was applied by the last successful sync."""
+    controller: str
+    desired_fingerprint: str
+    controller_fingerprint: str
+    verified_at: float
+    source_path: Optional[str] = None
+    source_signature: Optional[Dict[str, Any]] = None
+    site: str = 'default'
+    scope: Optional[List[str]] = None  # Zone patterns of a scoped sync
+    target_ip: Optional[str] = None  # IP given to entries without one of their own
+
+    def is_fresh(self, max_age: float, now: Optional[float] = None) -> bool:
+        """Whether the last full verification is recent enough to trust."""
+        if now is None:
+            now = time.time()
+        return now - self.verified_at < max_age
+
+    def source_unchanged(self, path: Optional[str]) -> bool:
+        """
+        Whether the desired-state file is unchanged since its signature was taken.
+
+        A single stat decides, unless the file was modified too close to the
+        signature for its mtime to be trusted; then its content hash does.
+        """
+        if path != self.source_path or self.source_signature is None:
+            return False
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if (st.st_size, st.st_mtime_ns) != (self.source_signature.get('size'), self.source_signature.get('mtime_ns')):
+            return False
+        digest = self.source_signature.get('sha256')
+        if digest is None:
+            return True
+        try:
+            return file_digest(path) == digest
+        except OSError:
+            return False
+
+
+class StateStore:
+    """Reads and writes the sync state file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[SyncState]:
+        """Load the saved state, or None if there is no usable state file."""
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable state file {self.path}: {e}")
+            return None
+
+        if not isinstance(data, dict) or data.pop('version', None) != STATE_FORMAT_VERSION:
+            logger.warning(f"Ignoring state file {self.path} with unsupported format")
+            return None
+        try:
+            return SyncState(**data)
+        except TypeError as e:
+            logger.warning(f"Ignoring malformed state file {self.path}: {e}")
+            return None
+
+    def save(self, state: SyncState) -> None:
+        """Atomically write the state file."""
+        data = asdict(state)
+        data['version'] = STATE_FORMAT_VERSION
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.state-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        logger.debug(f"Saved sync state to {self.path}")
@@ -4,19 +4,183 @@ DNS Synchronization utilities
 This module provides utilities for loading configuration files and managing DNS synchronization.
 """
 
+import ipaddress
 import json
+import re
 import sys
 import logging
-from typing import List
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .json_stream import JSONStreamReader
 
 logger = logging.getLogger(__name__)
 
+INPUT_FORMATS = ('auto', 'json', 'ndjson')
+
+# Controller site names as they appear in API paths
+SITE_PATTERN = re.compile(r'^[A-Za-z0-9_\-]+$')
+
+# Bump when the normalization or validation of host entries changes, so that
+# compiled entry caches written by an older version are not used
+ENTRY_RULES_VERSION = 1
+
+HOSTNAME_PATTERN = re.compile(r'^[a-zA-Z0-9]([a-zA-Z0-9\-\.]*[a-zA-Z0-9])?$')
+
+# Dotted-quad IPv4 as accepted by ipaddress (no leading zeros); anything else,
+# such as IPv6, is checked with ipaddress itself
+_OCTET = r'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])'
+IPV4_PATTERN = re.compile(rf'{_OCTET}(?:\.{_OCTET}){{3}}')
+
+
+class ValidatedEntries(list):
+    """A list of host entries that were already normalized and validated."""
+
+
+@lru_cache(maxsize=4096)
+def _is_valid_non_ipv4(value: str) -> bool:
+    try:
+        ipaddress.ip_address(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _normalize_ip(value, item) -> Optional[str]:
+    """Validate the IP value of a host entry, which may be a string or a one-element list."""
+    if value is None:
+        return None
+    if isinstance(value, list):
+        if len(value) != 1:
+            raise ValueError(f"Each hostname may specify only one IP. Got: {value}")
+        value = value[0]
+        if not isinstance(value, str):
+            raise ValueError(f"Invalid IP entry: {value} in {item}")
+    if not (IPV4_PATTERN.fullmatch(value) or _is_valid_non_ipv4(value)):
+        raise ValueError(f"Invalid IP address: {value}")
+    return value
+
+
+def _normalize_hostname(hostname) -> str:
+    hostname = hostname.strip()
+    if not HOSTNAME_PATTERN.match(hostname):
+        raise ValueError(f"Invalid hostname: {hostname}")
+    return hostname
+
+
+def normalize_entry(item) -> Dict[str, Optional[str]]:
+    """
+    Validate and normalize a single host entry.
+
+    Returns:
+        Dict with keys 'hostname' and 'ip' (None means use default target IP)
+
+    Raises:
+        ValueError: If the entry is not a valid host entry
+    """
+    # Simple string entry -> hostname with no explicit IP
+    if isinstance(item, str):
+        return {'hostname': _normalize_hostname(item), 'ip': None}
+
+    # Object entry -> must contain hostname and optional ip (single)
+    if isinstance(item, dict):
+        # Explicit object with 'hostname' key
+        if 'hostname' in item:
+            hostname = item['hostname']
+            if not isinstance(hostname, str) or not hostname.strip():
+                raise ValueError(f"Invalid hostname in object: {item}")
+            hostname = _normalize_hostname(hostname)
+
+            ip_val = item.get('ip')
+            if ip_val is None:
+                ip_val = item.get('ips')
+            if ip_val is not None and not isinstance(ip_val, (str, list)):
+                raise ValueError(f"Invalid ip format for hostname {hostname}: {ip_val}")
+            return {'hostname': hostname, 'ip': _normalize_ip(ip_val, item)}
+
+        # Shorthand mapping {"host.example.com": "1.2.3.4"} or to list
+        if len(item) == 1:
+            key, value = next(iter(item.items()))
+            if not isinstance(key, str) or not key.strip():
+                raise ValueError(f"Invalid hostname key: {key}")
+            hostname = _normalize_hostname(key)
+            if value is not None and not isinstance(value, (str, list)):
+                raise ValueError(f"Invalid value for hostname {hostname}: {value}")
+            return {'hostname': hostname, 'ip': _normalize_ip(value, item)}
+
+    # If we get here the item format is invalid
+    raise ValueError(f"Invalid host entry: {item}")
+
+
+def normalize_entries(items: Iterable) -> ValidatedEntries:
+    """
+    Validate and normalize host entries in a single pass.
+
+    Duplicate hostnames are reported; as in the planner, the last entry for a
+    hostname wins, and the result holds one entry per hostname.
+    """
+    by_hostname: Dict[str, Dict[str, Optional[str]]] = {}
+    duplicates = 0
+    for item in items:
+        entry = normalize_entry(item)
+        hostname = entry['hostname']
+        previous = by_hostname.get(hostname)
+        if previous is not None:
+            duplicates += 1
+            if previous['ip'] != entry['ip']:
+                logger.warning(f"Duplicate hostname {hostname} with different IPs "
+                               f"({previous['ip']} and {entry['ip']}), using the last one")
+            else:
+                logger.debug(f"Duplicate hostname {hostname}")
+        by_hostname[hostname] = entry
+
+    if duplicates:
+        logger.warning(f"Ignored {duplicates} duplicate host entries")
+    return ValidatedEntries(by_hostname.values())
+
 
 class DNSSync:
     """High-level DNS synchronization utilities."""
     
     @staticmethod
-    def load_hostnames_from_json(file_path: str = None) -> List[dict]:
+    def iter_raw_entries(stream, input_format: str = 'auto') -> Iterator:
+        """
+        Incrementally parse raw host entries from a text stream.
+
+        Args:
+            stream: File-like object opened for reading
+            input_format: 'json' for a top-level array, 'ndjson' for one entry per
+                line, or 'auto' to pick based on the first character
+
+        Yields:
+            Raw entries as they are parsed, before validation
+        """
+        if input_format not in INPUT_FORMATS:
+            raise ValueError(f"Unknown input format: {input_format}")
+
+        reader = JSONStreamReader(stream.read)
+        first = reader.peek()
+        if input_format == 'auto':
+            input_format = 'json' if first in ('[', None) else 'ndjson'
+
+        if input_format == 'ndjson':
+            return reader.iter_lines()
+        if first is not None and first != '[':
+            raise ValueError("JSON must contain a list of hostnames or host objects")
+        return reader.iter_array()
+
+    @staticmethod
+    def iter_hostnames(stream, input_format: str = 'auto') -> Iterator[dict]:
+        """
+        Yield normalized host entries from a text stream as they are parsed.
+
+        Entries are validated one at a time; duplicates are not collapsed.
+        """
+        for item in DNSSync.iter_raw_entries(stream, input_format):
+            yield normalize_entry(item)
+
+    @staticmethod
+    def load_hostnames_from_json(file_path: str = None, input_format: str = 'auto') -> List[dict]:
         """
         Load the list of desired hostnames from a JSON file or stdin.
 
@@ -25,10 +189,20 @@ class DNSSync:
           - List of objects (hostname + single ip), e.g.:
               [{"hostname": "a.example.com", "ip": "1.2.3.4"},
                {"b.example.com": "3.3.3.3"}]
+          - Newline-delimited JSON with one such entry per line
 
         IMPORTANT: Each DNS entry may specify at most one IP. If a list of IPs is provided
         it must contain exactly one element; otherwise a ValueError is raised.
 
+        The input is parsed incrementally, so the raw document is never held in
+        memory. Every entry is validated exactly once and duplicate hostnames are
+        collapsed (the last entry wins), so the result can be passed to
+        filter_valid_hostnames at no cost.
+
+        Args:
+            file_path: Path to the file, or None / '-' for stdin
+            input_format: 'json', 'ndjson' or 'auto' (default)
+
         Returns a normalized list of dicts with keys:
           - 'hostname': str
           - 'ip': Optional[str] (None means use default target IP)
@@ -37,109 +211,12 @@ class DNSSync:
             if file_path is None or file_path == '-':
                 # Read from stdin
                 logger.info("Reading hostnames from stdin...")
-                json_data = sys.stdin.read()
-                hostnames = json.loads(json_data)
-            else:
-                # Read from file
-                logger.info(f"Reading hostnames from {file_path}")
-                with open(file_path, 'r') as f:
-                    hostnames = json.load(f)
-
-            if not isinstance(hostnames, list):
-                raise ValueError("JSON must contain a list of hostnames or host objects")
-
-            normalized = []
-            import ipaddress
-
-            for item in hostnames:
-                # Simple string entry -> hostname with no explicit IP
-                if isinstance(item, str):
-                    hostname = item.strip()
-                    if not DNSSync.validate_hostname(hostname):
-                        raise ValueError(f"Invalid hostname: {hostname}")
-                    normalized.append({'hostname': hostname, 'ip': None})
-                    continue
-
-                # Object entry -> must contain hostname and optional ip (single)
-                if isinstance(item, dict):
-                    # Explicit object with 'hostname' key
-                    if 'hostname' in item:
-                        hostname = item.get('hostname')
-                        if not isinstance(hostname, str) or not hostname.strip():
-                            raise ValueError(f"Invalid hostname in object: {item}")
-                        hostname = hostname.strip()
-                        if not DNSSync.validate_hostname(hostname):
-                            raise ValueError(f"Invalid hostname: {hostname}")
-
-                        ip_val = None
-                        if 'ip' in item and item.get('ip') is not None:
-                            ip_val = item.get('ip')
-                        elif 'ips' in item and item.get('ips') is not None:
-                            ip_val = item.get('ips')
-
-                        if ip_val is None:
-                            ip = None
-                        elif isinstance(ip_val, str):
-                            try:
-                                ipaddress.ip_address(ip_val)
-                            except Exception:
-                                raise ValueError(f"Invalid IP address: {ip_val}")
-                            ip = ip_val
-                        elif isinstance(ip_val, list):
-                            if len(ip_val) != 1:
-                                raise ValueError(f"Each hostname may specify only one IP. Got: {ip_val}")
-                            single_ip = ip_val[0]
-                            if not isinstance(single_ip, str):
-                                raise ValueError(f"Invalid IP entry: {single_ip} in {item}")
-                            try:
-                                ipaddress.ip_address(single_ip)
-                            except Exception:
-                                raise ValueError(f"Invalid IP address: {single_ip}")
-                            ip = single_ip
-                        else:
-                            raise ValueError(f"Invalid ip format for hostname {hostname}: {ip_val}")
-
-                        normalized.append({'hostname': hostname, 'ip': ip})
-                        continue
-
-                    # Shorthand mapping {"host.example.com": "1.2.3.4"} or to list
-                    if len(item) == 1:
-                        key, value = next(iter(item.items()))
-                        if not isinstance(key, str) or not key.strip():
-                            raise ValueError(f"Invalid hostname key: {key}")
-                        hostname = key.strip()
-                        if not DNSSync.validate_hostname(hostname):
-                            raise ValueError(f"Invalid hostname: {hostname}")
-
-                        if value is None:
-                            ip = None
-                        elif isinstance(value, str):
-                            try:
-                                ipaddress.ip_address(value)
-                            except Exception:
-                                raise ValueError(f"Invalid IP address: {value}")
-                            ip = value
-                        elif isinstance(value, list):
-                            if len(value) != 1:
-                                raise ValueError(f"Each hostname may specify only one IP. Got: {value}")
-                            single_ip = value[0]
-                            if not isinstance(single_ip, str):
-                                raise ValueError(f"Invalid IP entry: {single_ip} in {item}")
-                            try:
-                                ipaddress.ip_address(single_ip)
-                            except Exception:
-                                raise ValueError(f"Invalid IP address: {single_ip}")
-                            ip = single_ip
-                        else:
-                            raise ValueError(f"Invalid value for hostname {hostname}: {value}")
-
-                        normalized.append({'hostname': hostname, 'ip': ip})
-                        continue
-
-                # If we get here the item format is invalid
-                raise ValueError(f"Invalid host entry: {item}")
-
-            return normalized
+                return normalize_entries(DNSSync.iter_raw_entries(sys.stdin, input_format))
+
+            # Read from file
+            logger.info(f"Reading hostnames from {file_path}")
+            with open(file_path, 'r') as f:
+                return normalize_entries(DNSSync.iter_raw_entries(f, input_format))
 
         except FileNotFoundError:
             logger.error(f"JSON file not found: {file_path}")
@@ -151,6 +228,64 @@ class DNSSync:
             logger.error(f"Error loading hostnames: {e}")
             raise
     
+    @staticmethod
+    def iter_sites(stream) -> Iterator[Tuple[str, ValidatedEntries]]:
+        """
+        Yield (site, entries) pairs from a JSON object mapping site names to host entry lists.
+
+        Each site's entries are parsed and normalized one at a time as they are
+        read, so no site's raw list is ever held in memory as a whole.
+        """
+        reader = JSONStreamReader(stream.read)
+        if reader.peek() != '{':
+            raise ValueError("Site file must contain an object mapping site names to host lists")
+
+        seen = set()
+        for site, items in reader.iter_object(stream_arrays=True):
+            if not SITE_PATTERN.match(site):
+                raise ValueError(f"Invalid site name: {site!r}")
+            if site in seen:
+                raise ValueError(f"Site {site} is listed more than once")
+            # Arrays are streamed as iterators; any other value was decoded whole
+            if not isinstance(items, Iterator):
+                raise ValueError(f"Entries for site {site} must be a list of hostnames or host objects")
+            seen.add(site)
+            yield site, normalize_entries(items)
+
+    @staticmethod
+    def load_sites_from_json(file_path: str = None) -> Dict[str, List[dict]]:
+        """
+        Load desired entries for several controller sites from a JSON file or stdin.
+
+        The file maps site names to lists in any of the formats accepted by
+        load_hostnames_from_json, e.g.:
+            {"default": ["a.example.com"], "branch1": [{"b.example.com": "10.1.0.5"}]}
+
+        Args:
+            file_path: Path to the file, or None / '-' for stdin
+
+        Returns:
+            Mapping of site name to a normalized list of host entries
+        """
+        try:
+            if file_path is None or file_path == '-':
+                logger.info("Reading sites from stdin...")
+                return dict(DNSSync.iter_sites(sys.stdin))
+
+            logger.info(f"Reading sites from {file_path}")
+            with open(file_path, 'r') as f:
+                return dict(DNSSync.iter_sites(f))
+
+        except FileNotFoundError:
+            logger.error(f"JSON file not found: {file_path}")
+            raise
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Error loading sites: {e}")
+            raise
+
     @staticmethod
     def validate_hostname(hostname: str) -> bool:
         """
@@ -171,9 +306,7 @@ class DNSSync:
             return False
         
         # Check for valid characters and basic format
-        import re
-        pattern = r'^[a-zA-Z0-9]([a-zA-Z0-9\-\.]*[a-zA-Z0-9])?$'
-        return bool(re.match(pattern, hostname))
+        return bool(HOSTNAME_PATTERN.match(hostname))
     
     @staticmethod
     def filter_valid_hostnames(hostnames: List[object]) -> List[dict]:
@@ -182,7 +315,12 @@ class DNSSync:
 
         Accepts either strings or normalized dicts as produced by load_hostnames_from_json.
         Returns a list of normalized dicts with keys 'hostname' and 'ip'.
+        Entries returned by load_hostnames_from_json are already validated and
+        are returned unchanged.
         """
+        if isinstance(hostnames, ValidatedEntries):
+            return hostnames
+
         valid_hostnames = []
         for item in hostnames:
             # If provided a plain string, validate and normalize
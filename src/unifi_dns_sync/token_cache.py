@@ -0,0 +1,184 @@
+"""
+Authentication token cache for Unifi DNS Sync
+
+This module persists controller session tokens between runs so that warm starts
+can skip the /api/auth/login round-trip.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Sessions are refreshed this many seconds before the JWT actually expires...
+REFRESH_MARGIN = 120
+# ...but at most this fraction of the token lifetime early, so short-lived tokens still get used
+MAX_REFRESH_FRACTION = 0.25
+
+
+def refresh_margin(issued_at: Optional[float], expires_at: float) -> float:
+    """
+    Return how many seconds before expiry a session should be refreshed.
+
+    Args:
+        issued_at: When the token was issued, if known
+        expires_at: When the token expires
+
+    Returns:
+        REFRESH_MARGIN, capped at MAX_REFRESH_FRACTION of the token lifetime
+    """
+    if issued_at is None:
+        return REFRESH_MARGIN
+    return min(REFRESH_MARGIN, max(expires_at - issued_at, 0.0) * MAX_REFRESH_FRACTION)
+
+
+def default_cache_path() -> str:
+    """Return the default location of the session cache file."""
+    cache_home = os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'unifi-dns-sync', 'session.json')
+
+
+@dataclass
+class CachedSession:
+    """Tokens of an authenticated controller session."""
+    token_cookie: str
+    csrf_token: Optional[str]
+    expires_at: float
+    device_token: Optional[str] = None
+    issued_at: Optional[float] = None
+
+    def is_valid(self, now: Optional[float] = None) -> bool:
+        """Check whether the session can still be used without refreshing it first."""
+        if now is None:
+            now = time.time()
+        return self.expires_at - refresh_margin(self.issued_at, self.expires_at) > now
+
+
+class TokenCache:
+    """
+    On-disk cache of controller sessions keyed by controller URL and username.
+
+    All controllers share one file, so changes to it are serialized: across
+    threads (a fleet logs in to several controllers at once) by a lock, and
+    across processes by an advisory lock on a file next to the cache.
+    """
+
+    # Shared by every instance, which may point at the same file
+    _lock = threading.Lock()
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the token cache.
+
+        Args:
+            path: Location of the cache file (default: ~/.cache/unifi-dns-sync/session.json)
+        """
+        self.path = path or default_cache_path()
+
+    @staticmethod
+    def _key(controller_url: str, username: str) -> str:
+        return f"{controller_url.rstrip('/')}|{username}"
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable token cache {self.path}: {e}")
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the cache's thread lock and, where supported, its file lock."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            directory = os.path.dirname(os.path.abspath(self.path))
+            try:
+                os.makedirs(directory, mode=0o700, exist_ok=True)
+                lock_file = open(self.path + '.lock', 'a')
+            except OSError as e:
+                logger.debug(f"Not locking token cache {self.path}: {e}")
+                yield
+                return
+            with lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                yield
+
+    def _write(self, data: Dict[str, Dict]) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+        # mkstemp creates the file with 0600 permissions; replace it atomically
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.session-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, controller_url: str, username: str) -> Optional[CachedSession]:
+        """
+        Load a still-valid cached session.
+
+        Returns:
+            The cached session, or None if there is none or it has expired
+        """
+        entry = self._read().get(self._key(controller_url, username))
+        if not entry:
+            return None
+
+        try:
+            session = CachedSession(**entry)
+        except TypeError as e:
+            logger.warning(f"Ignoring malformed token cache entry: {e}")
+            return None
+
+        if not session.is_valid():
+            logger.debug("Cached session has expired")
+            return None
+        return session
+
+    def store(self, controller_url: str, username: str, session: CachedSession) -> None:
+        """Store a session, dropping any expired entries for other controllers."""
+        now = time.time()
+        with self._locked():
+            data = {
+                key: entry for key, entry in self._read().items()
+                if isinstance(entry, dict) and entry.get('expires_at', 0) > now
+            }
+            data[self._key(controller_url, username)] = asdict(session)
+            try:
+                self._write(data)
+                logger.debug(f"Stored session in token cache {self.path}")
+            except OSError as e:
+                logger.warning(f"Failed to write token cache {self.path}: {e}")
+
+    def invalidate(self, controller_url: str, username: str) -> None:
+        """Remove the cached session for a controller and user."""
+        with self._locked():
+            data = self._read()
+            if data.pop(self._key(controller_url, username), None) is not None:
+                try:
+                    self._write(data)
+                except OSError as e:
+                    logger.warning(f"Failed to write token cache {self.path}: {e}")
@@ -0,0 +1,338 @@
+"""
+Watch mode for Unifi DNS Sync
+
+This module keeps a single authenticated session open, watches the desired
+state file for changes and applies only the hostnames whose desired IP changed.
+"""
+
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .mirror import RecordMirror
+from .plan import build_plan, resolve_desired
+from .sync import DNSSync
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_RESYNC_INTERVAL = 3600.0
+
+# Stop debouncing and apply after this many seconds of continuous edits
+MAX_DEBOUNCE_WAIT = 30.0
+
+# Seconds before changes that failed to apply are tried again
+RETRY_DELAY = 30.0
+
+# inotify event flags (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class FileWatcher:
+    """
+    Waits for changes to a single file.
+
+    Uses inotify on Linux, watching the file's directory so that editors which
+    replace the file atomically are noticed, and falls back to polling the
+    file's size, mtime and inode elsewhere.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 1.0):
+        self.path = os.path.abspath(path)
+        self.poll_interval = poll_interval
+        self._name = os.path.basename(self.path).encode()
+        self._fd = self._init_inotify()
+        self._signature = self._stat()
+        logger.debug(f"Watching {self.path} using {'inotify' if self._fd is not None else 'polling'}")
+
+    def _init_inotify(self) -> Optional[int]:
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            # Only needed for watch mode; ctypes.util is slow to import
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return None
+            mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            directory = os.path.dirname(self.path).encode()
+            if libc.inotify_add_watch(fd, directory, mask) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError) as e:
+            logger.debug(f"inotify unavailable, falling back to polling: {e}")
+            return None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def _changed_since_last_check(self) -> bool:
+        signature = self._stat()
+        if signature != self._signature:
+            self._signature = signature
+            return True
+        return False
+
+    def _read_events(self) -> bool:
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return False
+        matched = False
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            _, _, _, name_len = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+            if name == self._name:
+                matched = True
+        return matched
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """
+        Block until the file changes or the timeout expires.
+
+        Args:
+            timeout: Seconds to wait, or None to wait indefinitely
+
+        Returns:
+            True if the file changed
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            if self._fd is not None:
+                readable, _, _ = select.select([self._fd], [], [], remaining)
+                if readable and self._read_events() and self._changed_since_last_check():
+                    return True
+            else:
+                time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+                if self._changed_since_last_check():
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self) -> None:
+        """Release the inotify descriptor."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def changed_hostnames(previous: Dict[str, str], current: Dict[str, str]) -> Set[str]:
+    """Return hostnames that were added, removed or changed IP between two desired maps."""
+    changed = {hostname for hostname, ip in current.items() if previous.get(hostname) != ip}
+    changed.update(previous.keys() - current.keys())
+    return changed
+
+
+class DNSWatcher:
+    """Applies incremental changes to the controller as the desired state file changes."""
+
+    def __init__(self, dns_manager, json_file: str, debounce: float = DEFAULT_DEBOUNCE,
+                 resync_interval: float = DEFAULT_RESYNC_INTERVAL, show_diff: bool = False,
+                 on_sync: Optional[Callable[[Dict[str, int]], None]] = None, input_format: str = 'auto'):
+        """
+        Initialize the watcher.
+
+        Args:
+            dns_manager: Authenticated UnifiDNSManager used for the whole session
+            json_file: Desired state file to watch
+            debounce: Seconds without further edits before changes are applied
+            resync_interval: Seconds between full resyncs with the controller (0 disables them)
+            show_diff: Whether to display a diff after each apply
+            on_sync: Optional callback invoked with the results of every full sync or delta apply
+            input_format: Format of the desired state file, one of INPUT_FORMATS
+        """
+        if json_file == '-':
+            raise ValueError("Watch mode needs a desired state file, not stdin")
+        self.dns_manager = dns_manager
+        self.json_file = json_file
+        self.debounce = debounce
+        self.resync_interval = resync_interval
+        self.show_diff = show_diff
+        self.on_sync = on_sync
+        self.input_format = input_format
+        self.mirror = RecordMirror()
+        # The desired state last loaded from the file, and the part of it known
+        # to be applied; hostnames whose operations failed keep their previous
+        # applied state, so the next delta picks them up again
+        self.loaded: Dict[str, str] = {}
+        self.desired: Dict[str, str] = {}
+        self.stop_event = threading.Event()
+
+    def _load(self) -> Optional[Dict[str, str]]:
+        try:
+            entries = DNSSync.filter_valid_hostnames(
+                DNSSync.load_hostnames_from_json(self.json_file, self.input_format))
+        except Exception as e:
+            logger.error(f"Keeping previous desired state, failed to load {self.json_file}: {e}")
+            return None
+        return resolve_desired(entries, self.dns_manager.target_ip)
+
+    def full_sync(self) -> Dict[str, int]:
+        """Refresh the mirror from the controller and sync every loaded desired hostname."""
+        self.mirror.replace(self.dns_manager.get_existing_dns_records())
+        desired = [{'hostname': hostname, 'ip': ip} for hostname, ip in self.loaded.items()]
+        plan = build_plan(self.mirror.records(), desired, self.dns_manager.target_ip,
+                          controller=self.dns_manager.controller_url)
+        results, failed = self._apply(plan)
+        self.desired = {hostname: ip for hostname, ip in self.loaded.items() if hostname not in failed}
+        return results
+
+    def _apply(self, plan) -> Tuple[Dict[str, int], Set[str]]:
+        """Apply a plan, returning the results and the hostnames with an operation that failed."""
+        succeeded: List[str] = []
+
+        def on_applied(op, result: Optional[Dict]) -> None:
+            self.mirror.apply(op, result)
+            succeeded.append(op.hostname)
+
+        results = self.dns_manager.apply_plan(plan, show_diff=self.show_diff, on_applied=on_applied)
+        failed: Set[str] = set()
+        if results['failed']:
+            # A failed write may still have reached the controller
+            self.mirror.needs_refresh = True
+            done = Counter(succeeded)
+            failed = {hostname for hostname, operations in plan.host_operations().items()
+                      if done[hostname] < len(operations)}
+        if self.on_sync is not None:
+            self.on_sync(results)
+        return results, failed
+
+    def apply_delta(self, desired: Dict[str, str]) -> Optional[Dict[str, int]]:
+        """
+        Apply only the hostnames that differ from the applied desired state.
+
+        Hostnames whose operations fail are left out of the applied state, so
+        they are part of the next delta.
+
+        Returns:
+            The apply results, or None if no hostname changed
+        """
+        changed = changed_hostnames(self.desired, desired)
+        if not changed:
+            logger.info("Desired state file changed but no hostname did")
+            return None
+
+        if self.mirror.needs_refresh:
+            self.mirror.replace(self.dns_manager.get_existing_dns_records())
+
+        logger.info(f"Applying changes for {len(changed)} hostnames")
+        entries = [{'hostname': hostname, 'ip': desired[hostname]} for hostname in changed if hostname in desired]
+        plan = build_plan(self.mirror.records(changed), entries, self.dns_manager.target_ip,
+                          controller=self.dns_manager.controller_url)
+        results, failed = self._apply(plan)
+        for hostname in changed - failed:
+            if hostname in desired:
+                self.desired[hostname] = desired[hostname]
+            else:
+                self.desired.pop(hostname, None)
+        return results
+
+    def _try_delta(self) -> Optional[float]:
+        """Apply the loaded desired state, returning when to retry if anything failed."""
+        try:
+            results = self.apply_delta(self.loaded)
+        except Exception as e:
+            self.mirror.needs_refresh = True
+            logger.error(f"Failed to apply changes, retrying in {RETRY_DELAY:.0f}s: {e}")
+            return time.monotonic() + RETRY_DELAY
+        if results is None:
+            return None
+        logger.info(f"Applied: {results['created']} created, {results['updated']} updated, "
+                    f"{results['deleted']} deleted, {results['failed']} failed")
+        if results['failed']:
+            logger.warning(f"Retrying failed hostnames in {RETRY_DELAY:.0f}s")
+            return time.monotonic() + RETRY_DELAY
+        return None
+
+    def _try_full_sync(self) -> float:
+        """Run a full resync, returning when the next one is due."""
+        try:
+            results = self.full_sync()
+        except Exception as e:
+            self.mirror.needs_refresh = True
+            logger.error(f"Periodic full resync failed, retrying in {RETRY_DELAY:.0f}s: {e}")
+            return time.monotonic() + min(RETRY_DELAY, self.resync_interval)
+        if results['failed']:
+            logger.warning(f"Periodic full resync had {results['failed']} failures, retrying in {RETRY_DELAY:.0f}s")
+            return time.monotonic() + min(RETRY_DELAY, self.resync_interval)
+        return time.monotonic() + self.resync_interval
+
+    def _wait_for_quiet(self, watcher: FileWatcher) -> None:
+        """Debounce a burst of edits into a single apply."""
+        started = time.monotonic()
+        while watcher.wait(self.debounce):
+            if time.monotonic() - started >= MAX_DEBOUNCE_WAIT:
+                logger.debug("File keeps changing, applying anyway")
+                return
+
+    def run(self) -> None:
+        """
+        Watch the desired state file until stop() is called or the process is interrupted.
+
+        Only the initial sync raises; later controller errors are logged and
+        the failed work is retried.
+        """
+        # Watched from before the first load, so edits made during the initial sync are not missed
+        watcher = FileWatcher(self.json_file)
+        try:
+            desired = self._load()
+            if desired is None:
+                raise ValueError(f"Cannot start watching, {self.json_file} is not valid")
+            self.loaded = desired
+
+            results = self.full_sync()
+            logger.info(f"Initial sync: {results['created']} created, {results['updated']} updated, "
+                        f"{results['deleted']} deleted, {results['existing']} existing")
+            next_resync = time.monotonic() + self.resync_interval if self.resync_interval else None
+            retry_at = time.monotonic() + RETRY_DELAY if results['failed'] else None
+
+            logger.info(f"Watching {self.json_file} for changes")
+            while not self.stop_event.is_set():
+                timeout = 1.0
+                for deadline in (next_resync, retry_at):
+                    if deadline is not None:
+                        timeout = min(timeout, max(deadline - time.monotonic(), 0.0))
+
+                if watcher.wait(timeout):
+                    self._wait_for_quiet(watcher)
+                    desired = self._load()
+                    if desired is not None:
+                        self.loaded = desired
+                        retry_at = self._try_delta()
+                elif retry_at is not None and time.monotonic() >= retry_at:
+                    retry_at = self._try_delta()
+
+                if next_resync is not None and time.monotonic() >= next_resync:
+                    logger.info("Running periodic full resync")
+                    next_resync = self._try_full_sync()
+                    retry_at = None
+        finally:
+            watcher.close()
+
+    def stop(self) -> None:
+        """Ask a running watcher to return."""
+        self.stop_event.set()
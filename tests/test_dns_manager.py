@@ -0,0 +1,32 @@
+"""Tests for applying change plans with UnifiDNSManager."""
+
+from unittest import mock
+
+from unifi_dns_sync.dns_manager import UnifiDNSManager
+from unifi_dns_sync.plan import ChangePlan, build_plan
+from unifi_dns_sync.records import RecordStore
+
+
+def make_manager():
+    with mock.patch.object(UnifiDNSManager, '_authenticate'):
+        return UnifiDNSManager('https://controller.test', 'user', 'secret', target_ip='10.0.0.1')
+
+
+def test_update_keeps_other_record_fields():
+    existing = [{'_id': 'a1', 'key': 'host.example.com', 'value': '10.0.0.9', 'record_type': 'A',
+                 'enabled': False, 'ttl': 300, 'weight': 5}]
+    plan = build_plan(RecordStore(existing), [{'hostname': 'host.example.com', 'ip': None}], '10.0.0.1')
+    # The record must survive a plan saved to disk and loaded for --apply-plan
+    plan = ChangePlan.from_dict(plan.to_dict())
+
+    manager = make_manager()
+    response = mock.Mock()
+    response.json.return_value = {}
+    with mock.patch.object(manager, '_make_request', return_value=response) as make_request:
+        results = manager.apply_plan(plan, show_diff=False)
+
+    assert results['updated'] == 1
+    method, endpoint = make_request.call_args.args
+    assert method == 'PUT'
+    assert endpoint.endswith('/static-dns/a1')
+    assert make_request.call_args.kwargs['json'] == dict(existing[0], value='10.0.0.1')
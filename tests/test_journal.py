@@ -0,0 +1,118 @@
+"""Tests for resuming and rolling back journaled syncs."""
+
+import argparse
+import json
+from unittest import mock
+
+import pytest
+
+from unifi_dns_sync import cli
+from unifi_dns_sync.dns_manager import UnifiDNSManager
+from unifi_dns_sync.journal import SyncJournal
+from unifi_dns_sync.plan import build_plan
+from unifi_dns_sync.records import RecordStore
+
+RECORDS = [
+    {'_id': 'a1', 'key': 'moved.example.com', 'value': '10.0.0.9', 'record_type': 'A', 'enabled': True},
+    {'_id': 'a2', 'key': 'gone.example.com', 'value': '10.0.0.7', 'record_type': 'A',
+     'enabled': False, 'ttl': 300, 'weight': 5},
+]
+DESIRED = [{'hostname': 'moved.example.com', 'ip': None}, {'hostname': 'new.example.com', 'ip': None}]
+
+
+class FakeController:
+    """Static DNS records of one site, served through UnifiDNSManager._make_request."""
+
+    def __init__(self, records):
+        self.records = {record['_id']: dict(record) for record in records}
+        self.next_id = 0
+
+    def request(self, method, endpoint, json=None, **kwargs):
+        record_id = endpoint.rsplit('/static-dns', 1)[1].lstrip('/')
+        body = {}
+        if method == 'GET':
+            body = list(self.records.values())
+        elif method == 'POST':
+            self.next_id += 1
+            body = dict(json, _id=f"new{self.next_id}")
+            self.records[body['_id']] = body
+        elif method == 'PUT':
+            body = self.records[record_id] = dict(json)
+        elif method == 'DELETE':
+            del self.records[record_id]
+        response = mock.Mock()
+        response.json.return_value = body
+        response.iter_content.return_value = [_json_bytes(body)]
+        return response
+
+
+def _json_bytes(value):
+    return json.dumps(value).encode()
+
+
+def make_manager(controller):
+    with mock.patch.object(UnifiDNSManager, '_authenticate'):
+        manager = UnifiDNSManager('https://controller.test', 'user', 'secret', target_ip='10.0.0.1')
+    manager._make_request = controller.request
+    return manager
+
+
+def recover(journal_path, controller, action):
+    args = argparse.Namespace(journal=journal_path, resume=action == 'resume', rollback=action == 'rollback',
+                              dry_run=False, show_diff=False)
+    with mock.patch.object(cli, 'create_manager', return_value=make_manager(controller)):
+        return cli.run_journal_recovery(args, metrics=mock.Mock())
+
+
+@pytest.fixture
+def plan():
+    return build_plan(RecordStore(RECORDS), DESIRED, '10.0.0.1')
+
+
+def test_resume_finishes_without_repeating_landed_operations(tmp_path, plan):
+    path = str(tmp_path / 'sync.journal')
+    controller = FakeController(RECORDS)
+    manager = make_manager(controller)
+    with SyncJournal.create(path, plan) as journal:
+        # The process dies after the update, with the create sent but not confirmed
+        update, = plan.updates
+        journal.record_applied(update, manager.update_dns_record(update.record, update.new_ip))
+        manager.create_dns_record('new.example.com', '10.0.0.1')
+
+    assert recover(path, controller, 'resume')
+
+    hosts = sorted((r['key'], r['value']) for r in controller.records.values())
+    assert hosts == [('moved.example.com', '10.0.0.1'), ('new.example.com', '10.0.0.1')]
+    with SyncJournal.open(path) as journal:
+        assert journal.complete
+    cli.check_journal_free(path)
+
+
+def test_rollback_restores_deleted_records_with_their_fields(tmp_path, plan):
+    path = str(tmp_path / 'sync.journal')
+    controller = FakeController(RECORDS)
+    with SyncJournal.create(path, plan) as journal:
+        make_manager(controller).apply_plan(plan, show_diff=False, on_applied=journal.record_applied)
+
+    assert recover(path, controller, 'rollback')
+
+    restored = sorted(controller.records.values(), key=lambda r: r['key'])
+    assert [(r['key'], r['value']) for r in restored] == [('gone.example.com', '10.0.0.7'),
+                                                          ('moved.example.com', '10.0.0.9')]
+    gone = restored[0]
+    assert (gone['enabled'], gone['ttl'], gone['weight']) == (False, 300, 5)
+    with SyncJournal.open(path) as journal:
+        assert journal.finished
+
+
+def test_rollback_of_header_only_journal_frees_it(tmp_path, plan):
+    path = str(tmp_path / 'sync.journal')
+    SyncJournal.create(path, plan).close()
+    with pytest.raises(ValueError, match='unfinished sync'):
+        cli.check_journal_free(path)
+
+    controller = FakeController(RECORDS)
+    assert recover(path, controller, 'rollback')
+
+    assert controller.records == {record['_id']: record for record in RECORDS}
+    cli.check_journal_free(path)
@@ -0,0 +1,43 @@
+"""Tests for incremental JSON reading."""
+
+import io
+import json
+
+from unifi_dns_sync.json_stream import JSONStreamReader
+from unifi_dns_sync.sync import DNSSync
+
+
+def test_object_arrays_are_streamed_element_by_element():
+    hostnames = [f"host{i}.example.com" for i in range(2000)]
+    text = json.dumps({'default': hostnames, 'branch': {'not': 'an array'}, 'empty': []})
+    reader = JSONStreamReader(io.StringIO(text).read, chunk_size=64)
+
+    members = reader.iter_object(stream_arrays=True)
+    site, elements = next(members)
+    assert site == 'default'
+    largest = 0
+    for index, hostname in enumerate(elements):
+        assert hostname == hostnames[index]
+        largest = max(largest, len(reader._buf))
+    # Never more than a chunk and the element straddling it, not the whole list
+    assert largest < 200
+
+    assert next(members) == ('branch', {'not': 'an array'})
+    site, elements = next(members)
+    assert (site, list(elements)) == ('empty', [])
+    assert next(members, None) is None
+
+
+def test_unread_elements_are_skipped():
+    text = json.dumps({'a': [1, [2, 3], {'x': 4}], 'b': [5]})
+    members = JSONStreamReader(io.StringIO(text).read, chunk_size=4).iter_object(stream_arrays=True)
+    assert next(members)[0] == 'a'
+    site, elements = next(members)
+    assert (site, list(elements)) == ('b', [5])
+
+
+def test_sites_are_loaded_from_streamed_lists():
+    text = json.dumps({'default': ['a.example.com'], 'branch1': [{'b.example.com': '10.1.0.5'}]})
+    sites = dict(DNSSync.iter_sites(io.StringIO(text)))
+    assert list(sites['default']) == [{'hostname': 'a.example.com', 'ip': None}]
+    assert list(sites['branch1']) == [{'hostname': 'b.example.com', 'ip': '10.1.0.5'}]
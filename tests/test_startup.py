@@ -0,0 +1,20 @@
+"""Tests for the CLI startup budget, measured as benchmarks/bench_startup.py does."""
+
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from bench_startup import DEFAULT_BUDGET_MS, FORBIDDEN_MODULES, import_profile  # noqa: E402
+
+
+def test_cli_import_is_within_budget_and_lazy():
+    # Warm-up run, which also writes the bytecode cache
+    import_profile()
+    profiles = [import_profile() for _ in range(3)]
+
+    import_ms = statistics.median(profile['unifi_dns_sync.cli'][1] for profile in profiles) / 1000
+    assert import_ms <= DEFAULT_BUDGET_MS, f"import took {import_ms:.1f} ms"
+    loaded = {name.split('.')[0] for name in profiles[-1]}
+    assert not loaded & set(FORBIDDEN_MODULES)
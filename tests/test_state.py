@@ -0,0 +1,66 @@
+"""Tests for skipping syncs of unchanged desired state."""
+
+import json
+import os
+from unittest import mock
+
+from unifi_dns_sync import cli
+from unifi_dns_sync.plan import build_plan
+from unifi_dns_sync.records import RecordStore
+from unifi_dns_sync.state import SyncState, source_signature
+
+
+def write_hosts(path, hostnames):
+    with open(path, 'w') as f:
+        json.dump(hostnames, f)
+
+
+def run_sync(hosts_path, state_path, manager):
+    argv = ['unifi-dns-sync', hosts_path, '--controller', 'https://controller.test', '--username', 'user',
+            '--password', 'secret', '--target-ip', '10.0.0.1', '--no-entry-cache',
+            '--state-file', state_path, '--skip-if-unchanged']
+    with mock.patch('sys.argv', argv), mock.patch.object(cli, 'create_manager', return_value=manager) as create:
+        cli.main()
+    return create.called
+
+
+def make_manager(on_apply=None):
+    manager = mock.Mock()
+    manager.get_existing_dns_records.return_value = RecordStore([])
+    manager.plan_changes.side_effect = lambda entries, existing: build_plan(existing, entries, '10.0.0.1')
+
+    def apply_plan(plan, show_diff, on_applied=None):
+        if on_apply is not None:
+            on_apply()
+        return {'created': len(plan.creates), 'updated': 0, 'deleted': 0, 'existing': 0, 'failed': 0,
+                'retries': 0}
+    manager.apply_plan.side_effect = apply_plan
+    return manager
+
+
+def test_edit_during_apply_is_synced_by_next_run(tmp_path):
+    hosts_path = str(tmp_path / 'hosts.json')
+    state_path = str(tmp_path / 'state.json')
+    write_hosts(hosts_path, ['a.example.com'])
+
+    assert run_sync(hosts_path, state_path, make_manager(
+        on_apply=lambda: write_hosts(hosts_path, ['a.example.com', 'b.example.com'])))
+
+    # The edit was never applied, so the next run must not skip the controller
+    assert run_sync(hosts_path, state_path, make_manager())
+    # Now everything is applied and the file is left alone
+    assert not run_sync(hosts_path, state_path, make_manager())
+
+
+def test_same_tick_rewrite_is_detected_by_content(tmp_path):
+    hosts_path = str(tmp_path / 'hosts.json')
+    write_hosts(hosts_path, ['a.example.com'])
+    state = SyncState('https://controller.test', 'desired', 'controller', 0.0,
+                      source_path=hosts_path, source_signature=source_signature(hosts_path))
+    assert state.source_unchanged(hosts_path)
+
+    # Same size, with the mtime put back as a coarse filesystem clock would leave it
+    st = os.stat(hosts_path)
+    write_hosts(hosts_path, ['b.example.com'])
+    os.utime(hosts_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert not state.source_unchanged(hosts_path)
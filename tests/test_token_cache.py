@@ -0,0 +1,29 @@
+"""Tests for the controller session token cache."""
+
+import time
+
+from unifi_dns_sync.token_cache import REFRESH_MARGIN, CachedSession, TokenCache
+
+
+def test_short_lived_session_is_not_refreshed_at_once():
+    now = 1000.0
+    # A 60s token is shorter than the refresh margin, so the margin shrinks with it
+    session = CachedSession('cookie', 'csrf', expires_at=now + 60, issued_at=now)
+    assert session.is_valid(now + 30)
+    assert not session.is_valid(now + 50)
+
+
+def test_session_without_issue_time_uses_full_margin():
+    session = CachedSession('cookie', None, expires_at=REFRESH_MARGIN + 10.0)
+    assert session.is_valid(5.0)
+    assert not session.is_valid(15.0)
+
+
+def test_issue_time_survives_the_cache(tmp_path):
+    cache = TokenCache(str(tmp_path / 'session.json'))
+    now = time.time()
+    cache.store('https://controller.test', 'user', CachedSession('cookie', 'csrf', now + 60, issued_at=now))
+
+    loaded = cache.load('https://controller.test/', 'user')
+    assert loaded is not None
+    assert loaded.issued_at == now
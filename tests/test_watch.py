@@ -0,0 +1,47 @@
+"""Tests for watch mode."""
+
+import json
+import threading
+import time
+from unittest import mock
+
+from unifi_dns_sync.records import RecordStore
+from unifi_dns_sync.watch import DNSWatcher
+
+
+def write_hosts(path, hostnames):
+    with open(path, 'w') as f:
+        json.dump(hostnames, f)
+
+
+def test_edit_during_initial_sync_is_applied(tmp_path):
+    hosts_path = str(tmp_path / 'hosts.json')
+    write_hosts(hosts_path, ['a.example.com'])
+
+    applied = []
+
+    def apply_plan(plan, show_diff, on_applied=None):
+        if not applied:
+            # Edited while the initial sync is still running
+            write_hosts(hosts_path, ['a.example.com', 'b.example.com'])
+        for op in plan.creates:
+            applied.append(op.hostname)
+            on_applied(op, {'_id': op.hostname, 'key': op.hostname, 'value': op.ip, 'record_type': 'A'})
+        return {'created': len(plan.creates), 'updated': 0, 'deleted': 0, 'existing': 0, 'failed': 0}
+
+    manager = mock.Mock(target_ip='10.0.0.1', controller_url='https://controller.test')
+    manager.get_existing_dns_records.return_value = RecordStore([])
+    manager.apply_plan.side_effect = apply_plan
+
+    watcher = DNSWatcher(manager, hosts_path, debounce=0.05, resync_interval=0)
+    thread = threading.Thread(target=watcher.run)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while 'b.example.com' not in applied and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        watcher.stop()
+        thread.join()
+
+    assert applied == ['a.example.com', 'b.example.com']